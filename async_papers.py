@@ -0,0 +1,193 @@
+# Gelin Eguinosa Rosique
+
+import asyncio
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+
+class AsyncPapers:
+    """
+    Asyncio facade of the Papers class. The blocking methods (reading files,
+    decoding JSON, decompressing text) run in a bounded pool of threads, so
+    the event loop is never blocked. The requests for the same paper that are
+    in progress at the same time share a single read, and the amount of reads
+    submitted to the pool is limited, so a burst of requests waits instead of
+    piling up work in the pool.
+    """
+
+    def __init__(self, papers, workers=8, max_pending=None):
+        """
+        Create the pool of threads used to access the papers.
+        :param papers: The Papers instance we read from. A SharedPapers can also
+        be used, but only with the methods it has (the title and abstract, and
+        the embeddings) and giving the 'cord_uids' to the iterators.
+        :param workers: The amount of threads reading papers.
+        :param max_pending: The maximum amount of reads submitted to the pool at
+        the same time (default: four times the amount of workers).
+        """
+        self.papers = papers
+        self.workers = workers
+        self.max_pending = max_pending or 4 * workers
+        self.executor = ThreadPoolExecutor(max_workers=workers)
+        # The reads in progress, by method and 'cord_uid'.
+        self.in_flight = {}
+        # Created in the event loop the first time it is used.
+        self.semaphore = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        """
+        Shut down the pool of threads.
+        """
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+    async def paper_title_abstract(self, cord_uid):
+        """
+        Get the title and abstract of the 'cord_uid' paper.
+        :param cord_uid: The Unique Identifier of the CORD-19 paper.
+        :return: A string containing the title and abstract of the paper.
+        """
+        return await self._call('paper_title_abstract', cord_uid)
+
+    async def paper_content(self, cord_uid):
+        """
+        Get the body text of the 'cord_uid' paper.
+        :param cord_uid: The Unique Identifier of the CORD-19 paper.
+        :return: A string with the content of the paper.
+        """
+        return await self._call('paper_content', cord_uid)
+
+    async def paper_full_text(self, cord_uid):
+        """
+        Get the title, abstract and body text of the 'cord_uid' paper.
+        :param cord_uid: The Unique Identifier of the CORD-19 paper.
+        :return: A string with the full text of the paper.
+        """
+        return await self._call('paper_full_text', cord_uid)
+
+    async def paper_embedding(self, cord_uid):
+        """
+        Get the SPECTER Document Embedding of the 'cord_uid' paper.
+        :param cord_uid: The Unique Identifier of the CORD-19 paper.
+        :return: The float32 NumPy array with the embedding.
+        """
+        return await self._call('paper_embedding', cord_uid)
+
+    async def papers_content(self, cord_uids):
+        """
+        Get the body text of several papers, reading them concurrently.
+        :param cord_uids: The list of Unique Identifiers of the papers.
+        :return: The list with the content of the papers, in the same order.
+        """
+        return await asyncio.gather(*(self.paper_content(cord_uid) for cord_uid in cord_uids))
+
+    async def papers_full_text(self, cord_uids):
+        """
+        Get the full text of several papers, reading them concurrently.
+        :param cord_uids: The list of Unique Identifiers of the papers.
+        :return: The list with the full text of the papers, in the same order.
+        """
+        return await asyncio.gather(*(self.paper_full_text(cord_uid) for cord_uid in cord_uids))
+
+    def all_papers_title_abstract(self, cord_uids=None, prefetch=None):
+        """
+        Create an async iterator with the title and abstract of the papers.
+        :param cord_uids: The papers we want to visit (by default all of them).
+        :param prefetch: The maximum amount of papers read ahead of the caller
+        (default: twice the amount of workers).
+        :return: An async iterator of strings.
+        """
+        return self._all_papers_map('paper_title_abstract', cord_uids, prefetch)
+
+    def all_papers_content(self, cord_uids=None, prefetch=None):
+        """
+        Create an async iterator with the body text of the papers.
+        :param cord_uids: The papers we want to visit (by default all of them).
+        :param prefetch: The maximum amount of papers read ahead of the caller
+        (default: twice the amount of workers).
+        :return: An async iterator of strings.
+        """
+        return self._all_papers_map('paper_content', cord_uids, prefetch)
+
+    def all_papers_full_text(self, cord_uids=None, prefetch=None):
+        """
+        Create an async iterator with the full text of the papers.
+        :param cord_uids: The papers we want to visit (by default all of them).
+        :param prefetch: The maximum amount of papers read ahead of the caller
+        (default: twice the amount of workers).
+        :return: An async iterator of strings.
+        """
+        return self._all_papers_map('paper_full_text', cord_uids, prefetch)
+
+    def all_papers_embedding(self, cord_uids=None, prefetch=None):
+        """
+        Create an async iterator with the embeddings of the papers.
+        :param cord_uids: The papers we want to visit (by default all of them).
+        :param prefetch: The maximum amount of papers read ahead of the caller
+        (default: twice the amount of workers).
+        :return: An async iterator of float32 NumPy arrays.
+        """
+        return self._all_papers_map('paper_embedding', cord_uids, prefetch)
+
+    async def _all_papers_map(self, method_name, cord_uids, prefetch):
+        """
+        Apply one of the methods of the papers to a sequence of papers, keeping
+        at most 'prefetch' reads ahead of the caller, and returning the results
+        in the order of the papers.
+        """
+        if cord_uids is None:
+            if not hasattr(self.papers, 'papers_index'):
+                raise ValueError(
+                    f"The 'cord_uids' of the papers are needed to iterate over "
+                    f"<{type(self.papers).__name__}>, it doesn't have the papers' index."
+                )
+            cord_uids = self.papers.papers_index
+        if not prefetch:
+            prefetch = 2 * self.workers
+        pending = deque()
+        try:
+            for cord_uid in cord_uids:
+                pending.append(asyncio.ensure_future(self._call(method_name, cord_uid)))
+                if len(pending) >= prefetch:
+                    yield await pending.popleft()
+            while pending:
+                yield await pending.popleft()
+        finally:
+            # Cancel the pending reads if the caller stops before the end.
+            for task in pending:
+                task.cancel()
+
+    async def _call(self, method_name, cord_uid):
+        """
+        Run one of the blocking methods of the papers in the pool of threads,
+        sharing the result with the requests for the same paper that arrive
+        while it is in progress.
+        :param method_name: The name of the method of the papers.
+        :param cord_uid: The Unique Identifier of the CORD-19 paper.
+        :return: The result of the method.
+        """
+        key = (method_name, cord_uid)
+        task = self.in_flight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._run(method_name, cord_uid))
+            self.in_flight[key] = task
+            task.add_done_callback(lambda _: self.in_flight.pop(key, None))
+        # Don't cancel the shared read if one of the requests is cancelled.
+        return await asyncio.shield(task)
+
+    async def _run(self, method_name, cord_uid):
+        """
+        Submit a method of the papers to the pool of threads, waiting for a free
+        slot if there are too many reads in progress.
+        """
+        if self.semaphore is None:
+            self.semaphore = asyncio.Semaphore(self.max_pending)
+        async with self.semaphore:
+            loop = asyncio.get_running_loop()
+            method = getattr(self.papers, method_name)
+            return await loop.run_in_executor(self.executor, method, cord_uid)
@@ -0,0 +1,142 @@
+# Gelin Eguinosa Rosique
+
+import os
+import json
+import zlib
+import shutil
+from os.path import join, isdir, isfile, getsize, relpath
+
+# The amount of bytes read at the start and the end of a file for the quick
+# checksum.
+sample_bytes = 64 * 1024
+
+
+def write_json_atomic(file_path, data, indent=None):
+    """
+    Save a JSON file so it is never left half-written: the data is written to a
+    temporary file, flushed to disk, and renamed to its final name.
+    :param file_path: The path of the file.
+    :param data: The object we are going to save.
+    :param indent: The indentation of the JSON.
+    """
+    temp_path = file_path + '.tmp'
+    with open(temp_path, 'w') as file:
+        json.dump(data, file, indent=indent)
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(temp_path, file_path)
+
+
+def load_json(file_path):
+    """
+    Load a JSON file, if it exists and it is complete.
+    :param file_path: The path of the file.
+    :return: The loaded object, or None if the file doesn't exist or is
+    corrupted.
+    """
+    if not isfile(file_path):
+        return None
+    try:
+        with open(file_path, 'r') as file:
+            return json.load(file)
+    except ValueError:
+        return None
+
+
+def replace_folder(temp_folder, folder):
+    """
+    Move a folder that was built in a temporary location to its final path,
+    replacing the old folder (if any). The old folder is first renamed, so the
+    new one appears with a single rename.
+    :param temp_folder: The path of the new folder.
+    :param folder: The final path of the folder.
+    """
+    old_folder = folder + '.old'
+    if isdir(old_folder):
+        shutil.rmtree(old_folder)
+    if isdir(folder):
+        os.rename(folder, old_folder)
+    os.rename(temp_folder, folder)
+    if isdir(old_folder):
+        shutil.rmtree(old_folder)
+
+
+def file_checksum(file_path, block_size=1024 ** 2):
+    """
+    Calculate the checksums of a file: the CRC-32 of all its content and the
+    quick CRC-32 of its first and last bytes.
+    :param file_path: The path of the file.
+    :param block_size: The amount of bytes read at a time.
+    :return: A dictionary with the 'size', 'crc32' and 'sample_crc32' of the
+    file.
+    """
+    crc = 0
+    with open(file_path, 'rb') as file:
+        for block in iter(lambda: file.read(block_size), b''):
+            crc = zlib.crc32(block, crc)
+    checksum = {
+        'size': getsize(file_path),
+        'crc32': crc,
+        'sample_crc32': sample_checksum(file_path),
+    }
+    return checksum
+
+
+def sample_checksum(file_path):
+    """
+    Calculate the CRC-32 of the first and last bytes of a file, a quick check
+    that the file wasn't truncated or overwritten.
+    :param file_path: The path of the file.
+    :return: The integer with the checksum.
+    """
+    file_size = getsize(file_path)
+    with open(file_path, 'rb') as file:
+        crc = zlib.crc32(file.read(sample_bytes))
+        if file_size > sample_bytes:
+            file.seek(max(file_size - sample_bytes, sample_bytes))
+            crc = zlib.crc32(file.read(), crc)
+    return crc
+
+
+def folder_checksums(base_folder, paths):
+    """
+    Calculate the checksums of files and of all the files inside folders.
+    :param base_folder: The folder the paths are relative to.
+    :param paths: The list of paths (files or folders) relative to the
+    'base_folder'.
+    :return: A dictionary with the relative path of each file and its
+    checksums.
+    """
+    checksums = {}
+    for path in paths:
+        full_path = join(base_folder, path)
+        if isdir(full_path):
+            file_paths = sorted(join(full_path, name) for name in os.listdir(full_path))
+        else:
+            file_paths = [full_path]
+        for file_path in file_paths:
+            if isfile(file_path):
+                checksums[relpath(file_path, base_folder)] = file_checksum(file_path)
+    return checksums
+
+
+def verify_files(base_folder, checksums, full=False):
+    """
+    Check the files still have the sizes and checksums they had when they were
+    saved. By default, only the size and the quick checksum are checked.
+    :param base_folder: The folder the paths are relative to.
+    :param checksums: The dictionary with the checksums of the files.
+    :param full: Bool indicating if we also check the CRC-32 of all the content.
+    :return: The list with the relative paths of the files that are missing or
+    changed.
+    """
+    bad_files = []
+    for path, checksum in checksums.items():
+        file_path = join(base_folder, path)
+        if not isfile(file_path) or getsize(file_path) != checksum['size']:
+            bad_files.append(path)
+        elif sample_checksum(file_path) != checksum['sample_crc32']:
+            bad_files.append(path)
+        elif full and file_checksum(file_path)['crc32'] != checksum['crc32']:
+            bad_files.append(path)
+    return bad_files
@@ -0,0 +1,217 @@
+# Gelin Eguinosa Rosique
+
+import json
+import random
+import shutil
+import argparse
+from os.path import join, isdir, isfile
+from time import perf_counter
+import numpy as np
+from papers import Papers
+from sample_dataset import SamplePapers, create_sample_dataset
+
+try:
+    import resource
+except ImportError:
+    # The module is only available on Unix, the peak memory is not measured.
+    resource = None
+
+
+def latency_stats(latencies, total_time=None):
+    """
+    Summarise the latencies of an operation.
+    :param latencies: The list with the seconds each call took.
+    :param total_time: The seconds the whole sequence of calls took (by
+    default, the sum of the latencies).
+    :return: A dictionary with the amount of calls, the total seconds, the
+    throughput (calls per second) and the p50 and p99 latencies in
+    milliseconds.
+    """
+    latencies = np.asarray(latencies, dtype=np.float64)
+    if total_time is None:
+        total_time = float(latencies.sum())
+    stats = {
+        'count': int(len(latencies)),
+        'total_seconds': total_time,
+        'throughput': len(latencies) / total_time if total_time else 0.0,
+        'p50_ms': float(np.percentile(latencies, 50)) * 1000 if len(latencies) else 0.0,
+        'p99_ms': float(np.percentile(latencies, 99)) * 1000 if len(latencies) else 0.0,
+    }
+    return stats
+
+
+def peak_rss():
+    """
+    Get the maximum resident memory (in bytes) used by this process and by its
+    finished child processes (0 if it can't be measured in this platform).
+    """
+    if resource is None:
+        return 0
+    self_usage = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    children_usage = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    # Linux reports kilobytes.
+    return max(self_usage, children_usage) * 1024
+
+
+def run_benchmark(work_folder, num_papers=1000, embedding_size=768, lookups=1000,
+                  workers=1, seed=0):
+    """
+    Measure the construction of the Papers class (cold, building all the
+    indexes, and warm, opening them), the random and sequential lookups of
+    embeddings and contents, and the iterators through all the papers, using a
+    synthetic dataset (reused by the runs with the same parameters).
+    :param work_folder: The folder for the synthetic dataset and the indexes.
+    :param num_papers: The amount of papers in the dataset.
+    :param embedding_size: The size of the embeddings.
+    :param lookups: The amount of calls in the lookup measurements.
+    :param workers: The amount of workers used by the build and the iterators.
+    :param seed: The seed of the random generators.
+    :return: A dictionary with the configuration, the statistics of each
+    measurement and the peak memory of the process.
+    """
+    # The dataset is reused by the runs with the same parameters.
+    data_folder = join(work_folder, f"cord19_data_{num_papers}_{embedding_size}_{seed}")
+    project_folder = join(work_folder, 'project_data')
+    if not isdir(join(data_folder, Papers.current_dataset)):
+        create_sample_dataset(
+            data_folder, num_papers, embedding_size, paragraphs=8, paragraph_words=80, seed=seed
+        )
+    if isdir(project_folder):
+        shutil.rmtree(project_folder)
+    SamplePapers.cord19_data_folder = data_folder
+    SamplePapers.project_data_folder = project_folder
+    results = {}
+
+    # Cold and warm construction.
+    start = perf_counter()
+    SamplePapers(workers=workers)
+    results['papers_cold'] = latency_stats([perf_counter() - start])
+    start = perf_counter()
+    papers = SamplePapers()
+    results['papers_warm'] = latency_stats([perf_counter() - start])
+
+    # The papers in storage order and in random order (with repetitions).
+    rand_gen = random.Random(seed)
+    sequential_uids = sorted(papers.embeds_index, key=papers.embeds_index.get)
+    sequential_uids = (sequential_uids * (lookups // len(sequential_uids) + 1))[:lookups]
+    random_uids = rand_gen.choices(list(papers.embeds_index), k=lookups)
+    results['embedding_random'] = _time_calls(papers.paper_embedding, random_uids)
+    results['embedding_sequential'] = _time_calls(papers.paper_embedding, sequential_uids)
+    content_uids = rand_gen.choices(list(papers.papers_index), k=lookups)
+    results['content_random'] = _time_calls(papers.paper_content, content_uids)
+    # Use a new instance, so the contents are not in the cache.
+    papers = SamplePapers()
+    content_uids = list(papers.papers_index)
+    content_uids = (content_uids * (lookups // len(content_uids) + 1))[:lookups]
+    results['content_sequential'] = _time_calls(papers.paper_content, content_uids)
+
+    # Iterate through all the papers (with an empty cache).
+    papers = SamplePapers()
+    results['all_papers_title_abstract'] = _time_iterator(papers.all_papers_title_abstract())
+    results['all_papers_content'] = _time_iterator(papers.all_papers_content(workers=workers))
+    papers = SamplePapers()
+    results['all_papers_full_text'] = _time_iterator(papers.all_papers_full_text(workers=workers))
+    results['all_papers_embedding'] = _time_iterator(papers.all_papers_embedding())
+
+    benchmark = {
+        'config': {
+            'num_papers': num_papers,
+            'embedding_size': embedding_size,
+            'lookups': lookups,
+            'workers': workers,
+            'seed': seed,
+        },
+        'results': results,
+        'peak_rss': peak_rss(),
+    }
+    return benchmark
+
+
+def _time_calls(function, items):
+    """
+    Measure the latency of each call of 'function' with the 'items'.
+    """
+    latencies = []
+    for item in items:
+        start = perf_counter()
+        function(item)
+        latencies.append(perf_counter() - start)
+    return latency_stats(latencies)
+
+
+def _time_iterator(iterator):
+    """
+    Measure the time between the items of the iterator, and the total time to
+    consume it.
+    """
+    latencies = []
+    start = last_time = perf_counter()
+    for _ in iterator:
+        current_time = perf_counter()
+        latencies.append(current_time - last_time)
+        last_time = current_time
+    return latency_stats(latencies, perf_counter() - start)
+
+
+def compare_results(benchmark, baseline, tolerance=0.10):
+    """
+    Compare the results of a benchmark with the ones of a baseline run.
+    :param benchmark: The dictionary returned by 'run_benchmark()'.
+    :param baseline: The dictionary of the baseline run.
+    :param tolerance: The fraction the p50 latency can grow before it is
+    considered a regression.
+    :return: A dictionary with the p50 latencies and throughputs of both runs for
+    each measurement, their ratios, and if it is a regression.
+    """
+    comparison = {}
+    for name, stats in benchmark['results'].items():
+        base_stats = baseline['results'].get(name)
+        if not base_stats:
+            continue
+        p50_ratio = stats['p50_ms'] / base_stats['p50_ms'] if base_stats['p50_ms'] else 1.0
+        comparison[name] = {
+            'p50_ms': stats['p50_ms'],
+            'baseline_p50_ms': base_stats['p50_ms'],
+            'p50_ratio': p50_ratio,
+            'throughput': stats['throughput'],
+            'baseline_throughput': base_stats['throughput'],
+            'regression': p50_ratio > 1 + tolerance,
+        }
+    return comparison
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Benchmark the Papers class with a synthetic dataset.")
+    parser.add_argument('--folder', default='benchmark_data', help="Folder for the dataset and indexes.")
+    parser.add_argument('--papers', type=int, default=1000, help="Amount of synthetic papers.")
+    parser.add_argument('--embedding-size', type=int, default=768, help="Size of the embeddings.")
+    parser.add_argument('--lookups', type=int, default=1000, help="Calls in the lookup measurements.")
+    parser.add_argument('--workers', type=int, default=1, help="Workers of the build and iterators.")
+    parser.add_argument('--output', default='benchmark_results.json', help="File for the results.")
+    parser.add_argument('--baseline', default='benchmark_baseline.json', help="File of the baseline.")
+    parser.add_argument('--save-baseline', action='store_true', help="Save the results as the baseline.")
+    args = parser.parse_args()
+
+    benchmark_results = run_benchmark(
+        args.folder, num_papers=args.papers, embedding_size=args.embedding_size,
+        lookups=args.lookups, workers=args.workers
+    )
+    with open(args.output, 'w') as f:
+        json.dump(benchmark_results, f, indent=2)
+    print(f"\nResults saved in '{args.output}'.")
+    for result_name, result_stats in benchmark_results['results'].items():
+        print(f"{result_name:28} {result_stats['throughput']:12.1f}/s "
+              f"p50 {result_stats['p50_ms']:9.3f} ms  p99 {result_stats['p99_ms']:9.3f} ms")
+    print(f"Peak RSS: {benchmark_results['peak_rss'] / 1024 ** 2:.1f} MB")
+
+    if args.save_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump(benchmark_results, f, indent=2)
+        print(f"Baseline saved in '{args.baseline}'.")
+    elif isfile(args.baseline):
+        with open(args.baseline, 'r') as f:
+            baseline_results = json.load(f)
+        print(f"\nComparison with '{args.baseline}':")
+        for result_name, result_diff in compare_results(benchmark_results, baseline_results).items():
+            flag = 'REGRESSION' if result_diff['regression'] else ''
+            print(f"{result_name:28} p50 x{result_diff['p50_ratio']:.2f} {flag}")
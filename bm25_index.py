@@ -0,0 +1,328 @@
+# Gelin Eguinosa Rosique
+
+import re
+import json
+import shutil
+from os import mkdir
+from os.path import join, isdir, isfile, getsize
+from array import array
+from collections import Counter
+import numpy as np
+from embeddings_search import top_k
+
+# The words of a text are its sequences of letters and digits.
+_word_pattern = re.compile(r'\w+')
+
+
+class BM25Index:
+    """
+    Inverted index of the words in the fields of the documents, used to rank the
+    documents for a query with the BM25 formula. The postings lists of the words
+    are stored compressed on disk: the ids of the documents are delta-encoded,
+    and the deltas and the frequencies are saved using a variable amount of
+    bytes.
+    """
+    # The files of the index.
+    meta_file = 'meta.json'
+    doc_uids_file = 'doc_uids.json'
+
+    def __init__(self, index_folder):
+        """
+        Load the vocabularies of the fields and memory-map their postings.
+        :param index_folder: The folder with the files of the index.
+        """
+        self.index_folder = index_folder
+        with open(join(index_folder, self.meta_file), 'r') as file:
+            self.meta = json.load(file)
+        with open(join(index_folder, self.doc_uids_file), 'r') as file:
+            self.doc_uids = json.load(file)
+        self.fields = self.meta['fields']
+        self.vocabularies = {}
+        self.docs = {}
+        self.tfs = {}
+        self.lengths = {}
+        for field in self.fields:
+            with open(join(index_folder, field + '.vocab.json'), 'r') as file:
+                self.vocabularies[field] = json.load(file)
+            self.docs[field] = _load_bytes(join(index_folder, field + '.docs'), np.uint8)
+            self.tfs[field] = _load_bytes(join(index_folder, field + '.tfs'), np.uint8)
+            self.lengths[field] = _load_bytes(join(index_folder, field + '.lengths'), np.uint32)
+
+    @classmethod
+    def exists(cls, index_folder):
+        """
+        Check if the index was saved in the 'index_folder'.
+        """
+        return isfile(join(index_folder, cls.meta_file))
+
+    def __len__(self):
+        return len(self.doc_uids)
+
+    def postings(self, field, term):
+        """
+        Decode the postings list of a word in one of the fields.
+        :param field: The name of the field.
+        :param term: The word (already tokenized).
+        :return: A tuple with the array of document ids and the array of
+        frequencies of the word in those documents.
+        """
+        term_info = self.vocabularies[field].get(term)
+        if not term_info:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+        doc_start, doc_size, tf_start, tf_size, _ = term_info
+        doc_deltas = varbyte_decode(self.docs[field][doc_start:doc_start + doc_size])
+        term_tfs = varbyte_decode(self.tfs[field][tf_start:tf_start + tf_size])
+        return np.cumsum(doc_deltas), term_tfs
+
+    def search(self, query, k=10, fields=None):
+        """
+        Rank the documents for the 'query' using BM25, adding up the scores of
+        the selected fields.
+        :param query: The text of the query.
+        :param k: The amount of documents to return.
+        :param fields: The fields used in the search (by default all of them).
+        :return: A list of tuples with the 'cord_uid' of the documents and their
+        scores, sorted from the highest score to the lowest.
+        """
+        if fields is None:
+            fields = self.fields
+        k1, b = self.meta['k1'], self.meta['b']
+        total_docs = len(self.doc_uids)
+        scores = np.zeros(total_docs, dtype=np.float64)
+        query_terms = set(tokenize(query))
+        for field in fields:
+            if field not in self.vocabularies:
+                raise ValueError(f"The field <{field}> is not in the index.")
+            avg_length = self.meta['avg_lengths'][field] or 1
+            length_norms = k1 * (1 - b + b * self.lengths[field] / avg_length)
+            for term in query_terms:
+                term_docs, term_tfs = self.postings(field, term)
+                if not len(term_docs):
+                    continue
+                doc_freq = len(term_docs)
+                idf = np.log(1 + (total_docs - doc_freq + 0.5) / (doc_freq + 0.5))
+                term_scores = idf * term_tfs * (k1 + 1) / (term_tfs + length_norms[term_docs])
+                scores += np.bincount(term_docs, weights=term_scores, minlength=total_docs)
+        # Get the best documents (only the ones that contain a word of the
+        # query).
+        best_docs = top_k(scores, k)
+        best_docs = best_docs[scores[best_docs] > 0]
+        return [(self.doc_uids[doc_id], float(scores[doc_id])) for doc_id in best_docs]
+
+
+def build_bm25_index(index_folder, documents, fields, meta=None, max_postings=2 ** 24,
+                     k1=1.2, b=0.75):
+    """
+    Create the BM25 index of the documents in a single pass. The postings are
+    kept in memory until they reach 'max_postings', then they are saved to a
+    temporary run, and at the end all the runs are merged in the final
+    compressed postings lists.
+    :param index_folder: The folder where the index will be saved.
+    :param documents: An iterable of tuples with the 'cord_uid' of a document
+    and a dictionary with the text of its fields.
+    :param fields: The names of the fields we are going to index.
+    :param meta: Dictionary with extra information saved with the index.
+    :param max_postings: The maximum amount of postings kept in memory.
+    :param k1: The BM25 parameter for the saturation of the frequencies.
+    :param b: The BM25 parameter for the normalization of the lengths.
+    """
+    # Create a clean folder for the index.
+    if isdir(index_folder):
+        shutil.rmtree(index_folder)
+    mkdir(index_folder)
+    runs_folder = join(index_folder, 'runs')
+    mkdir(runs_folder)
+
+    doc_uids = []
+    field_lengths = {field: array('I') for field in fields}
+    run_postings = {field: {} for field in fields}
+    run_size = 0
+    run_count = 0
+    for doc_id, (cord_uid, doc_fields) in enumerate(documents):
+        doc_uids.append(cord_uid)
+        for field in fields:
+            terms = tokenize(doc_fields.get(field, ''))
+            field_lengths[field].append(len(terms))
+            field_postings = run_postings[field]
+            for term, term_freq in Counter(terms).items():
+                term_postings = field_postings.get(term)
+                if term_postings is None:
+                    term_postings = field_postings[term] = (array('I'), array('I'))
+                term_postings[0].append(doc_id)
+                term_postings[1].append(term_freq)
+                run_size += 1
+        # Save the postings in a run when we reach the limit.
+        if run_size >= max_postings:
+            _save_run(runs_folder, run_count, run_postings)
+            run_postings = {field: {} for field in fields}
+            run_size = 0
+            run_count += 1
+    if run_size or not run_count:
+        _save_run(runs_folder, run_count, run_postings)
+        run_count += 1
+
+    # Merge the runs in the final postings lists.
+    avg_lengths = {}
+    for field in fields:
+        _merge_runs(index_folder, runs_folder, run_count, field)
+        lengths = np.frombuffer(field_lengths[field], dtype=np.uint32)
+        lengths.tofile(join(index_folder, field + '.lengths'))
+        avg_lengths[field] = float(lengths.mean()) if len(lengths) else 0.0
+    shutil.rmtree(runs_folder)
+
+    # Save the documents and the information of the index (the meta file is
+    # saved last, it marks the index as complete).
+    with open(join(index_folder, BM25Index.doc_uids_file), 'w') as file:
+        json.dump(doc_uids, file)
+    index_meta = dict(meta or {})
+    index_meta.update({
+        'fields': list(fields),
+        'documents': len(doc_uids),
+        'avg_lengths': avg_lengths,
+        'k1': k1,
+        'b': b,
+    })
+    with open(join(index_folder, BM25Index.meta_file), 'w') as file:
+        json.dump(index_meta, file)
+
+
+def _save_run(runs_folder, run_number, run_postings):
+    """
+    Save the postings accumulated in memory in the files of a run, with the
+    words sorted.
+    """
+    for field, field_postings in run_postings.items():
+        run_vocab = {}
+        position = 0
+        run_path = join(runs_folder, f"{run_number}_{field}")
+        with open(run_path + '.docs', 'wb') as docs_file, open(run_path + '.tfs', 'wb') as tfs_file:
+            for term in sorted(field_postings):
+                term_docs, term_tfs = field_postings[term]
+                term_docs.tofile(docs_file)
+                term_tfs.tofile(tfs_file)
+                run_vocab[term] = (position, len(term_docs))
+                position += len(term_docs)
+        with open(run_path + '.vocab.json', 'w') as file:
+            json.dump(run_vocab, file)
+
+
+def _merge_runs(index_folder, runs_folder, run_count, field):
+    """
+    Merge the postings of a field in all the runs, delta-encoding the ids of the
+    documents and compressing the postings lists with variable bytes. The runs
+    contain consecutive documents, so the postings of a word are merged
+    concatenating them in the order of the runs.
+    """
+    run_vocabs = []
+    run_docs = []
+    run_tfs = []
+    for run_number in range(run_count):
+        run_path = join(runs_folder, f"{run_number}_{field}")
+        with open(run_path + '.vocab.json', 'r') as file:
+            run_vocabs.append(json.load(file))
+        run_docs.append(_load_bytes(run_path + '.docs', np.uint32))
+        run_tfs.append(_load_bytes(run_path + '.tfs', np.uint32))
+
+    vocabulary = {}
+    doc_position = 0
+    tf_position = 0
+    field_path = join(index_folder, field)
+    all_terms = sorted(set().union(*run_vocabs))
+    with open(field_path + '.docs', 'wb') as docs_file, open(field_path + '.tfs', 'wb') as tfs_file:
+        for term in all_terms:
+            term_docs = []
+            term_tfs = []
+            for run_vocab, docs, tfs in zip(run_vocabs, run_docs, run_tfs):
+                if term in run_vocab:
+                    start, size = run_vocab[term]
+                    term_docs.append(docs[start:start + size])
+                    term_tfs.append(tfs[start:start + size])
+            term_docs = np.concatenate(term_docs)
+            term_tfs = np.concatenate(term_tfs)
+            # Save the gaps between the documents instead of their ids.
+            doc_deltas = np.diff(term_docs, prepend=np.uint32(0))
+            encoded_docs = varbyte_encode(doc_deltas)
+            encoded_tfs = varbyte_encode(term_tfs)
+            encoded_docs.tofile(docs_file)
+            encoded_tfs.tofile(tfs_file)
+            vocabulary[term] = [
+                doc_position, len(encoded_docs), tf_position, len(encoded_tfs), len(term_docs)
+            ]
+            doc_position += len(encoded_docs)
+            tf_position += len(encoded_tfs)
+    with open(field_path + '.vocab.json', 'w') as file:
+        json.dump(vocabulary, file)
+
+
+def tokenize(text):
+    """
+    Split a text in its lowercase words.
+    :param text: The string with the text.
+    :return: A list of strings.
+    """
+    return _word_pattern.findall(text.lower())
+
+
+def word_spans(text):
+    """
+    Find the lowercase words of a text and their position in it.
+    :param text: The string with the text.
+    :return: A list of (word, start, end) tuples, with the characters of the
+    word in 'text[start:end]'.
+    """
+    return [(match.group().lower(), match.start(), match.end()) for match in _word_pattern.finditer(text)]
+
+
+def varbyte_encode(values):
+    """
+    Encode non-negative integers using 7 bits per byte, the highest bit of a
+    byte indicates that the next byte belongs to the same number.
+    :param values: The NumPy array with the integers (smaller than 2^35).
+    :return: A uint8 NumPy array with the encoded values.
+    """
+    values = np.asarray(values, dtype=np.uint64)
+    # Amount of bytes needed by each value.
+    value_sizes = np.ones(len(values), dtype=np.int64)
+    for size in range(1, 5):
+        value_sizes += values >= (1 << (7 * size))
+    value_ends = np.cumsum(value_sizes)
+    value_starts = value_ends - value_sizes
+    encoded = np.empty(int(value_ends[-1]) if len(values) else 0, dtype=np.uint8)
+    for byte in range(5):
+        in_use = value_sizes > byte
+        if not in_use.any():
+            break
+        byte_values = (values[in_use] >> np.uint64(7 * byte)) & np.uint64(0x7F)
+        # Mark the bytes that are followed by another byte of the same value.
+        continues = value_sizes[in_use] > byte + 1
+        byte_values |= continues.astype(np.uint64) << np.uint64(7)
+        encoded[value_starts[in_use] + byte] = byte_values
+    return encoded
+
+
+def varbyte_decode(encoded):
+    """
+    Decode the integers encoded with 'varbyte_encode'.
+    :param encoded: The uint8 NumPy array with the encoded values.
+    :return: An int64 NumPy array with the integers.
+    """
+    encoded = np.asarray(encoded, dtype=np.uint8)
+    if not len(encoded):
+        return np.zeros(0, dtype=np.int64)
+    # Find where each value starts and the position of each byte in its value.
+    is_last = encoded < 0x80
+    value_starts = np.flatnonzero(np.concatenate(([True], is_last[:-1])))
+    value_ids = np.cumsum(np.concatenate(([False], is_last[:-1])))
+    byte_positions = np.arange(len(encoded)) - value_starts[value_ids]
+    parts = (encoded & 0x7F).astype(np.int64) << (7 * byte_positions)
+    return np.add.reduceat(parts, value_starts)
+
+
+def _load_bytes(file_path, dtype):
+    """
+    Memory-map a binary file as an array of the given 'dtype' (empty files are
+    loaded as empty arrays).
+    """
+    if not getsize(file_path):
+        return np.zeros(0, dtype=dtype)
+    return np.memmap(file_path, dtype=dtype, mode='r')
@@ -0,0 +1,216 @@
+# Gelin Eguinosa Rosique
+
+import sys
+from threading import Lock
+from collections import OrderedDict, defaultdict
+
+
+class ByteCache:
+    """
+    Cache of values limited by the amount of bytes they occupy in memory, rather
+    than by the amount of entries. It keeps count of the hits, misses and
+    evictions. The subclasses decide which entries are evicted when the cache
+    is full.
+
+    The cache can be shared by several threads.
+    """
+
+    def __init__(self, max_bytes):
+        """
+        Create the counters and the structures of the cache.
+        :param max_bytes: The maximum amount of bytes stored in the cache (if 0,
+        nothing is stored).
+        """
+        self.max_bytes = max_bytes
+        self.current_bytes = 0
+        # The values in the cache and their sizes.
+        self.values = {}
+        self.sizes = {}
+        # Counters of the cache.
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        # Lock to use the cache from several threads.
+        self.lock = Lock()
+
+    def __len__(self):
+        return len(self.values)
+
+    def __contains__(self, key):
+        return key in self.values
+
+    def get(self, key, default=None):
+        """
+        Get the value saved for the 'key', updating the counters of the cache.
+        :param key: The key of the value.
+        :param default: The value returned if the key is not in the cache.
+        :return: The value of the key, or 'default' if it's not in the cache.
+        """
+        with self.lock:
+            if key not in self.values:
+                self.misses += 1
+                return default
+            self.hits += 1
+            self._touch(key)
+            return self.values[key]
+
+    def put(self, key, value, size=None):
+        """
+        Save the 'value' of the 'key', evicting entries until the total size of
+        the cache is under the maximum. If the value is bigger than the cache,
+        it is not saved.
+        :param key: The key of the value.
+        :param value: The value we want to save.
+        :param size: The size of the value in bytes (if None, it is estimated
+        with 'sys.getsizeof').
+        """
+        if size is None:
+            size = sys.getsizeof(value)
+        with self.lock:
+            if key in self.values:
+                self._discard(key)
+            if size > self.max_bytes:
+                return
+            # Make space for the value.
+            while self.current_bytes + size > self.max_bytes:
+                self._discard(self._victim())
+                self.evictions += 1
+            self.values[key] = value
+            self.sizes[key] = size
+            self.current_bytes += size
+            self._add(key)
+
+    def clear(self):
+        """
+        Remove all the values of the cache (the counters are not reset).
+        """
+        with self.lock:
+            for key in list(self.values):
+                self._discard(key)
+
+    def stats(self):
+        """
+        Get the counters of the cache.
+        :return: A dictionary with the hits, misses, evictions, entries and
+        bytes used by the cache.
+        """
+        cache_stats = {
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'entries': len(self.values),
+            'bytes': self.current_bytes,
+            'max_bytes': self.max_bytes,
+        }
+        return cache_stats
+
+    def _discard(self, key):
+        """
+        Remove the key from the cache.
+        """
+        del self.values[key]
+        self.current_bytes -= self.sizes.pop(key)
+        self._remove(key)
+
+    def _add(self, key):
+        """
+        Register a new key in the eviction policy.
+        """
+        raise NotImplementedError
+
+    def _touch(self, key):
+        """
+        Register a use of the key in the eviction policy.
+        """
+        raise NotImplementedError
+
+    def _remove(self, key):
+        """
+        Remove the key from the eviction policy.
+        """
+        raise NotImplementedError
+
+    def _victim(self):
+        """
+        Select the key that will be evicted next.
+        """
+        raise NotImplementedError
+
+
+class LRUCache(ByteCache):
+    """
+    Cache that evicts the Least Recently Used values first.
+    """
+
+    def __init__(self, max_bytes):
+        super().__init__(max_bytes)
+        # The keys from the least recently used to the most recently used.
+        self.recent_keys = OrderedDict()
+
+    def _add(self, key):
+        self.recent_keys[key] = None
+
+    def _touch(self, key):
+        self.recent_keys.move_to_end(key)
+
+    def _remove(self, key):
+        del self.recent_keys[key]
+
+    def _victim(self):
+        return next(iter(self.recent_keys))
+
+
+class LFUCache(ByteCache):
+    """
+    Cache that evicts the Least Frequently Used values first (the least recently
+    used among the values with the same frequency).
+    """
+
+    def __init__(self, max_bytes):
+        super().__init__(max_bytes)
+        # The amount of uses of each key, and the keys with each frequency.
+        self.key_uses = {}
+        self.frequency_keys = defaultdict(OrderedDict)
+        self.min_frequency = 0
+
+    def _add(self, key):
+        self.key_uses[key] = 1
+        self.frequency_keys[1][key] = None
+        self.min_frequency = 1
+
+    def _touch(self, key):
+        uses = self.key_uses[key]
+        self._remove(key)
+        self.key_uses[key] = uses + 1
+        self.frequency_keys[uses + 1][key] = None
+        if not self.frequency_keys.get(self.min_frequency):
+            self.min_frequency = uses + 1
+
+    def _remove(self, key):
+        uses = self.key_uses.pop(key)
+        same_frequency = self.frequency_keys[uses]
+        del same_frequency[key]
+        if not same_frequency:
+            del self.frequency_keys[uses]
+
+    def _victim(self):
+        # The minimum frequency can be outdated after removing keys.
+        if self.min_frequency not in self.frequency_keys:
+            self.min_frequency = min(self.frequency_keys)
+        return next(iter(self.frequency_keys[self.min_frequency]))
+
+
+def create_cache(max_bytes, policy='lru'):
+    """
+    Create a cache with the given eviction policy.
+    :param max_bytes: The maximum amount of bytes stored in the cache.
+    :param policy: The eviction policy, 'lru' (Least Recently Used) or 'lfu'
+    (Least Frequently Used).
+    :return: The ByteCache.
+    """
+    if policy == 'lru':
+        return LRUCache(max_bytes)
+    elif policy == 'lfu':
+        return LFUCache(max_bytes)
+    else:
+        raise ValueError(f"Unknown cache policy <{policy}>.")
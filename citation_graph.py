@@ -0,0 +1,234 @@
+# Gelin Eguinosa Rosique
+
+import hashlib
+from os.path import isfile
+import numpy as np
+from bm25_index import tokenize
+
+
+class CitationGraph:
+    """
+    Graph of the citations between the papers of the corpus, stored in CSR
+    form: the references of the paper 'i' are the papers in 'ref_targets'
+    between 'ref_offsets[i]' and 'ref_offsets[i + 1]', and the papers citing
+    it are stored in the same way in 'cited_sources'. The papers are the nodes
+    of the graph, in the order of 'cord_uids'.
+    """
+
+    def __init__(self, cord_uids, ref_offsets, ref_targets, fingerprint='', stats=None):
+        """
+        Save the arrays of the graph, and create the reverse graph.
+        :param cord_uids: The array with the 'cord_uid' of the papers.
+        :param ref_offsets: The int64 array with the start of the references
+        of each paper (one more element than papers).
+        :param ref_targets: The int32 array with the papers referenced.
+        :param fingerprint: The fingerprint of the papers' index when the
+        graph was built (to detect it is outdated).
+        :param stats: The int64 array with the amount of references found and
+        the amount resolved to a paper of the corpus.
+        """
+        self.cord_uids = cord_uids
+        self.ref_offsets = ref_offsets
+        self.ref_targets = ref_targets
+        self.fingerprint = fingerprint
+        self.stats = stats if stats is not None else np.zeros(2, dtype=np.int64)
+        # The papers citing each paper (the edges sorted by target).
+        citing_order = np.argsort(ref_targets, kind='stable')
+        self.cited_sources = self._edge_sources()[citing_order].astype(np.int32)
+        self.cited_offsets = np.zeros(len(cord_uids) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(ref_targets, minlength=len(cord_uids)), out=self.cited_offsets[1:])
+        self.uid_positions = None
+
+    def __len__(self):
+        return len(self.cord_uids)
+
+    @classmethod
+    def load(cls, graph_path):
+        """
+        Load the graph saved with 'save()'.
+        :param graph_path: The path of the '.npz' file.
+        :return: The CitationGraph, or None if the file doesn't exist.
+        """
+        if not isfile(graph_path):
+            return None
+        with np.load(graph_path) as graph_data:
+            graph = cls(
+                graph_data['cord_uids'], graph_data['ref_offsets'], graph_data['ref_targets'],
+                str(graph_data['fingerprint']), graph_data['stats']
+            )
+        return graph
+
+    def save(self, graph_path):
+        """
+        Save the arrays of the graph in a '.npz' file.
+        :param graph_path: The path of the file.
+        """
+        with open(graph_path, 'wb') as file:
+            np.savez(
+                file, cord_uids=self.cord_uids, ref_offsets=self.ref_offsets,
+                ref_targets=self.ref_targets, fingerprint=self.fingerprint, stats=self.stats
+            )
+
+    def references(self, cord_uid):
+        """
+        Get the papers of the corpus referenced by the 'cord_uid' paper.
+        :param cord_uid: The Unique Identifier of the CORD-19 paper.
+        :return: The array with the 'cord_uid' of the referenced papers.
+        """
+        node = self._node(cord_uid)
+        return self.cord_uids[self.ref_targets[self.ref_offsets[node]:self.ref_offsets[node + 1]]]
+
+    def cited_by(self, cord_uid):
+        """
+        Get the papers of the corpus citing the 'cord_uid' paper.
+        :param cord_uid: The Unique Identifier of the CORD-19 paper.
+        :return: The array with the 'cord_uid' of the citing papers.
+        """
+        node = self._node(cord_uid)
+        return self.cord_uids[self.cited_sources[self.cited_offsets[node]:self.cited_offsets[node + 1]]]
+
+    def pagerank(self, damping=0.85, tolerance=1e-10, max_iterations=100):
+        """
+        Calculate the PageRank of the papers with the power method, each
+        iteration a single pass over the edges. The rank of the papers without
+        references is spread over all the papers.
+        :param damping: The probability of following a reference.
+        :param tolerance: The iterations stop when the ranks change less than
+        this (sum of the absolute differences).
+        :param max_iterations: The maximum amount of iterations.
+        :return: The float64 array with the rank of each paper (in the order of
+        'cord_uids', adding up to 1).
+        """
+        n_papers = len(self.cord_uids)
+        if n_papers == 0:
+            return np.zeros(0, dtype=np.float64)
+        out_degrees = np.diff(self.ref_offsets)
+        edge_sources = self._edge_sources()
+        dangling = out_degrees == 0
+        # The weight of each edge is the inverse of the degree of its source.
+        edge_weights = 1.0 / out_degrees[edge_sources]
+        ranks = np.full(n_papers, 1.0 / n_papers)
+        for _ in range(max_iterations):
+            cited_ranks = np.bincount(
+                self.ref_targets, weights=ranks[edge_sources] * edge_weights, minlength=n_papers
+            )
+            new_ranks = (1 - damping + damping * ranks[dangling].sum()) / n_papers + damping * cited_ranks
+            change = np.abs(new_ranks - ranks).sum()
+            ranks = new_ranks
+            if change < tolerance:
+                break
+        return ranks
+
+    def _edge_sources(self):
+        """
+        Create the array with the source paper of each edge.
+        """
+        return np.repeat(np.arange(len(self.cord_uids)), np.diff(self.ref_offsets))
+
+    def _node(self, cord_uid):
+        """
+        Get the position of the 'cord_uid' paper in the graph.
+        """
+        if self.uid_positions is None:
+            self.uid_positions = {
+                paper_uid: position for position, paper_uid in enumerate(self.cord_uids.tolist())
+            }
+        return self.uid_positions[cord_uid]
+
+
+def build_citation_graph(cord_uids, titles, dois, papers_references, min_title_words=4):
+    """
+    Create the citation graph, resolving the references of the papers to the
+    papers of the corpus by their DOI or, if they don't have one in the
+    corpus, by their normalised title. The DOIs and titles of the corpus are
+    kept in a hash index with a 64-bit key per paper.
+    :param cord_uids: The list with the 'cord_uid' of the papers.
+    :param titles: The list with the titles of the papers.
+    :param dois: The list with the DOIs of the papers (empty strings when the
+    paper doesn't have one).
+    :param papers_references: An iterable with the references of each paper
+    (in the order of 'cord_uids'), each one a list of (title, doi) tuples.
+    :param min_title_words: The minimum amount of words of the titles used to
+    resolve the references (the short titles are too ambiguous).
+    :return: The CitationGraph.
+    """
+    # Create the hash index of the DOIs and titles (the first paper is kept if
+    # several papers share a key).
+    keys_index = {}
+    for node, (title, doi) in enumerate(zip(titles, dois)):
+        doi_key = _doi_key(doi)
+        if doi_key is not None:
+            keys_index.setdefault(doi_key, node)
+        title_key = _title_key(title, min_title_words)
+        if title_key is not None:
+            keys_index.setdefault(title_key, node)
+
+    # Resolve the references of each paper.
+    ref_offsets = np.zeros(len(cord_uids) + 1, dtype=np.int64)
+    ref_targets = []
+    stats = np.zeros(2, dtype=np.int64)
+    for node, references in enumerate(papers_references):
+        targets = set()
+        for title, doi in references:
+            stats[0] += 1
+            target = keys_index.get(_doi_key(doi))
+            if target is None:
+                target = keys_index.get(_title_key(title, min_title_words))
+            if target is not None:
+                stats[1] += 1
+                if target != node:
+                    targets.add(target)
+        ref_targets += sorted(targets)
+        ref_offsets[node + 1] = len(ref_targets)
+    graph = CitationGraph(
+        np.array(list(cord_uids), dtype=str), ref_offsets,
+        np.array(ref_targets, dtype=np.int32), stats=stats
+    )
+    return graph
+
+
+def normalize_title(title):
+    """
+    Normalise a title to compare it with other titles: lowercase words without
+    punctuation, separated by single spaces.
+    """
+    return ' '.join(tokenize(title or ''))
+
+
+def normalize_doi(doi):
+    """
+    Normalise a DOI, removing the URL or 'doi:' prefix and the case.
+    """
+    doi = (doi or '').strip().lower()
+    for prefix in ('https://doi.org/', 'http://doi.org/', 'http://dx.doi.org/', 'doi:'):
+        if doi.startswith(prefix):
+            doi = doi[len(prefix):].strip()
+    return doi
+
+
+def _title_key(title, min_title_words):
+    """
+    Create the key of a title in the hash index (None if the title is too
+    short).
+    """
+    title = normalize_title(title)
+    if len(title.split()) < min_title_words:
+        return None
+    return _hash_key('title:' + title)
+
+
+def _doi_key(doi):
+    """
+    Create the key of a DOI in the hash index (None if it is empty).
+    """
+    doi = normalize_doi(doi)
+    if not doi:
+        return None
+    return _hash_key('doi:' + doi)
+
+
+def _hash_key(text):
+    """
+    Create a 64-bit integer key of a text.
+    """
+    return int.from_bytes(hashlib.blake2b(text.encode('utf-8'), digest_size=8).digest(), 'little')
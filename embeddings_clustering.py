@@ -0,0 +1,304 @@
+# Gelin Eguinosa Rosique
+
+from os.path import isfile
+import numpy as np
+from embeddings_search import normalize_vector
+from prefetch import prefetch_map
+
+# The papers and centroids used by the process of a pool (see
+# '_init_assign_worker').
+_worker_papers = None
+_worker_centroids = None
+
+
+class EmbeddingsClustering:
+    """
+    Groups of papers with similar embeddings, found with a spherical mini-batch
+    k-means (cosine similarity) over the embeddings' matrix. The clusters can
+    be merged in a hierarchy of broader topics, joining the two most similar
+    clusters at each step.
+    """
+
+    def __init__(self, centroids, counts, cord_uids, labels, merges=None, fingerprint=''):
+        """
+        Save the results of the clustering.
+        :param centroids: The float32 matrix with the normalised centroids.
+        :param counts: The amount of papers in each cluster.
+        :param cord_uids: The array with the 'cord_uid' of the papers.
+        :param labels: The int32 array with the cluster of each paper.
+        :param merges: The int64 matrix with the merges of the hierarchy, each
+        row with the two clusters merged and the id of the new cluster (the
+        ids after the original clusters are the merged clusters).
+        :param fingerprint: The fingerprint of the embeddings when the papers
+        were clustered (to detect the clustering is outdated).
+        """
+        self.centroids = centroids
+        self.counts = counts
+        self.cord_uids = cord_uids
+        self.labels = labels
+        self.merges = merges if merges is not None else np.zeros((0, 3), dtype=np.int64)
+        self.fingerprint = fingerprint
+        self.uid_positions = None
+
+    def __len__(self):
+        return len(self.centroids)
+
+    @classmethod
+    def load(cls, clusters_path):
+        """
+        Load the clustering saved with 'save()'.
+        :param clusters_path: The path of the '.npz' file.
+        :return: The EmbeddingsClustering, or None if the file doesn't exist.
+        """
+        if not isfile(clusters_path):
+            return None
+        with np.load(clusters_path) as clusters_data:
+            clustering = cls(
+                clusters_data['centroids'], clusters_data['counts'],
+                clusters_data['cord_uids'], clusters_data['labels'],
+                clusters_data['merges'], str(clusters_data['fingerprint'])
+            )
+        return clustering
+
+    def save(self, clusters_path):
+        """
+        Save the centroids, the clusters of the papers and the hierarchy in a
+        '.npz' file.
+        :param clusters_path: The path of the file.
+        """
+        with open(clusters_path, 'wb') as file:
+            np.savez(
+                file, centroids=self.centroids, counts=self.counts,
+                cord_uids=self.cord_uids, labels=self.labels, merges=self.merges,
+                fingerprint=self.fingerprint
+            )
+
+    def paper_cluster(self, cord_uid):
+        """
+        Get the cluster of the 'cord_uid' paper.
+        :param cord_uid: The Unique Identifier of the CORD-19 paper.
+        :return: The id of the cluster.
+        """
+        if self.uid_positions is None:
+            self.uid_positions = {
+                paper_uid: position for position, paper_uid in enumerate(self.cord_uids.tolist())
+            }
+        return int(self.labels[self.uid_positions[cord_uid]])
+
+    def cluster_papers(self, cluster):
+        """
+        Get the papers of a cluster.
+        :param cluster: The id of the cluster.
+        :return: The array with the 'cord_uid' of its papers.
+        """
+        return self.cord_uids[self.labels == cluster]
+
+    def merge_hierarchy(self):
+        """
+        Build the hierarchy of the clusters, merging the two clusters with the
+        most similar centroids until only one is left. The centroid of a merged
+        cluster is the (normalised) weighted mean of its two clusters. Each
+        merge looks for the most similar pair in the whole matrix of
+        similarities, so it takes O(n^3) time with 'n' clusters (fine for a few
+        hundred clusters, not for thousands).
+        :return: The matrix with the merges.
+        """
+        n_clusters = len(self.centroids)
+        # The clusters still active, with their centroids and sizes (the
+        # merged clusters take the first free position).
+        centroids = self.centroids.astype(np.float32)
+        sizes = self.counts.astype(np.float64)
+        cluster_ids = np.arange(n_clusters)
+        active = np.ones(n_clusters, dtype=bool)
+        similarities = centroids @ centroids.T
+        np.fill_diagonal(similarities, -np.inf)
+        merges = []
+        next_id = n_clusters
+        for _ in range(n_clusters - 1):
+            best = int(np.argmax(similarities))
+            first, second = divmod(best, n_clusters)
+            merges.append((cluster_ids[first], cluster_ids[second], next_id))
+            # Place the merged cluster in the first position.
+            total = sizes[first] + sizes[second]
+            merged = (sizes[first] * centroids[first] + sizes[second] * centroids[second])
+            centroids[first] = normalize_vector(merged / max(total, 1))
+            sizes[first] = total
+            cluster_ids[first] = next_id
+            next_id += 1
+            active[second] = False
+            similarities[second, :] = -np.inf
+            similarities[:, second] = -np.inf
+            new_similarities = centroids @ centroids[first]
+            new_similarities[~active] = -np.inf
+            new_similarities[first] = -np.inf
+            similarities[first, :] = new_similarities
+            similarities[:, first] = new_similarities
+        self.merges = np.array(merges, dtype=np.int64).reshape(-1, 3)
+        return self.merges
+
+    def topic_labels(self, n_topics):
+        """
+        Group the clusters in 'n_topics' topics, cutting the hierarchy.
+        :param n_topics: The amount of topics.
+        :return: The int32 array with the topic of each paper (the topics are
+        numbered from 0).
+        """
+        n_clusters = len(self.centroids)
+        if len(self.merges) < n_clusters - 1:
+            self.merge_hierarchy()
+        # Follow the merges until only 'n_topics' groups are left.
+        parents = np.arange(2 * n_clusters - 1)
+        for first, second, new_id in self.merges[:max(n_clusters - n_topics, 0)].tolist():
+            parents[first] = new_id
+            parents[second] = new_id
+        roots = np.arange(n_clusters)
+        while True:
+            new_roots = parents[roots]
+            if np.array_equal(new_roots, roots):
+                break
+            roots = new_roots
+        # Number the topics from 0.
+        _, cluster_topics = np.unique(roots, return_inverse=True)
+        return cluster_topics[self.labels].astype(np.int32)
+
+
+def minibatch_kmeans(papers, n_clusters, cord_uids=None, batch_size=4096, n_epochs=3,
+                     workers=1, seed=0):
+    """
+    Cluster the embeddings of the papers with a spherical mini-batch k-means.
+    The embeddings are read in batches, so the memory used doesn't depend on
+    the amount of papers. Each batch moves the centroids towards the mean of
+    the embeddings assigned to them, with a learning rate that decreases with
+    the amount of embeddings the cluster has seen. At the end, all the papers
+    are assigned to their closest centroid (in a pool of processes, if
+    'workers' is bigger than 1).
+    :param papers: The Papers instance with the embeddings.
+    :param n_clusters: The amount of clusters.
+    :param cord_uids: The papers we want to cluster (by default all the papers
+    with an embedding).
+    :param batch_size: The amount of embeddings in each batch.
+    :param n_epochs: The amount of passes over the embeddings.
+    :param workers: The amount of processes used in the final assignment.
+    :param seed: The seed of the random generator.
+    :return: The EmbeddingsClustering with the centroids and the clusters of
+    the papers.
+    """
+    if cord_uids is None:
+        cord_uids = sorted(papers.embeds_index, key=papers.embeds_index.get)
+    cord_uids = np.array(list(cord_uids), dtype=str)
+    if len(cord_uids) == 0:
+        raise ValueError("There are no embeddings to cluster.")
+    n_clusters = max(1, min(n_clusters, len(cord_uids)))
+    rand_gen = np.random.default_rng(seed)
+
+    # Pick the initial centroids with k-means++ in a sample of the papers.
+    sample_size = min(len(cord_uids), max(10 * n_clusters, batch_size))
+    sample_uids = cord_uids[np.sort(rand_gen.choice(len(cord_uids), sample_size, replace=False))]
+    centroids = kmeans_plus_plus(
+        _normalize_rows(papers.embeddings_matrix(sample_uids)), n_clusters, rand_gen
+    )
+    seen = np.zeros(n_clusters, dtype=np.float64)
+    for _ in range(n_epochs):
+        epoch_uids = cord_uids[rand_gen.permutation(len(cord_uids))]
+        for _, batch in papers.embeddings_batches(epoch_uids, batch_size=batch_size):
+            batch = _normalize_rows(batch)
+            batch_labels = np.argmax(batch @ centroids.T, axis=1)
+            batch_counts = np.bincount(batch_labels, minlength=n_clusters)
+            batch_sums = np.zeros_like(centroids)
+            np.add.at(batch_sums, batch_labels, batch)
+            # Move each centroid towards the embeddings of its cluster.
+            seen += batch_counts
+            updated = batch_counts > 0
+            rates = batch_counts[updated] / seen[updated]
+            batch_means = batch_sums[updated] / batch_counts[updated, None]
+            centroids[updated] += rates[:, None] * (batch_means - centroids[updated])
+            centroids[updated] = _normalize_rows(centroids[updated])
+
+    labels = assign_clusters(papers, centroids, cord_uids, batch_size, workers)
+    counts = np.bincount(labels, minlength=n_clusters)
+    return EmbeddingsClustering(centroids, counts, cord_uids, labels)
+
+
+def kmeans_plus_plus(vectors, n_clusters, rand_gen):
+    """
+    Pick 'n_clusters' of the normalised vectors as initial centroids, each one
+    chosen with a probability proportional to its cosine distance to the
+    closest centroid already chosen.
+    :param vectors: The normalised float32 vectors.
+    :param n_clusters: The amount of centroids.
+    :param rand_gen: The NumPy random generator.
+    :return: The float32 matrix with the centroids.
+    """
+    chosen = [int(rand_gen.integers(len(vectors)))]
+    distances = np.maximum(1 - vectors @ vectors[chosen[0]], 0)
+    for _ in range(1, n_clusters):
+        total = distances.sum()
+        if total > 0:
+            next_row = int(rand_gen.choice(len(vectors), p=distances / total))
+        else:
+            next_row = int(rand_gen.integers(len(vectors)))
+        chosen.append(next_row)
+        np.minimum(distances, np.maximum(1 - vectors @ vectors[next_row], 0), out=distances)
+    return vectors[chosen].copy()
+
+
+def assign_clusters(papers, centroids, cord_uids, batch_size=4096, workers=1):
+    """
+    Find the closest centroid of the embeddings of the papers.
+    :param papers: The Papers instance with the embeddings.
+    :param centroids: The float32 matrix with the normalised centroids.
+    :param cord_uids: The array with the 'cord_uid' of the papers.
+    :param batch_size: The amount of embeddings compared at a time.
+    :param workers: The amount of processes (each one opens the papers in
+    read-only mode).
+    :return: The int32 array with the cluster of each paper.
+    """
+    batches = [cord_uids[start:start + batch_size] for start in range(0, len(cord_uids), batch_size)]
+    if workers > 1:
+        batch_labels = prefetch_map(
+            _assign_worker_batch, batches, workers=workers, processes=True,
+            initializer=_init_assign_worker, initargs=(type(papers), centroids)
+        )
+    else:
+        batch_labels = (_assign_batch(papers, centroids, batch) for batch in batches)
+    labels = np.empty(len(cord_uids), dtype=np.int32)
+    position = 0
+    for labels_batch in batch_labels:
+        labels[position:position + len(labels_batch)] = labels_batch
+        position += len(labels_batch)
+    return labels
+
+
+def _assign_batch(papers, centroids, batch_uids):
+    """
+    Find the closest centroid of the embeddings of a batch of papers.
+    """
+    batch = papers.embeddings_matrix(batch_uids)
+    # The norms of the embeddings don't change the closest centroid.
+    return np.argmax(batch @ centroids.T, axis=1).astype(np.int32)
+
+
+def _init_assign_worker(papers_class, centroids):
+    """
+    Open the papers in a process of the pool, and save the centroids.
+    """
+    global _worker_papers, _worker_centroids
+    _worker_papers = papers_class.open(cache_bytes=0)
+    _worker_centroids = centroids
+
+
+def _assign_worker_batch(batch_uids):
+    """
+    Assign a batch of papers in a process of the pool.
+    """
+    return _assign_batch(_worker_papers, _worker_centroids, batch_uids)
+
+
+def _normalize_rows(matrix):
+    """
+    Normalise the rows of a matrix (the rows equal to zero are left as they
+    are).
+    """
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1
+    return (matrix / norms).astype(np.float32)
@@ -0,0 +1,363 @@
+# Gelin Eguinosa Rosique
+
+from os.path import isfile, getsize
+import numpy as np
+from atomic_files import write_json_atomic, load_json
+from embeddings_search import ExactSearch, row_norms, normalize_vector, top_k
+
+# The compressed formats available for the embeddings' matrix.
+quantization_modes = ['float16', 'int8']
+
+
+class QuantizedMatrix:
+    """
+    Read-only matrix of embeddings stored in a compressed format (float16, or
+    int8 with a scale per dimension). The rows are decoded to float32 when they
+    are accessed, so it can be used in place of the float32 matrix.
+    """
+
+    def __init__(self, codes, scales=None, fingerprint=''):
+        """
+        Save the compressed values of the matrix.
+        :param codes: The float16 or int8 matrix (or memmap) with the values.
+        :param scales: The float32 scale of each dimension (only for int8).
+        :param fingerprint: The fingerprint of the embeddings when the matrix
+        was compressed (to detect it is outdated).
+        """
+        self.codes = codes
+        self.scales = scales
+        self.fingerprint = fingerprint
+        self.shape = codes.shape
+
+    def __len__(self):
+        return len(self.codes)
+
+    def __getitem__(self, rows):
+        """
+        Decode the selected rows of the matrix.
+        :param rows: A row, a slice or an array of rows.
+        :return: The float32 NumPy array with the values.
+        """
+        values = np.asarray(self.codes[rows], dtype=np.float32)
+        if self.scales is not None:
+            values *= self.scales
+        return values
+
+    @property
+    def nbytes(self):
+        """
+        The amount of bytes used by the values of the matrix.
+        """
+        scales_bytes = self.scales.nbytes if self.scales is not None else 0
+        return self.codes.size * self.codes.itemsize + scales_bytes
+
+
+def save_quantized_matrix(matrix, mode, codes_path, scales_path=None, block_size=32768,
+                          fingerprint=''):
+    """
+    Compress the float32 matrix with the given mode and save it in a binary
+    file, visiting the matrix in blocks. The mode and the 'fingerprint' are
+    saved in a JSON file next to the values, written last.
+    :param matrix: The float32 matrix (or memmap) with the embeddings.
+    :param mode: The compressed format, 'float16' or 'int8'.
+    :param codes_path: The path of the file for the compressed values.
+    :param scales_path: The path of the file for the scales of the dimensions
+    (needed for 'int8').
+    :param block_size: The amount of rows compressed at a time.
+    :param fingerprint: The fingerprint of the embeddings of the matrix.
+    """
+    if mode not in quantization_modes:
+        raise ValueError(f"Unknown quantization mode <{mode}>.")
+    scales = None
+    if mode == 'int8':
+        # Scale each dimension so its largest absolute value is 127.
+        max_values = np.zeros(matrix.shape[1], dtype=np.float32)
+        for start in range(0, len(matrix), block_size):
+            block = np.asarray(matrix[start:start + block_size], dtype=np.float32)
+            np.maximum(max_values, np.abs(block).max(axis=0), out=max_values)
+        scales = max_values / 127
+        scales[scales == 0] = 1
+        scales.tofile(scales_path)
+    with open(codes_path, 'wb') as file:
+        for start in range(0, len(matrix), block_size):
+            block = np.asarray(matrix[start:start + block_size], dtype=np.float32)
+            if mode == 'float16':
+                block.astype(np.float16).tofile(file)
+            else:
+                np.clip(np.rint(block / scales), -127, 127).astype(np.int8).tofile(file)
+    write_json_atomic(codes_path + '.json', {'mode': mode, 'fingerprint': fingerprint})
+
+
+def open_embeddings_matrix(matrix_path, embedding_size, dtype=np.float32):
+    """
+    Memory-map a binary file containing a matrix of embeddings, one row per
+    paper.
+    :param matrix_path: The path of the binary file with the embeddings.
+    :param embedding_size: The number of dimensions of the embeddings.
+    :param dtype: The type of the values in the file.
+    :return: A read-only NumPy memmap with shape (rows, embedding_size).
+    """
+    # Check the matrix is not empty (np.memmap can't map empty files).
+    file_size = getsize(matrix_path)
+    if not file_size or not embedding_size:
+        return np.zeros((0, embedding_size), dtype=dtype)
+    # Get the amount of embeddings saved in the file.
+    rows = file_size // (embedding_size * np.dtype(dtype).itemsize)
+    return np.memmap(matrix_path, dtype=dtype, mode='r', shape=(rows, embedding_size))
+
+
+def open_quantized_matrix(mode, codes_path, embedding_size, scales_path=None):
+    """
+    Memory-map a matrix saved with 'save_quantized_matrix'.
+    :param mode: The compressed format, 'float16' or 'int8'.
+    :param codes_path: The path of the file with the compressed values.
+    :param embedding_size: The number of dimensions of the embeddings.
+    :param scales_path: The path of the file with the scales (for 'int8').
+    :return: The QuantizedMatrix, or None if its files don't exist (or were
+    saved with another mode).
+    """
+    codes_info = load_json(codes_path + '.json')
+    if not isfile(codes_path) or codes_info is None or codes_info['mode'] != mode:
+        return None
+    if mode == 'int8' and not isfile(scales_path):
+        return None
+    dtype = np.float16 if mode == 'float16' else np.int8
+    codes = open_embeddings_matrix(codes_path, embedding_size, dtype)
+    scales = np.fromfile(scales_path, dtype=np.float32) if mode == 'int8' else None
+    return QuantizedMatrix(codes, scales, codes_info['fingerprint'])
+
+
+class ProductQuantizer:
+    """
+    Compress the normalised embeddings splitting them in sub-vectors, and
+    replacing each sub-vector with the id of its closest centroid (one byte).
+    The cosine similarity between a query and the compressed embeddings is
+    calculated with the Asymmetric Distance Computation: the query is not
+    compressed, and its products with all the centroids are looked up for each
+    code.
+    """
+
+    def __init__(self, codebooks, codes, fingerprint=''):
+        """
+        Save the centroids and the codes of the embeddings.
+        :param codebooks: The float32 array (subspaces, centroids, sub-size) with
+        the centroids of each subspace.
+        :param codes: The uint8 matrix (rows, subspaces) with the codes.
+        :param fingerprint: The fingerprint of the embeddings when they were
+        encoded (to detect the codes are outdated).
+        """
+        self.codebooks = codebooks
+        self.codes = codes
+        self.fingerprint = fingerprint
+
+    def __len__(self):
+        return len(self.codes)
+
+    @classmethod
+    def build(cls, matrix, subspaces=96, centroids=256, n_iter=10, sample_size=65536,
+              block_size=32768, seed=0):
+        """
+        Train the centroids of the subspaces with a sample of the normalised
+        embeddings, and encode all the rows of the matrix.
+        :param matrix: The float32 matrix (or memmap) with the embeddings.
+        :param subspaces: The amount of sub-vectors of each embedding (reduced
+        until it divides the size of the embeddings).
+        :param centroids: The amount of centroids per subspace (at most 256).
+        :param n_iter: The iterations of k-means.
+        :param sample_size: The maximum amount of rows used in the training.
+        :param block_size: The amount of rows encoded at a time.
+        :param seed: The seed of the random generator.
+        :return: The ProductQuantizer of the matrix.
+        """
+        total_rows, embedding_size = matrix.shape
+        subspaces = max(1, min(subspaces, embedding_size))
+        while embedding_size % subspaces:
+            subspaces -= 1
+        centroids = max(1, min(centroids, 256, total_rows))
+        norms = row_norms(matrix, block_size)
+
+        # Train the centroids of each subspace.
+        rand_gen = np.random.default_rng(seed)
+        sample_rows = np.arange(total_rows)
+        if total_rows > sample_size:
+            sample_rows = np.sort(rand_gen.choice(total_rows, sample_size, replace=False))
+        sample = np.asarray(matrix[sample_rows], dtype=np.float32) / norms[sample_rows, None]
+        sub_size = embedding_size // subspaces
+        sample = sample.reshape(len(sample), subspaces, sub_size)
+        codebooks = np.stack([
+            euclidean_kmeans(sample[:, i], centroids, n_iter, rand_gen)
+            for i in range(subspaces)
+        ])
+
+        # Encode the matrix.
+        quantizer = cls(codebooks, np.empty((total_rows, subspaces), dtype=np.uint8))
+        for start in range(0, total_rows, block_size):
+            block = np.asarray(matrix[start:start + block_size], dtype=np.float32)
+            block = block / norms[start:start + block_size, None]
+            quantizer.codes[start:start + block_size] = quantizer.encode(block)
+        return quantizer
+
+    @classmethod
+    def load(cls, pq_path):
+        """
+        Load a ProductQuantizer saved with 'save()'.
+        :param pq_path: The path of the '.npz' file.
+        :return: The ProductQuantizer, or None if the file doesn't exist.
+        """
+        if not isfile(pq_path):
+            return None
+        with np.load(pq_path) as pq_data:
+            quantizer = cls(pq_data['codebooks'], pq_data['codes'], str(pq_data['fingerprint']))
+        return quantizer
+
+    def save(self, pq_path):
+        """
+        Save the centroids and codes in a '.npz' file.
+        :param pq_path: The path of the file.
+        """
+        with open(pq_path, 'wb') as file:
+            np.savez(file, codebooks=self.codebooks, codes=self.codes, fingerprint=self.fingerprint)
+
+    @property
+    def nbytes(self):
+        """
+        The amount of bytes used by the codes and the centroids.
+        """
+        return self.codes.nbytes + self.codebooks.nbytes
+
+    def encode(self, vectors):
+        """
+        Find the codes of the (normalised) vectors.
+        :param vectors: The float32 matrix with the vectors.
+        :return: The uint8 matrix with the codes.
+        """
+        subspaces, _, sub_size = self.codebooks.shape
+        sub_vectors = vectors.reshape(len(vectors), subspaces, sub_size)
+        codes = np.empty((len(vectors), subspaces), dtype=np.uint8)
+        for i in range(subspaces):
+            codes[:, i] = _closest_centroids(sub_vectors[:, i], self.codebooks[i])
+        return codes
+
+    def decode(self, codes):
+        """
+        Approximate the normalised vectors from their codes.
+        :param codes: The uint8 matrix with the codes.
+        :return: The float32 matrix with the vectors.
+        """
+        subspaces = self.codebooks.shape[0]
+        sub_vectors = self.codebooks[np.arange(subspaces), codes]
+        return sub_vectors.reshape(len(codes), -1)
+
+    def search(self, query, k=10, exclude=None, row_mask=None, block_size=65536):
+        """
+        Find the 'k' rows with the highest approximate cosine similarity to the
+        query, using the Asymmetric Distance Computation.
+        :param query: The vector we are going to compare with the embeddings.
+        :param k: The amount of neighbours to return.
+        :param exclude: A row that can't be in the results.
+        :param row_mask: Boolean array with the rows that can be in the results.
+        :param block_size: The amount of codes scored at a time.
+        :return: A tuple with the array of rows and the array of similarities,
+        sorted from the most similar to the least similar.
+        """
+        query = normalize_vector(query)
+        subspaces, _, sub_size = self.codebooks.shape
+        # The products of each sub-vector of the query with the centroids.
+        query_table = np.einsum('scd,sd->sc', self.codebooks, query.reshape(subspaces, sub_size))
+        subspace_ids = np.arange(subspaces)
+        scores = np.empty(len(self.codes), dtype=np.float32)
+        for start in range(0, len(self.codes), block_size):
+            block_codes = self.codes[start:start + block_size]
+            scores[start:start + block_size] = query_table[subspace_ids, block_codes].sum(axis=1)
+        if row_mask is not None:
+            scores[~row_mask] = -np.inf
+        if exclude is not None:
+            scores[exclude] = -np.inf
+        best = top_k(scores, k)
+        best = best[np.isfinite(scores[best])]
+        return best, scores[best]
+
+
+def euclidean_kmeans(vectors, n_clusters, n_iter, rand_gen):
+    """
+    Find the centroids of the 'vectors' using k-means with the euclidean
+    distance.
+    :param vectors: The float32 vectors.
+    :param n_clusters: The amount of centroids.
+    :param n_iter: The amount of iterations.
+    :param rand_gen: The NumPy random generator used to pick the initial
+    centroids.
+    :return: The float32 matrix with the centroids.
+    """
+    n_clusters = min(n_clusters, len(vectors))
+    init_rows = rand_gen.choice(len(vectors), n_clusters, replace=False)
+    centroids = vectors[np.sort(init_rows)].copy()
+    for _ in range(n_iter):
+        assignments = _closest_centroids(vectors, centroids)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assignments, vectors)
+        counts = np.bincount(assignments, minlength=n_clusters)
+        # Keep the old centroid for the empty clusters.
+        not_empty = counts > 0
+        centroids[not_empty] = sums[not_empty] / counts[not_empty, None]
+    return centroids.astype(np.float32)
+
+
+def _closest_centroids(vectors, centroids):
+    """
+    Find the closest centroid (euclidean distance) to each vector.
+    """
+    distances = (centroids ** 2).sum(axis=1) - 2 * vectors @ centroids.T
+    return np.argmin(distances, axis=1)
+
+
+def quantization_report(matrix, quantized=None, n_queries=100, k=10, seed=0):
+    """
+    Compare the compressed versions of the embeddings with the float32 matrix,
+    measuring the memory saved, the error in the cosine similarities and the
+    recall of the top-k neighbours.
+    :param matrix: The float32 matrix (or memmap) with the embeddings.
+    :param quantized: Dictionary with the compressed matrices, the keys are the
+    names of the modes and the values QuantizedMatrix or ProductQuantizer.
+    :param n_queries: The amount of embeddings used as queries.
+    :param k: The amount of neighbours used to measure the recall.
+    :param seed: The seed of the random generator used to pick the queries.
+    :return: A dictionary with the results of each mode.
+    """
+    float32_bytes = matrix.shape[0] * matrix.shape[1] * 4
+    rand_gen = np.random.default_rng(seed)
+    n_queries = min(n_queries, len(matrix))
+    query_rows = rand_gen.choice(len(matrix), n_queries, replace=False)
+    exact_search = ExactSearch(matrix)
+    # Find the true neighbours of the queries.
+    true_results = [exact_search.search(matrix[row], k=k, exclude=row) for row in query_rows]
+
+    report = {'float32': {'bytes': float32_bytes, 'compression': 1.0}}
+    for mode, mode_matrix in (quantized or {}).items():
+        if isinstance(mode_matrix, ProductQuantizer):
+            mode_search = mode_matrix
+        else:
+            mode_search = ExactSearch(mode_matrix)
+        recalls = []
+        errors = []
+        for query_row, (true_rows, true_scores) in zip(query_rows, true_results):
+            found_rows, _ = mode_search.search(matrix[query_row], k=k, exclude=query_row)
+            recalls.append(len(set(found_rows.tolist()) & set(true_rows.tolist())) / max(len(true_rows), 1))
+            # The similarities of the true neighbours using the compressed
+            # embeddings.
+            if isinstance(mode_matrix, ProductQuantizer):
+                mode_vectors = mode_matrix.decode(mode_matrix.codes[true_rows])
+            else:
+                mode_vectors = mode_matrix[true_rows]
+                mode_vectors = mode_vectors / row_norms(mode_vectors)[:, None]
+            mode_scores = mode_vectors @ normalize_vector(matrix[query_row])
+            errors.append(np.abs(mode_scores - true_scores))
+        errors = np.concatenate(errors) if errors else np.zeros(0)
+        report[mode] = {
+            'bytes': int(mode_matrix.nbytes),
+            'compression': float32_bytes / max(int(mode_matrix.nbytes), 1),
+            'mean_cosine_error': float(errors.mean()) if len(errors) else 0.0,
+            'max_cosine_error': float(errors.max()) if len(errors) else 0.0,
+            f"recall_at_{k}": float(np.mean(recalls)) if recalls else 1.0,
+        }
+    return report
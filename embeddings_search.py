@@ -0,0 +1,266 @@
+# Gelin Eguinosa Rosique
+
+import numpy as np
+
+
+class ExactSearch:
+    """
+    Find the nearest neighbours of a vector in a matrix of embeddings comparing
+    the vector against all the rows of the matrix, using the cosine similarity.
+    The matrix is visited in blocks, so it can be a memory-mapped file bigger
+    than the available memory.
+    """
+
+    def __init__(self, matrix, block_size=32768):
+        """
+        Save the matrix and precompute the norms of its rows.
+        :param matrix: The float32 matrix (or memmap) with the embeddings.
+        :param block_size: The amount of rows compared at the same time.
+        """
+        self.matrix = matrix
+        self.block_size = block_size
+        self.norms = row_norms(matrix, block_size)
+
+    def search(self, query, k=10, exclude=None, row_mask=None):
+        """
+        Find the 'k' rows of the matrix with the highest cosine similarity to
+        the 'query' vector.
+        :param query: The vector we are going to compare with the embeddings.
+        :param k: The amount of neighbours to return.
+        :param exclude: A row of the matrix that can't be in the results
+        (usually the row of the query).
+        :param row_mask: Boolean array with the rows of the matrix that can be
+        in the results (if None, all of them can).
+        :return: A tuple with the array of rows and the array of similarities,
+        sorted from the most similar to the least similar.
+        """
+        query = normalize_vector(query)
+        # Keep only the best candidates of each block.
+        candidate_rows = []
+        candidate_scores = []
+        for start in range(0, len(self.matrix), self.block_size):
+            end = start + self.block_size
+            block_scores = np.asarray(self.matrix[start:end], dtype=np.float32) @ query
+            block_scores /= self.norms[start:end]
+            if row_mask is not None:
+                block_scores[~row_mask[start:end]] = -np.inf
+            if exclude is not None and start <= exclude < end:
+                block_scores[exclude - start] = -np.inf
+            block_top = top_k(block_scores, k)
+            candidate_rows.append(block_top + start)
+            candidate_scores.append(block_scores[block_top])
+        # Check we found something.
+        if not candidate_rows:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+        # Select the best candidates of all the blocks.
+        candidate_rows = np.concatenate(candidate_rows)
+        candidate_scores = np.concatenate(candidate_scores)
+        best = top_k(candidate_scores, k)
+        best = best[np.isfinite(candidate_scores[best])]
+        return candidate_rows[best], candidate_scores[best]
+
+
+class IVFSearch:
+    """
+    Approximate nearest neighbours search using an Inverted File Index. The
+    embeddings are grouped in lists using the centroids of a k-means coarse
+    quantiser, and a query is only compared against the rows in the lists of
+    the 'n_probe' closest centroids.
+    """
+
+    def __init__(self, matrix, centroids, list_offsets, list_rows, norms, fingerprint=''):
+        """
+        Save the structures of the index.
+        :param matrix: The float32 matrix (or memmap) with the embeddings.
+        :param centroids: The normalised centroids of the lists.
+        :param list_offsets: The start of each list in 'list_rows' (with an
+        extra value at the end containing the size of 'list_rows').
+        :param list_rows: The rows of the matrix, grouped by list and sorted
+        inside each list.
+        :param norms: The norms of the rows of the matrix.
+        :param fingerprint: The fingerprint of the embeddings when the index
+        was built (to detect it is outdated).
+        """
+        self.matrix = matrix
+        self.centroids = centroids
+        self.list_offsets = list_offsets
+        self.list_rows = list_rows
+        self.norms = norms
+        self.fingerprint = fingerprint
+
+    @classmethod
+    def build(cls, matrix, n_lists=None, n_iter=10, sample_size=65536,
+              block_size=32768, seed=0):
+        """
+        Train the coarse quantiser on a sample of the embeddings and assign all
+        the rows of the matrix to their closest centroid.
+        :param matrix: The float32 matrix (or memmap) with the embeddings.
+        :param n_lists: The amount of lists (by default the square root of the
+        amount of rows).
+        :param n_iter: The iterations of k-means used to train the centroids.
+        :param sample_size: The maximum amount of rows used in the training.
+        :param block_size: The amount of rows assigned at the same time.
+        :param seed: The seed of the random generator.
+        :return: An IVFSearch index for the matrix.
+        """
+        total_rows = len(matrix)
+        if n_lists is None:
+            n_lists = int(np.sqrt(total_rows))
+        n_lists = max(1, min(n_lists, total_rows))
+        norms = row_norms(matrix, block_size)
+
+        # Train the centroids with a sample of the (normalised) embeddings.
+        rand_gen = np.random.default_rng(seed)
+        sample_rows = np.arange(total_rows)
+        if total_rows > sample_size:
+            sample_rows = np.sort(rand_gen.choice(total_rows, sample_size, replace=False))
+        sample = np.asarray(matrix[sample_rows], dtype=np.float32) / norms[sample_rows, None]
+        centroids = spherical_kmeans(sample, n_lists, n_iter, rand_gen)
+
+        # Assign every row of the matrix to a list.
+        assignments = np.empty(total_rows, dtype=np.int32)
+        for start in range(0, total_rows, block_size):
+            block = np.asarray(matrix[start:start + block_size], dtype=np.float32)
+            assignments[start:start + block_size] = np.argmax(block @ centroids.T, axis=1)
+        # Group the rows by list (keeping them sorted inside each list).
+        list_rows = np.argsort(assignments, kind='stable').astype(np.int64)
+        list_sizes = np.bincount(assignments, minlength=n_lists)
+        list_offsets = np.zeros(n_lists + 1, dtype=np.int64)
+        np.cumsum(list_sizes, out=list_offsets[1:])
+
+        return cls(matrix, centroids, list_offsets, list_rows, norms)
+
+    @classmethod
+    def load(cls, index_path, matrix):
+        """
+        Load an index saved with 'save()'.
+        :param index_path: The path of the '.npz' file with the index.
+        :param matrix: The float32 matrix (or memmap) with the embeddings.
+        :return: An IVFSearch index, or None if the index doesn't belong to the
+        matrix.
+        """
+        with np.load(index_path) as index_data:
+            norms = index_data['norms']
+            # Check the index was created for this matrix.
+            if len(norms) != len(matrix):
+                return None
+            ivf_index = cls(
+                matrix, index_data['centroids'], index_data['list_offsets'],
+                index_data['list_rows'], norms, str(index_data['fingerprint'])
+            )
+        return ivf_index
+
+    def save(self, index_path):
+        """
+        Save the structures of the index in a '.npz' file.
+        :param index_path: The path of the file.
+        """
+        with open(index_path, 'wb') as file:
+            np.savez(
+                file, centroids=self.centroids, list_offsets=self.list_offsets,
+                list_rows=self.list_rows, norms=self.norms, fingerprint=self.fingerprint
+            )
+
+    def search(self, query, k=10, n_probe=8, exclude=None, row_mask=None):
+        """
+        Find (approximately) the 'k' rows of the matrix with the highest cosine
+        similarity to the 'query' vector.
+        :param query: The vector we are going to compare with the embeddings.
+        :param k: The amount of neighbours to return.
+        :param n_probe: The amount of lists visited during the search.
+        :param exclude: A row of the matrix that can't be in the results.
+        :param row_mask: Boolean array with the rows of the matrix that can be
+        in the results (if None, all of them can).
+        :return: A tuple with the array of rows and the array of similarities,
+        sorted from the most similar to the least similar.
+        """
+        query = normalize_vector(query)
+        # Find the closest lists to the query.
+        probe_lists = top_k(self.centroids @ query, n_probe)
+        # Get the rows stored in those lists (sorted to read the matrix in
+        # order).
+        candidate_rows = np.concatenate([
+            self.list_rows[self.list_offsets[i]:self.list_offsets[i + 1]]
+            for i in probe_lists
+        ])
+        candidate_rows.sort()
+        if row_mask is not None:
+            candidate_rows = candidate_rows[row_mask[candidate_rows]]
+        if exclude is not None:
+            candidate_rows = candidate_rows[candidate_rows != exclude]
+        # Compare the query with the candidates.
+        scores = np.asarray(self.matrix[candidate_rows], dtype=np.float32) @ query
+        scores /= self.norms[candidate_rows]
+        best = top_k(scores, k)
+        return candidate_rows[best], scores[best]
+
+
+def spherical_kmeans(vectors, n_clusters, n_iter, rand_gen):
+    """
+    Find the centroids of the normalised 'vectors' using k-means with the
+    cosine similarity.
+    :param vectors: The normalised float32 vectors.
+    :param n_clusters: The amount of centroids.
+    :param n_iter: The amount of iterations.
+    :param rand_gen: The NumPy random generator used to pick the initial
+    centroids.
+    :return: The float32 matrix with the normalised centroids.
+    """
+    init_rows = rand_gen.choice(len(vectors), n_clusters, replace=False)
+    centroids = vectors[np.sort(init_rows)].copy()
+    for _ in range(n_iter):
+        assignments = np.argmax(vectors @ centroids.T, axis=1)
+        # Add up the vectors of each cluster.
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assignments, vectors)
+        # Keep the old centroid for the empty clusters.
+        empty = ~sums.any(axis=1)
+        sums[empty] = centroids[empty]
+        centroids = sums / np.linalg.norm(sums, axis=1, keepdims=True)
+    return centroids.astype(np.float32)
+
+
+def row_norms(matrix, block_size=32768):
+    """
+    Calculate the norms of the rows of the matrix, visiting it in blocks. The
+    norms equal to zero are replaced by one, to avoid dividing by zero.
+    :param matrix: The float32 matrix (or memmap).
+    :param block_size: The amount of rows processed at the same time.
+    :return: A float32 array with the norms.
+    """
+    norms = np.empty(len(matrix), dtype=np.float32)
+    for start in range(0, len(matrix), block_size):
+        block = np.asarray(matrix[start:start + block_size], dtype=np.float32)
+        norms[start:start + block_size] = np.linalg.norm(block, axis=1)
+    norms[norms == 0] = 1
+    return norms
+
+
+def normalize_vector(vector):
+    """
+    Transform the vector to a float32 array with norm 1.
+    """
+    vector = np.asarray(vector, dtype=np.float32)
+    norm = np.linalg.norm(vector)
+    if norm:
+        vector = vector / norm
+    return vector
+
+
+def top_k(scores, k):
+    """
+    Find the positions of the 'k' highest scores, using 'argpartition' to avoid
+    sorting the whole array.
+    :param scores: The array with the scores.
+    :param k: The amount of positions to return.
+    :return: The array with the positions, sorted from the highest score to the
+    lowest.
+    """
+    k = min(k, len(scores))
+    if k <= 0:
+        return np.zeros(0, dtype=np.int64)
+    if k < len(scores):
+        best = np.argpartition(-scores, k - 1)[:k]
+    else:
+        best = np.arange(len(scores))
+    return best[np.argsort(-scores[best], kind='stable')]
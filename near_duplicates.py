@@ -0,0 +1,281 @@
+# Gelin Eguinosa Rosique
+
+import zlib
+import numpy as np
+from bm25_index import tokenize
+from atomic_files import write_json_atomic, load_json
+
+
+class NearDuplicates:
+    """
+    Groups of papers that are the same document under different 'cord_uid'
+    (a preprint and its published version, or the same text repeated). Each
+    group has a canonical paper, the one the iterators keep when they skip the
+    duplicates.
+    """
+
+    def __init__(self, groups, fingerprint='', params=None):
+        """
+        Save the groups of duplicates.
+        :param groups: The list of groups, each one a list of 'cord_uid' with
+        the canonical paper first.
+        :param fingerprint: The fingerprint of the papers' index when the
+        duplicates were found (to detect they are outdated).
+        :param params: Dictionary with the parameters used to find them.
+        """
+        self.groups = groups
+        self.fingerprint = fingerprint
+        self.params = params or {}
+        # The canonical paper of each duplicate.
+        self.canonical = {
+            cord_uid: group[0] for group in groups for cord_uid in group[1:]
+        }
+
+    def __len__(self):
+        return len(self.groups)
+
+    @classmethod
+    def load(cls, duplicates_path):
+        """
+        Load the groups saved with 'save()'.
+        :param duplicates_path: The path of the JSON file.
+        :return: The NearDuplicates, or None if the file doesn't exist.
+        """
+        duplicates_data = load_json(duplicates_path)
+        if duplicates_data is None:
+            return None
+        return cls(duplicates_data['groups'], duplicates_data['fingerprint'], duplicates_data['params'])
+
+    def save(self, duplicates_path):
+        """
+        Save the groups of duplicates in a JSON file.
+        :param duplicates_path: The path of the file.
+        """
+        write_json_atomic(duplicates_path, {
+            'fingerprint': self.fingerprint,
+            'params': self.params,
+            'groups': self.groups,
+        })
+
+    def canonical_uid(self, cord_uid):
+        """
+        Get the canonical paper of the 'cord_uid' paper (the paper itself if it
+        isn't a duplicate).
+        """
+        return self.canonical.get(cord_uid, cord_uid)
+
+    def is_duplicate(self, cord_uid):
+        """
+        Check if the 'cord_uid' paper is a duplicate of another paper (the
+        canonical papers are not duplicates).
+        """
+        return cord_uid in self.canonical
+
+
+class MinHasher:
+    """
+    Create the MinHash signatures of sets of 32-bit hashes, using random
+    linear hash functions. The fraction of equal values in the signatures of
+    two sets estimates their Jaccard similarity.
+    """
+    # Prime bigger than the hashes (the hash functions are modulo this prime).
+    prime = (1 << 32) - 5
+
+    def __init__(self, num_perm=128, seed=0):
+        """
+        Create the random hash functions.
+        :param num_perm: The amount of hash functions (values in a signature).
+        :param seed: The seed of the random generator.
+        """
+        rand_gen = np.random.default_rng(seed)
+        self.num_perm = num_perm
+        # With the coefficients below 2^31 the products fit in 64 bits.
+        self.coef_a = rand_gen.integers(1, 1 << 31, num_perm, dtype=np.uint64)
+        self.coef_b = rand_gen.integers(0, 1 << 31, num_perm, dtype=np.uint64)
+
+    def signature(self, hashes):
+        """
+        Create the MinHash signature of a set of hashes.
+        :param hashes: The uint32 NumPy array with the hashes.
+        :return: The uint32 array with the signature (all its values are the
+        maximum uint32 if the set is empty).
+        """
+        if len(hashes) == 0:
+            return np.full(self.num_perm, np.iinfo(np.uint32).max, dtype=np.uint32)
+        values = np.outer(hashes.astype(np.uint64), self.coef_a) + self.coef_b
+        return (values % self.prime).min(axis=0).astype(np.uint32)
+
+
+def shingle_hashes(text, size=5):
+    """
+    Find the hashes of the shingles of a text (its sequences of 'size' words).
+    :param text: The string with the text.
+    :param size: The amount of words in a shingle.
+    :return: The uint32 NumPy array with the unique hashes.
+    """
+    words = tokenize(text)
+    if not words:
+        return np.zeros(0, dtype=np.uint32)
+    shingles = (
+        ' '.join(words[start:start + size])
+        for start in range(max(len(words) - size + 1, 1))
+    )
+    hashes = np.fromiter((zlib.crc32(shingle.encode('utf-8')) for shingle in shingles), dtype=np.uint32)
+    return np.unique(hashes)
+
+
+def lsh_candidates(signatures, bands):
+    """
+    Find the pairs of signatures that have the same values in at least one
+    band (Locality-Sensitive Hashing), the candidates to be duplicates.
+    :param signatures: The uint32 matrix with a signature per row.
+    :param bands: The amount of bands the signatures are split in.
+    :return: A set of (row, row) tuples, with the smaller row first.
+    """
+    _check_bands(signatures.shape[1], bands)
+    rows = signatures.shape[1] // bands
+    candidates = set()
+    for band in range(bands):
+        band_values = signatures[:, band * rows:(band + 1) * rows]
+        _, buckets = np.unique(band_values, axis=0, return_inverse=True)
+        buckets = buckets.reshape(-1)
+        # Visit the buckets with more than one signature.
+        order = np.argsort(buckets, kind='stable')
+        sorted_buckets = buckets[order]
+        starts = np.flatnonzero(np.diff(sorted_buckets, prepend=-1))
+        ends = np.append(starts[1:], len(order))
+        for start, end in zip(starts.tolist(), ends.tolist()):
+            if end - start < 2:
+                continue
+            members = order[start:end].tolist()
+            for first in range(len(members)):
+                for second in range(first + 1, len(members)):
+                    candidates.add((members[first], members[second]))
+    return candidates
+
+
+def _check_bands(num_perm, bands):
+    """
+    Check the signatures of 'num_perm' values can be split in 'bands' bands of
+    the same size, otherwise the last values would be left out of the bands.
+    :param num_perm: The amount of values in the signatures.
+    :param bands: The amount of LSH bands.
+    """
+    if not 0 < bands <= num_perm:
+        raise ValueError(f"The amount of bands <{bands}> must be between 1 and <{num_perm}>.")
+    if num_perm % bands != 0:
+        raise ValueError(f"The amount of bands <{bands}> must divide <{num_perm}>.")
+
+
+def find_near_duplicates(papers, cord_uids=None, shingle_size=5, num_perm=128, bands=32,
+                         jaccard_threshold=0.7, cosine_threshold=0.95, workers=1, seed=0):
+    """
+    Find the groups of papers that are near-duplicates. The full text of each
+    paper is reduced to a MinHash signature of its shingles (in a single pass
+    over the corpus, keeping only the signatures in memory), the candidate
+    pairs are found with LSH, and a pair is a duplicate if the estimated
+    Jaccard similarity of their shingles is at least 'jaccard_threshold', and
+    the cosine similarity of their embeddings (when both papers have one) is at
+    least 'cosine_threshold'. The duplicate pairs are joined in groups.
+
+    The canonical paper of a group is the one with the most shingles (the
+    most complete text), or the first one in the order of the papers.
+    :param papers: The Papers instance.
+    :param cord_uids: The papers we want to compare (by default all of them).
+    :param shingle_size: The amount of words in a shingle.
+    :param num_perm: The amount of values in the MinHash signatures.
+    :param bands: The amount of LSH bands (more bands find pairs with a lower
+    similarity, but produce more candidates), it must divide 'num_perm'.
+    :param jaccard_threshold: The minimum estimated Jaccard similarity of the
+    shingles of two duplicates.
+    :param cosine_threshold: The minimum cosine similarity of the embeddings of
+    two duplicates.
+    :param workers: The amount of threads reading the papers.
+    :param seed: The seed of the hash functions.
+    :return: The NearDuplicates with the groups.
+    """
+    # Check the bands before reading the corpus.
+    _check_bands(num_perm, bands)
+    if cord_uids is None:
+        cord_uids = papers.papers_index
+    cord_uids = list(cord_uids)
+    min_hasher = MinHasher(num_perm, seed)
+    signatures = np.empty((len(cord_uids), num_perm), dtype=np.uint32)
+    shingle_counts = np.zeros(len(cord_uids), dtype=np.int64)
+    full_texts = papers.all_papers_full_text(cord_uids, workers=workers)
+    for position, full_text in enumerate(full_texts):
+        hashes = shingle_hashes(full_text, shingle_size)
+        signatures[position] = min_hasher.signature(hashes)
+        shingle_counts[position] = len(hashes)
+
+    # Compare the candidates (the papers without text can't be compared).
+    has_text = np.flatnonzero(shingle_counts > 0)
+    candidates = [
+        (int(has_text[first]), int(has_text[second]))
+        for first, second in sorted(lsh_candidates(signatures[has_text], bands))
+    ]
+    duplicate_pairs = [
+        (first, second) for first, second in candidates
+        if np.mean(signatures[first] == signatures[second]) >= jaccard_threshold
+    ]
+    duplicate_pairs = _check_embeddings(papers, cord_uids, duplicate_pairs, cosine_threshold)
+
+    # Join the pairs in groups.
+    parents = np.arange(len(cord_uids))
+    for first, second in duplicate_pairs:
+        first_root, second_root = _find_root(parents, first), _find_root(parents, second)
+        if first_root != second_root:
+            parents[max(first_root, second_root)] = min(first_root, second_root)
+    group_members = {}
+    for position in sorted({position for pair in duplicate_pairs for position in pair}):
+        group_members.setdefault(_find_root(parents, position), []).append(position)
+    groups = []
+    for members in group_members.values():
+        members.sort(key=lambda member: (-shingle_counts[member], member))
+        groups.append([cord_uids[member] for member in members])
+
+    params = {
+        'shingle_size': shingle_size, 'num_perm': num_perm, 'bands': bands,
+        'jaccard_threshold': jaccard_threshold, 'cosine_threshold': cosine_threshold,
+        'seed': seed,
+    }
+    return NearDuplicates(groups, params=params)
+
+
+def _check_embeddings(papers, cord_uids, pairs, cosine_threshold):
+    """
+    Keep the pairs of papers with similar embeddings (or where one of the
+    papers doesn't have an embedding).
+    """
+    embeds_uids = sorted({
+        cord_uids[position] for pair in pairs for position in pair
+        if cord_uids[position] in papers.embeds_index
+    })
+    if not embeds_uids:
+        return pairs
+    embeddings = papers.embeddings_matrix(embeds_uids)
+    norms = np.linalg.norm(embeddings, axis=1)
+    norms[norms == 0] = 1
+    embeddings /= norms[:, None]
+    embeds_rows = {cord_uid: row for row, cord_uid in enumerate(embeds_uids)}
+    similar_pairs = []
+    for first, second in pairs:
+        first_row = embeds_rows.get(cord_uids[first])
+        second_row = embeds_rows.get(cord_uids[second])
+        if first_row is not None and second_row is not None:
+            if float(embeddings[first_row] @ embeddings[second_row]) < cosine_threshold:
+                continue
+        similar_pairs.append((first, second))
+    return similar_pairs
+
+
+def _find_root(parents, position):
+    """
+    Find the first paper of the group of a paper, compressing the path.
+    """
+    root = position
+    while parents[root] != root:
+        root = parents[root]
+    while parents[position] != root:
+        parents[position], position = root, parents[position]
+    return root
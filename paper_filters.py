@@ -0,0 +1,193 @@
+# Gelin Eguinosa Rosique
+
+import datetime
+from os.path import isfile
+import numpy as np
+
+# Value of the publication day for the papers without a valid date.
+missing_day = np.iinfo(np.int32).min
+
+
+class PaperFilters:
+    """
+    Columnar indexes with the metadata of the papers, used to select the papers
+    that match several conditions with vectorised operations. The columns are
+    aligned with the rows of the papers' index: the publication date as days
+    since 1970-01-01, bitmaps indicating which papers have PMC or PDF full text,
+    and an inverted index with the rows of the papers of each author.
+    """
+
+    def __init__(self, publish_days, has_pmc, has_pdf, author_names, author_offsets,
+                 author_rows):
+        """
+        Save the columns of the filters.
+        :param publish_days: The int32 array with the publication day of each row.
+        :param has_pmc: The boolean array of the rows with PMC full text.
+        :param has_pdf: The boolean array of the rows with PDF full text.
+        :param author_names: The array with the (normalised) names of the
+        authors.
+        :param author_offsets: The start of the rows of each author in
+        'author_rows' (with an extra value at the end).
+        :param author_rows: The int32 array with the rows of the papers of each
+        author.
+        """
+        self.publish_days = publish_days
+        self.has_pmc = has_pmc
+        self.has_pdf = has_pdf
+        self.author_names = author_names
+        self.author_offsets = author_offsets
+        self.author_rows = author_rows
+        self.author_ids = {name: author_id for author_id, name in enumerate(author_names.tolist())}
+
+    def __len__(self):
+        return len(self.publish_days)
+
+    @classmethod
+    def build(cls, records_index):
+        """
+        Create the columns of the filters with the papers in the index.
+        :param records_index: The RecordsIndex with the papers.
+        :return: The PaperFilters of the papers.
+        """
+        total_rows = records_index.total_rows
+        publish_days = np.full(total_rows, missing_day, dtype=np.int32)
+        has_pmc = np.zeros(total_rows, dtype=bool)
+        has_pdf = np.zeros(total_rows, dtype=bool)
+        author_papers = {}
+        for row in range(total_rows):
+            publish_days[row] = parse_publish_day(records_index.field_value('publish_time', row))
+            has_pmc[row] = bool(records_index.field_value('pmc_json_files', row))
+            has_pdf[row] = bool(records_index.field_value('pdf_json_files', row))
+            authors = records_index.field_value('authors', row)
+            for author in authors.split(records_index.list_separator):
+                author = normalize_author(author)
+                if author:
+                    author_papers.setdefault(author, []).append(row)
+
+        # Save the rows of the authors in a compressed sparse format.
+        author_names = np.array(sorted(author_papers), dtype=str)
+        author_sizes = [len(author_papers[name]) for name in author_names]
+        author_offsets = np.zeros(len(author_names) + 1, dtype=np.int64)
+        np.cumsum(author_sizes, out=author_offsets[1:])
+        author_rows = np.fromiter(
+            (row for name in author_names for row in author_papers[name]),
+            dtype=np.int32, count=int(author_offsets[-1])
+        )
+        return cls(publish_days, has_pmc, has_pdf, author_names, author_offsets, author_rows)
+
+    @classmethod
+    def load(cls, filters_path):
+        """
+        Load the filters saved with 'save()'.
+        :param filters_path: The path of the '.npz' file.
+        :return: The PaperFilters, or None if the file doesn't exist.
+        """
+        if not isfile(filters_path):
+            return None
+        with np.load(filters_path) as filters_data:
+            paper_filters = cls(
+                filters_data['publish_days'], filters_data['has_pmc'],
+                filters_data['has_pdf'], filters_data['author_names'],
+                filters_data['author_offsets'], filters_data['author_rows']
+            )
+        return paper_filters
+
+    def save(self, filters_path):
+        """
+        Save the columns of the filters in a '.npz' file.
+        :param filters_path: The path of the file.
+        """
+        with open(filters_path, 'wb') as file:
+            np.savez(
+                file, publish_days=self.publish_days, has_pmc=self.has_pmc,
+                has_pdf=self.has_pdf, author_names=self.author_names,
+                author_offsets=self.author_offsets, author_rows=self.author_rows
+            )
+
+    def select(self, published_after=None, published_before=None, has_pmc=None,
+               has_pdf=None, has_full_text=None, authors=None, alive=None):
+        """
+        Find the rows of the papers that match all the given conditions (the
+        conditions that are None are ignored).
+        :param published_after: The papers published on this date or later.
+        :param published_before: The papers published before this date.
+        :param has_pmc: Bool indicating if the papers have PMC full text or not.
+        :param has_pdf: Bool indicating if the papers have PDF full text or not.
+        :param has_full_text: Bool indicating if the papers have any full text
+        or not.
+        :param authors: The name of an author, or a list of names, the papers
+        must have at least one of them.
+        :param alive: The boolean array with the rows that can be selected.
+        :return: A sorted int64 array with the rows of the papers.
+        """
+        mask = np.ones(len(self), dtype=bool) if alive is None else np.array(alive, dtype=bool)
+        if published_after is not None:
+            mask &= self.publish_days >= _date_day(published_after)
+        if published_before is not None:
+            mask &= self.publish_days < _date_day(published_before)
+        # The publication day is missing in the papers without a date.
+        if published_after is not None or published_before is not None:
+            mask &= self.publish_days != missing_day
+        if has_pmc is not None:
+            mask &= self.has_pmc == has_pmc
+        if has_pdf is not None:
+            mask &= self.has_pdf == has_pdf
+        if has_full_text is not None:
+            mask &= (self.has_pmc | self.has_pdf) == has_full_text
+        if authors is not None:
+            mask &= self.author_mask(authors)
+        return np.flatnonzero(mask)
+
+    def author_mask(self, authors):
+        """
+        Create the bitmap of the papers written by any of the 'authors'.
+        :param authors: The name of an author, or a list of names.
+        :return: A boolean array with the rows of their papers.
+        """
+        if isinstance(authors, str):
+            authors = [authors]
+        mask = np.zeros(len(self), dtype=bool)
+        for author in authors:
+            author_id = self.author_ids.get(normalize_author(author))
+            if author_id is None:
+                continue
+            start, end = self.author_offsets[author_id], self.author_offsets[author_id + 1]
+            mask[self.author_rows[start:end]] = True
+        return mask
+
+
+def parse_publish_day(publish_time):
+    """
+    Transform the publication time of a paper ('YYYY-MM-DD', 'YYYY-MM' or
+    'YYYY') to the number of days since 1970-01-01.
+    :param publish_time: The string with the publication time.
+    :return: The number of days, or 'missing_day' if the date is not valid.
+    """
+    try:
+        return _date_day(publish_time.strip())
+    except ValueError:
+        return missing_day
+
+
+def normalize_author(author):
+    """
+    Normalise the name of an author to compare it with other names (lowercase
+    and without extra spaces).
+    """
+    return ' '.join(author.lower().split())
+
+
+def _date_day(date):
+    """
+    Get the number of days since 1970-01-01 of a date.
+    :param date: A datetime.date or a string with the format 'YYYY-MM-DD',
+    'YYYY-MM' or 'YYYY'.
+    :return: The number of days.
+    """
+    if isinstance(date, str):
+        date_parts = [int(part) for part in date.split('-')]
+        if not date_parts or len(date_parts) > 3:
+            raise ValueError(f"Invalid date <{date}>.")
+        date_parts += [1] * (3 - len(date_parts))
+        date = datetime.date(*date_parts)
+    return (date - datetime.date(1970, 1, 1)).days
@@ -2,13 +2,36 @@
 
 import csv
 import json
-from os import mkdir
-from os.path import join, isfile, isdir
-from collections import defaultdict
-
-# To test the class
-from random import randint
-from time_keeper import TimeKeeper
+import zlib
+import hashlib
+from os import mkdir, stat, remove, fsync, replace as os_replace
+from shutil import rmtree, copytree, copyfile
+from os.path import join, isfile, isdir, getsize
+from collections import Counter, OrderedDict
+from itertools import repeat
+from functools import partial
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from embeddings_search import ExactSearch, IVFSearch
+from embeddings_quantization import (
+    ProductQuantizer, save_quantized_matrix, open_quantized_matrix, open_embeddings_matrix,
+    quantization_report
+)
+from records_index import RecordsIndex, RecordsWriter
+from byte_cache import create_cache
+from text_store import TextStore, TextWriter, compress_paragraphs, render_body_text
+from prefetch import prefetch_map
+from bm25_index import BM25Index, build_bm25_index
+from paper_filters import PaperFilters
+from shared_papers import SharedPapersStore
+from embeddings_clustering import EmbeddingsClustering, minibatch_kmeans
+from passage_export import PassageStore, export_passages
+from near_duplicates import NearDuplicates, find_near_duplicates
+from citation_graph import CitationGraph, build_citation_graph, normalize_doi
+from time_keeper import TimeKeeper, profiler
+from atomic_files import (
+    write_json_atomic, load_json, replace_folder, folder_checksums, verify_files
+)
 
 
 class Papers:
@@ -24,182 +47,438 @@ class Papers:
 
     # Project Data Location
     project_data_folder = 'project_data'
-    project_embeds_folder = 'embedding_dicts'
-    papers_index_file = 'papers_index.json'
+    papers_index_folder = 'papers_index'
     embeds_index_file = 'embeddings_index.json'
+    embeds_matrix_file = 'embeddings_matrix.f32'
+    embeds_build_folder = 'embeddings_build'
+    # The amount of lines of the embeddings CSV in each part parsed (and saved)
+    # while the matrix is built, so an interrupted build can be resumed (about
+    # 64MB of CSV with the 768-dimensional embeddings).
+    embeds_part_lines = 8192
+    embeds_ivf_file = 'embeddings_ivf.npz'
+    embeds_f16_file = 'embeddings_matrix.f16'
+    embeds_i8_file = 'embeddings_matrix.i8'
+    embeds_i8_scales_file = 'embeddings_scales.f32'
+    embeds_pq_file = 'embeddings_pq.npz'
+    text_store_folder = 'papers_text'
+    manifest_file = 'manifest.json'
+    update_folder = 'update_build'
+    bm25_index_folder = 'bm25_index'
+    paper_filters_file = 'paper_filters.npz'
+    clusters_file = 'embeddings_clusters.npz'
+    passages_folder = 'passages'
+    duplicates_file = 'near_duplicates.json'
+    citation_graph_file = 'citation_graph.npz'
 
-    def __init__(self):
+    def __init__(self, workers=1, cache_bytes=64 * 1024 ** 2, cache_policy='lru',
+                 embeds_mode='float32', readonly=False):
         """
         Load the metadata.csv to create the index of all the papers available in
         the current CORD-19 dataset and save all the information of interest.
         
-        Also, load the cord_19_embeddings to create an index and save them in
-        100 different dictionaries, so they are quickly loaded without
-        occupying too much memory.
+        Also, load the cord_19_embeddings and save them in a binary float32
+        matrix, with an index containing the row of each paper's embedding. The
+        matrix is memory-mapped, so the embeddings are accessed without loading
+        them in memory.
+
+        The indexes are only built here if they don't exist, they are opened
+        the first time they are used, so a process that only needs the
+        embeddings (or only the papers) doesn't load the other index.
+
+        :param workers: The amount of processes used to build the indexes when
+        they don't exist (default: 1, everything is built in this process).
+        :param cache_bytes: The maximum amount of bytes used by the cache of
+        the papers' content (default: 64 MB).
+        :param cache_policy: The eviction policy of the cache, 'lru' or 'lfu'.
+        :param embeds_mode: The format of the embeddings used by the searches
+        and returned by the class, 'float32', 'float16' (half the memory) or
+        'int8' (a quarter of the memory, with a scale per dimension). The
+        compressed matrices are created from the float32 matrix.
+        :param readonly: Bool indicating if the indexes can't be built or
+        modified. If any of them is missing, a FileNotFoundError is raised.
         """
+        if embeds_mode not in ('float32', 'float16', 'int8'):
+            raise ValueError(f"Unknown embeddings mode <{embeds_mode}>.")
+        self.embeds_mode = embeds_mode
+        self.readonly = readonly
         # Create a data folder if it doesn't exist.
-        if not isdir(self.project_data_folder):
+        if not readonly and not isdir(self.project_data_folder):
             mkdir(self.project_data_folder)
-        # Form the papers index path.
-        papers_index_path = join(self.project_data_folder, self.papers_index_file)
-        # Check if the papers' index exists or not.
-        if isfile(papers_index_path):
-            # Load the Papers' Index.
-            with open(papers_index_path, 'r') as file:
-                self.papers_index = json.load(file)
-        else:         
-            # Create the index of the papers.
-            self.papers_index = self._create_papers_index()
-            # Save the Papers' Index
-            with open(papers_index_path, 'w') as file:
-                json.dump(self.papers_index, file)
-
-        # Create the folder of the embedding dictionaries if it doesn't exist.
-        proj_embeds_folder_path = join(self.project_data_folder, self.project_embeds_folder)
-        if not isdir(proj_embeds_folder_path):
-            mkdir(proj_embeds_folder_path)
-        # Form the embeddings index path.
+        # Use the dataset recorded in the manifest, if the indexes were updated
+        # to a newer CORD-19 release.
+        manifest = self._load_manifest()
+        if manifest:
+            self.current_dataset = manifest['dataset']
+            self.embeddings_file = manifest['embeddings_file']
+        # Form the paths of the indexes and the embeddings' matrix.
+        papers_index_path = join(self.project_data_folder, self.papers_index_folder)
         embeds_index_path = join(self.project_data_folder, self.embeds_index_file)
-        # Check if the embeddings' index exists or not.
-        if isfile(embeds_index_path):
-            # Load the embeddings' index.
-            with open(embeds_index_path, 'r') as file:
-                self.embeds_index = json.load(file)
-        else:
-            # Save the embeddings of the papers and create an index of their
-            # location.
-            self.embeds_index = self._create_embeddings_index()
-            # Save the embeddings' index
-            with open(embeds_index_path, 'w') as file:
-                json.dump(self.embeds_index, file)
-
-        # Create a Cache for the Embedding Dictionaries, the they work faster in
+        embeds_matrix_path = join(self.project_data_folder, self.embeds_matrix_file)
+
+        # Check which indexes exist, without loading them.
+        build_papers = not RecordsIndex.exists(papers_index_path)
+        build_embeds = not (
+            isfile(embeds_matrix_path) and _is_embeddings_index(embeds_index_path)
+        )
+        # Check the files of the indexes weren't truncated or modified since
+        # they were saved (quick checksums).
+        bad_files = verify_files(self.project_data_folder, manifest.get('files', {}))
+        if any(path.startswith(self.papers_index_folder) for path in bad_files):
+            build_papers = True
+        if {self.embeds_matrix_file, self.embeds_index_file} & set(bad_files):
+            build_embeds = True
+        if readonly:
+            missing_indexes = [
+                index_name for index_name, missing in
+                [('papers index', build_papers), ('embeddings index', build_embeds)]
+                if missing
+            ]
+            if embeds_mode != 'float32' and not self._embeddings_vectors_exist(embeds_mode):
+                missing_indexes.append(f"{embeds_mode} embeddings")
+            if missing_indexes:
+                raise FileNotFoundError(
+                    f"The {', '.join(missing_indexes)} of the papers in "
+                    f"<{self.project_data_folder}> don't exist or are corrupted "
+                    f"(opened in read-only mode)."
+                )
+
+        # The indexes, opened the first time they are used.
+        self._papers_index = None
+        self._embeds_index = None
+        self._embeds_size = None
+        self._embeds_matrix = None
+        self._embeds_vectors = None
+        self._text_store = None
+        self._text_store_opened = False
+
+        # Record the time it takes to build the indexes.
+        self.build_times = {}
+        # Use a pool of processes if we have to build any of the indexes.
+        executor = None
+        if workers > 1 and (build_papers or build_embeds):
+            executor = ProcessPoolExecutor(max_workers=workers)
+        try:
+            # Check if the papers' index exists or not.
+            papers_future = None
+            if build_papers:
+                # Create the index of the papers, saving it as we read the
+                # papers (in one of the processes of the pool if we have one).
+                metadata_path = join(self.cord19_data_folder, self.current_dataset, self.metadata_file)
+                if executor:
+                    papers_future = executor.submit(_write_papers_index, metadata_path, papers_index_path)
+                else:
+                    self.build_times['papers_index'] = _write_papers_index(metadata_path, papers_index_path)
+            if build_embeds:
+                # Save the embeddings of the papers in the binary matrix and
+                # create an index with their rows.
+                stopwatch = TimeKeeper()
+                with profiler.span('embeddings_index'):
+                    embeds_index = self._create_embeddings_index(executor=executor)
+                    # Move the matrix to its place, and save the embeddings'
+                    # index (saved last, the matrix is not used without it).
+                    build_path = join(self.project_data_folder, self.embeds_build_folder)
+                    os_replace(join(build_path, self.embeds_matrix_file), embeds_matrix_path)
+                    with profiler.span('json_dump'):
+                        write_json_atomic(embeds_index_path, embeds_index)
+                    rmtree(build_path)
+                self.build_times['embeddings_index'] = stopwatch.total_runtime()
+                # Keep the index we just created.
+                self._embeds_index = embeds_index['papers']
+                self._embeds_size = embeds_index['embedding_size']
+            # Wait for the papers' index.
+            if papers_future:
+                self.build_times['papers_index'] = papers_future.result()
+        finally:
+            if executor:
+                executor.shutdown()
+
+        # Record the dataset used to build the indexes.
+        if self.build_times or (not manifest and not readonly):
+            self._save_manifest(with_hashes=bool(self.build_times))
+
+        # The search indexes of the embeddings, created the first time they
+        # are used.
+        self.exact_search = None
+        self.ivf_search = None
+        self.pq_search = None
+        self.embeds_row_uids = None
+
+        # Create a Cache for the content of the papers, so they work faster in
         # repetitive cases.
-        self.cached_embed_dict = {}
-        self.cached_dict_filename = ''
-
-    def _create_papers_index(self):
-        """
-        Create an index of the papers available in the CORD-19 dataset specified
-        in the data folders of the class.
-        """
-        # Create the metadata path
-        metadata_path = join(self.cord19_data_folder, self.current_dataset, self.metadata_file)
-
-        # Dictionary where the information of the papers will be saved.
-        papers_index = defaultdict(dict)
-
-        # Open the metadata file
-        with open(metadata_path) as file:
-            reader = csv.DictReader(file)
-            # Go through the information of all the papers.
-            for row in reader:
-                # Get the fields of interest.
-                cord_uid = row['cord_uid']
-                title = row['title']
-                abstract = row['abstract']
-                publish_time = row['publish_time']
-                authors = row['authors'].split('; ')
-                pdf_json_files = row['pdf_json_files'].split('; ')
-                pmc_json_files = row['pmc_json_files'].split('; ')
-
-                # Save all the information of the current paper, or update it
-                # if we have found this 'cord_uid' before. Also, check if the
-                # are not empty.
-                current_paper = papers_index[cord_uid]
-                current_paper['cord_uid'] = cord_uid
-                current_paper['title'] = title
-                current_paper['abstract'] = abstract
-                current_paper['publish_time'] = publish_time
-                current_paper['authors'] = authors
-                if pdf_json_files != ['']:
-                    current_paper['pdf_json_files'] = pdf_json_files
-                if pmc_json_files != ['']:
-                    current_paper['pmc_json_files'] = pmc_json_files
-
-        # Transform the papers' index from a 'defaultdict' to a normal dictionary.
-        papers_index = dict(papers_index) 
-        return papers_index
-
-    def _create_embeddings_index(self, embed_dicts=100):
+        self.cache = create_cache(cache_bytes, cache_policy)
+        # The keyword search index, loaded the first time it is used.
+        self.bm25_index = None
+        # The columnar indexes of the metadata, loaded the first time they are
+        # used.
+        self.paper_filters = None
+        # The groups of near-duplicate papers, loaded the first time they are
+        # used.
+        self.near_duplicates = None
+        # The graph of citations between the papers, loaded the first time it
+        # is used.
+        self.citation_graph = None
+
+    @classmethod
+    def open(cls, readonly=True, **kwargs):
         """
-        Load all the embeddings of the documents from the current CORD-19
-        dataset and save them in several dictionaries so when needed they can
-        be loaded quickly and without occupying to much space in memory.
+        Open the indexes of the papers. In read-only mode, the indexes are
+        never built, and a FileNotFoundError is raised right away if any of them
+        is missing.
+        :param readonly: Bool indicating if the indexes can't be built or
+        modified.
+        :param kwargs: The other arguments of the class ('cache_bytes',
+        'embeds_mode', ...).
+        :return: The Papers instance.
+        """
+        return cls(readonly=readonly, **kwargs)
+
+    @property
+    def papers_index(self):
+        """
+        The RecordsIndex with the papers (the papers are decoded when they are
+        used).
+        """
+        if self._papers_index is None:
+            papers_index_path = join(self.project_data_folder, self.papers_index_folder)
+            with profiler.span('open_papers_index'):
+                self._papers_index = RecordsIndex(papers_index_path)
+        return self._papers_index
+
+    @papers_index.setter
+    def papers_index(self, papers_index):
+        self._papers_index = papers_index
+
+    @property
+    def embeds_index(self):
+        """
+        The dictionary with the row of the embedding of each paper.
+        """
+        if self._embeds_index is None:
+            self._load_embeddings_index()
+        return self._embeds_index
+
+    @embeds_index.setter
+    def embeds_index(self, embeds_index):
+        self._embeds_index = embeds_index
+
+    @property
+    def embeds_size(self):
+        """
+        The number of dimensions of the embeddings.
+        """
+        if self._embeds_size is None:
+            self._load_embeddings_index()
+        return self._embeds_size
+
+    @property
+    def embeds_matrix(self):
+        """
+        The memory-mapped float32 matrix with the embeddings (only the rows we
+        use are loaded by the OS).
+        """
+        if self._embeds_matrix is None:
+            embeds_matrix_path = join(self.project_data_folder, self.embeds_matrix_file)
+            self._embeds_matrix = open_embeddings_matrix(embeds_matrix_path, self.embeds_size)
+        return self._embeds_matrix
+
+    @embeds_matrix.setter
+    def embeds_matrix(self, embeds_matrix):
+        self._embeds_matrix = embeds_matrix
+
+    @property
+    def embeds_vectors(self):
+        """
+        The embeddings in the selected format (the float32 matrix, or a
+        compressed version of it).
+        """
+        if self._embeds_vectors is None:
+            self._embeds_vectors = self._open_embeddings_vectors()
+        return self._embeds_vectors
+
+    @embeds_vectors.setter
+    def embeds_vectors(self, embeds_vectors):
+        self._embeds_vectors = embeds_vectors
+
+    @property
+    def text_store(self):
+        """
+        The store with the content of the papers, or None if it wasn't built.
+        """
+        if not self._text_store_opened:
+            self._text_store = self._open_text_store()
+            self._text_store_opened = True
+        return self._text_store
 
-        We create an index with the 'cord_uid' of the papers and the location of
-        the dictionary that contains them.
+    @text_store.setter
+    def text_store(self, text_store):
+        self._text_store = text_store
+        self._text_store_opened = True
 
-        :param embed_dicts: The number of dictionaries that we are going to use
-        to store all the embeddings of the papers (default: 100).
-        :return: A dictionary (the index) containing the location of the
-        dictionary that contains the embedding for a given paper.
+    def _load_embeddings_index(self):
         """
-        # Get the amount of CORD-19 papers in the current dataset.
-        total_papers = len(self.papers_index)
-        # Amount of embeddings to be stored per dictionary
-        embeds_per_dict = total_papers // embed_dicts + 1
+        Load the index with the rows of the embeddings.
+        """
+        embeds_index_path = join(self.project_data_folder, self.embeds_index_file)
+        with profiler.span('open_embeddings_index'), open(embeds_index_path, 'r') as file:
+            embeds_index = json.load(file)
+        self._embeds_index = embeds_index['papers']
+        self._embeds_size = embeds_index['embedding_size']
+
+    def shared_store(self, copy_embeddings=False):
+        """
+        Copy the lookup tables of the papers to shared memory, so the processes
+        of a pool can open the papers with the 'handle' of the store (using
+        SharedPapers), without building their own indexes.
+        :param copy_embeddings: Bool indicating if the embeddings' matrix is
+        also copied to the shared memory, instead of sharing its memory-mapped
+        file.
+        :return: The SharedPapersStore (it has to be closed when the workers
+        are done).
+        """
+        return SharedPapersStore(self, copy_embeddings=copy_embeddings)
+
+    def _check_writable(self, index_name):
+        """
+        Raise an error if the papers were opened in read-only mode, and we need
+        to build or modify one of the indexes.
+        :param index_name: The name of the index we need to build.
+        """
+        if self.readonly:
+            raise FileNotFoundError(
+                f"The {index_name} doesn't exist or is outdated, and the papers "
+                f"were opened in read-only mode."
+            )
+
+    def _create_embeddings_index(self, chunk_lines=4096, executor=None):
+        """
+        Load all the embeddings of the documents from the current CORD-19
+        dataset and save them in a contiguous float32 binary file, one row per
+        paper, so they can be memory-mapped and accessed without parsing.
+
+        The CSV file is split in parts of 'embeds_part_lines' lines and each
+        part is parsed in chunks of lines, transformed directly to float32
+        arrays, so the memory used doesn't depend on the size of the dataset.
+        The embeddings of each part are saved in a file of the build folder
+        named by the index of the part, and the parts completed before an
+        interruption are reused when the build starts again (with any amount
+        of processes).
+
+        If we receive a pool of processes, the parts are parsed at the same
+        time by the processes. The result is the same as parsing the file in
+        order.
+
+        The matrix is saved in the build folder, and we create an index with
+        the 'cord_uid' of the papers and the row of the matrix that contains
+        their embedding.
 
-        # Index to store the papers' 'cord_uid' and the location of the dictionary
-        # with their embedding.
+        :param chunk_lines: The amount of lines of the CSV parsed at a time.
+        :param executor: The ProcessPoolExecutor used to parse the file (if
+        None, the file is parsed in this process).
+        :return: A dictionary with the size of the embeddings and the index
+        containing the row of the embedding for a given paper.
+        """
+        # Index to store the papers' 'cord_uid' and the row of their embedding.
         embeddings_index = {}
+        # The size of the embeddings (taken from the first chunk of the CSV).
+        embedding_size = 0
 
-        # Create a temporary dictionary to store the embeddings of the papers.
-        temp_embeds_dict = {}
-        # Create counter for the amount of dictionaries we have created to store
-        # the embeddings of the papers, starting with 1.
-        dicts_count = 1
-        # Create counter for the amount of embeddings we have stored in the
-        # current temporary dictionary.
-        dict_embeds_count = 0
-        # Create the name of the file where the temporary dictionary will be
-        # stored.
-        temp_dict_file = f"embeddings_dict_{_number_to_3digits(dicts_count)}"
-
-        # Create the path for the CSV file containing the embeddings.
+        # Create the paths for the CSV file containing the embeddings and for
+        # the binary matrix.
         embeddings_path = join(self.cord19_data_folder, self.current_dataset, self.embeddings_file)
-        # Load the file
-        with open(embeddings_path, 'r') as csv_file:
-            csv_reader = csv.reader(csv_file)
-            # Iterate through the embedding of all the papers
-            for row in csv_reader:
-                # Get the 'cord_uid' and check if we have seen it before.
-                paper_cord_uid = row[0]
-                if paper_cord_uid in embeddings_index:
-                    continue
-                # Get the embedding of the paper.
-                paper_embedding = list(map(float, row[1:]))
-                # Save the embedding in the temporary dictionary.
-                temp_embeds_dict[paper_cord_uid] = paper_embedding
-                # Save the file where the embedding of the current paper will be
-                # saved.
-                embeddings_index[paper_cord_uid] = temp_dict_file
-                # Update the amount of embeddings stored.
-                dict_embeds_count += 1
-
-                # Check if we have reached the maximum amount of papers per dict.
-                if dict_embeds_count >= embeds_per_dict:
-                    # Save the current temporary dictionary
-                    temp_dict_path = join(self.project_data_folder, self.project_embeds_folder, temp_dict_file)
-                    with open(temp_dict_path, 'w') as file:
-                        json.dump(temp_embeds_dict, file)
-
-                    # Reset the temporary dictionary.
-                    temp_embeds_dict = {}
-                    dicts_count += 1
-                    dict_embeds_count = 0
-                    temp_dict_file = f"embeddings_dict_{_number_to_3digits(dicts_count)}"
-        # Check if we have pending embeddings once we finish visiting all the papers in
-        # the CSV file.
-        if temp_embeds_dict:
-            # Save the current temporary dictionary
-            temp_dict_path = join(self.project_data_folder, self.project_embeds_folder, temp_dict_file)
-            with open(temp_dict_path, 'w') as file:
-                json.dump(temp_embeds_dict, file)
+        build_path = self._embeddings_build_folder(embeddings_path)
+        matrix_path = join(build_path, self.embeds_matrix_file)
+
+        # Split the file in parts with the same amount of lines.
+        byte_ranges = _file_line_chunks(embeddings_path, self.embeds_part_lines)
+        embeds_chunks = self._embeddings_parts(
+            embeddings_path, byte_ranges, build_path, chunk_lines, executor
+        )
+
+        with open(matrix_path, 'wb') as matrix_file:
+            # Iterate through the chunks of embeddings.
+            for chunk_uids, chunk_embeds in embeds_chunks:
+                embedding_size = chunk_embeds.shape[1]
+                # Skip the papers we have seen before (or repeated in the chunk).
+                new_rows = []
+                for chunk_row, paper_cord_uid in enumerate(chunk_uids):
+                    if paper_cord_uid in embeddings_index:
+                        continue
+                    embeddings_index[paper_cord_uid] = len(embeddings_index)
+                    new_rows.append(chunk_row)
+                # Append the new embeddings to the matrix.
+                if len(new_rows) < len(chunk_uids):
+                    chunk_embeds = chunk_embeds[new_rows]
+                with profiler.span('matrix_write'):
+                    chunk_embeds.tofile(matrix_file)
 
         # Once we have saved all the embeddings, return the index.
+        embeddings_index = {
+            'embedding_size': embedding_size,
+            'papers': embeddings_index,
+        }
         return embeddings_index
 
+    def _embeddings_build_folder(self, embeddings_path):
+        """
+        Create the folder where the embeddings' matrix is built. The parts left
+        by an interrupted build are kept if they come from the same CSV file
+        (split in parts of the same amount of lines).
+        :param embeddings_path: The path of the embeddings CSV file.
+        :return: The path of the build folder.
+        """
+        build_path = join(self.project_data_folder, self.embeds_build_folder)
+        build_info_path = join(build_path, 'build.json')
+        file_stat = stat(embeddings_path)
+        build_info = {
+            'embeddings_path': embeddings_path,
+            'size': file_stat.st_size,
+            'mtime': file_stat.st_mtime,
+            'part_lines': self.embeds_part_lines,
+        }
+        if isdir(build_path) and load_json(build_info_path) != build_info:
+            rmtree(build_path)
+        if not isdir(build_path):
+            mkdir(build_path)
+            write_json_atomic(build_info_path, build_info)
+        return build_path
+
+    def _embeddings_parts(self, embeddings_path, byte_ranges, build_path, chunk_lines, executor):
+        """
+        Parse the parts of the embeddings CSV file, each one saving its
+        embeddings in a file of the build folder (in the processes of the
+        'executor', if we have one). The parts completed by a previous build
+        are not parsed again. The parts are returned in the order of the file.
+        :param embeddings_path: The path of the embeddings CSV file.
+        :param byte_ranges: The list of (start, end) byte ranges of the parts.
+        :param build_path: The folder for the part files.
+        :param chunk_lines: The amount of lines of the CSV parsed at a time.
+        :param executor: The ProcessPoolExecutor used to parse the file (if
+        None, the ranges are parsed in this process).
+        :return: An iterator of tuples with the list of 'cord_uid' and the
+        float32 matrix with their embeddings.
+        """
+        part_futures = []
+        for part, (start, end) in enumerate(byte_ranges):
+            part_path = join(build_path, f"embeddings_part_{part:05d}.f32")
+            part_future = None
+            if executor and not _embeddings_part_done(part_path):
+                part_future = executor.submit(
+                    _write_embeddings_range, embeddings_path, start, end, part_path, chunk_lines
+                )
+            part_futures.append((start, end, part_path, part_future))
+
+        # Return the parts in order.
+        for start, end, part_path, part_future in part_futures:
+            if part_future:
+                part_future.result()
+            elif not _embeddings_part_done(part_path):
+                _write_embeddings_range(embeddings_path, start, end, part_path, chunk_lines)
+            part_info = load_json(part_path + '.json')
+            part_uids = part_info['uids']
+            if part_uids:
+                part_embeds = np.fromfile(part_path, dtype=np.float32)
+                yield part_uids, part_embeds.reshape(len(part_uids), part_info['embedding_size'])
+
     def paper_title_abstract(self, cord_uid):
         """
         Find the title and abstract of the CORD-19 paper specified by the
@@ -207,56 +486,153 @@ class Papers:
         :param cord_uid: The Unique Identifier of the CORD-19 paper.
         :return: A string containing the title and abstract of the paper.
         """
-        # Get the dictionary with the info of the paper.
-        paper_dict = self.papers_index[cord_uid]
-        title_abstract = paper_dict['title'] + '\n\n' + paper_dict['abstract']
+        # Decode only the title and abstract of the paper.
+        paper_row = self.papers_index.uid_rows[cord_uid]
+        title = self.papers_index.field_value('title', paper_row)
+        abstract = self.papers_index.field_value('abstract', paper_row)
+        title_abstract = title + '\n\n' + abstract
         return title_abstract
 
     def paper_content(self, cord_uid):
         """
         Find the text of the 'cord_uid' paper in either the 'pmc_json_files' or
-        the 'pdf_json_files'.
+        the 'pdf_json_files' (or in the text store, if it was built).
         :param cord_uid: The Unique Identifier of the CORD-19 paper.
         :return: A string with the content of the paper, excluding the title and
         abstract.
         """
-        # Get the dictionary with the info of the paper
+        # Check if we have the content of the paper in the cache.
+        body_text = self.cache.get(('content', cord_uid))
+        if body_text is None:
+            with profiler.span('paper_content'):
+                paragraphs = self.paper_paragraphs(cord_uid)
+                with profiler.span('text_assembly'):
+                    body_text = render_body_text(paragraphs)
+            # Save the content in the cache.
+            self.cache.put(('content', cord_uid), body_text)
+        return body_text
+
+    def paper_paragraphs(self, cord_uid):
+        """
+        Get the paragraphs in the body of the 'cord_uid' paper, with the name of
+        their sections. They are read from the text store if it was built, or
+        from the 'pmc_json_files' or 'pdf_json_files' of the paper otherwise.
+        :param cord_uid: The Unique Identifier of the CORD-19 paper.
+        :return: A list of tuples with the section and text of the paragraphs.
+        """
+        # Use the text store if we have it.
+        if self.text_store:
+            with profiler.span('text_store'):
+                return self.text_store.paragraphs(self.papers_index.uid_rows[cord_uid])
+        # Get the dictionary with the info of the paper.
         paper_dict = self.papers_index[cord_uid]
-        # Get the paths for the documents of the paper
-        doc_json_files = []
-        if 'pmc_json_files' in paper_dict:
-            doc_json_files += paper_dict['pmc_json_files']
-        if 'pdf_json_files' in paper_dict:
-            doc_json_files += paper_dict['pdf_json_files']
-
-        # Where we are going to store the text of the paper.
-        body_text = ''
-        # Access the files and extract the text.
-        for doc_json_file in doc_json_files:
-            doc_json_path = join(self.cord19_data_folder, self.current_dataset, doc_json_file)
-            with open(doc_json_path, 'r') as f_json:
-                # Get the dictionary containing all the info of the document.
-                full_text_dict = json.load(f_json)
-
-                # Get all the sections in the body of the document.
-                last_section = ''
-                for paragraph_dict in full_text_dict['body_text']:
-                    section_name = paragraph_dict['section']
-                    paragraph_text = paragraph_dict['text']
-                    # Check if we are still on the same section, or a new one.
-                    if section_name == last_section:
-                        body_text += paragraph_text + '\n\n'
-                    else:
-                        body_text += '<< ' + section_name + ' >>\n' + paragraph_text + '\n\n'
-                    # Save the section name for the next iteration.
-                    last_section = section_name
+        dataset_folder = join(self.cord19_data_folder, self.current_dataset)
+        return _read_paper_paragraphs(dataset_folder, _paper_json_files(paper_dict))
 
-                # If we find text in one of the documents, break, to avoid
-                # repeating content.
-                if body_text:
-                    break
-        # Return the found content.
-        return body_text
+    @profiler.profile()
+    def export_passages(self, tokenizer=None, max_tokens=256, shard_tokens=2 ** 26,
+                        with_text=True, workers=1):
+        """
+        Split the title, abstract and body of all the papers in passages (inside
+        their sections) and save their token ids in shards of memory-mappable
+        files, so the training epochs can read them without processing the
+        text again.
+        :param tokenizer: The tokenizer with the methods 'encode(text)' and
+        'save(folder)' (by default, a RegexTokenizer).
+        :param max_tokens: The maximum amount of tokens in a passage.
+        :param shard_tokens: The amount of tokens in each shard.
+        :param with_text: Bool indicating if the text of the passages is also
+        saved.
+        :param workers: The amount of threads reading the papers.
+        :return: The PassageStore with the exported passages.
+        """
+        self._check_writable("passages")
+        passages_path = join(self.project_data_folder, self.passages_folder)
+        cord_uids = list(self.papers_index)
+        papers_paragraphs = zip(cord_uids, self._all_papers_map(
+            '_passage_paragraphs', cord_uids, workers, None, False, False
+        ))
+        export_passages(
+            passages_path, papers_paragraphs, tokenizer=tokenizer, max_tokens=max_tokens,
+            shard_tokens=shard_tokens, with_text=with_text,
+            meta={'dataset': self.current_dataset, 'fingerprint': self._papers_fingerprint()}
+        )
+        return PassageStore(passages_path)
+
+    def passage_store(self):
+        """
+        Open the passages created by 'export_passages()'.
+        :return: The PassageStore, or None if the passages weren't exported (or
+        the papers changed after they were).
+        """
+        passages_path = join(self.project_data_folder, self.passages_folder)
+        if not PassageStore.exists(passages_path):
+            return None
+        store = PassageStore(passages_path)
+        if store.meta.get('fingerprint') != self._papers_fingerprint():
+            return None
+        return store
+
+    def _passage_paragraphs(self, cord_uid):
+        """
+        Get the title, abstract and body paragraphs of a paper, with the name of
+        their sections.
+        """
+        paper_row = self.papers_index.uid_rows[cord_uid]
+        paragraphs = [
+            ('Title', self.papers_index.field_value('title', paper_row)),
+            ('Abstract', self.papers_index.field_value('abstract', paper_row)),
+        ]
+        return paragraphs + self.paper_paragraphs(cord_uid)
+
+    def build_text_store(self, workers=1):
+        """
+        Extract the paragraphs of all the papers from their JSON files and save
+        them in the compressed text store, so the content of the papers can be
+        accessed without parsing the JSON files. The papers are saved in the
+        order of their rows in the papers' index.
+        :param workers: The amount of processes used to parse the JSON files.
+        """
+        self._check_writable("text store")
+        text_store_path = join(self.project_data_folder, self.text_store_folder)
+        dataset_folder = join(self.cord19_data_folder, self.current_dataset)
+        # Get the JSON files of the papers in the order of their rows (the
+        # rows of the papers removed from the index are left empty).
+        papers_json_files = (
+            _paper_json_files(self.papers_index.record(row)) if self.papers_index.alive[row] else []
+            for row in range(self.papers_index.total_rows)
+        )
+        # Don't use the text store while we build it.
+        self.text_store = None
+        with TextWriter(text_store_path) as text_writer:
+            if workers > 1:
+                with ProcessPoolExecutor(max_workers=workers) as executor:
+                    compressed_texts = executor.map(
+                        _compressed_paper_paragraphs, repeat(dataset_folder),
+                        papers_json_files, chunksize=64
+                    )
+                    for compressed_text in compressed_texts:
+                        text_writer.add(compressed_text)
+            else:
+                for doc_json_files in papers_json_files:
+                    text_writer.add(_compressed_paper_paragraphs(dataset_folder, doc_json_files))
+        # Open the new store.
+        self.text_store = TextStore(text_store_path)
+
+    def _open_text_store(self):
+        """
+        Open the text store of the papers, if it was built for the current
+        papers' index.
+        :return: The TextStore, or None if it doesn't exist.
+        """
+        text_store_path = join(self.project_data_folder, self.text_store_folder)
+        if not TextStore.exists(text_store_path):
+            return None
+        text_store = TextStore(text_store_path)
+        # Check the store has all the papers of the index.
+        if len(text_store) != self.papers_index.total_rows:
+            return None
+        return text_store
 
     def paper_full_text(self, cord_uid):
         """
@@ -274,84 +650,1259 @@ class Papers:
         Find the precomputed SPECTER Document Embedding for the specified Paper
         'cord_uid'.
         :param cord_uid: The Unique Identifier of the CORD-19 paper.
-        :return: A 768-dimensional document embedding
-        """
-        # Get the dictionary where the embedding is saved.
-        embed_dict_filename = self.embeds_index[cord_uid]
-        # Check if this dictionary is already in memory.
-        if embed_dict_filename != self.cached_dict_filename:
-            # If the needed dict is not in memory, load it.
-            embed_dict_path = join(self.project_data_folder, self.project_embeds_folder, embed_dict_filename)
-            with open(embed_dict_path, 'r') as file:
-                # Update the cached dictionary.
-                self.cached_embed_dict = json.load(file)
-                self.cached_dict_filename = embed_dict_filename
-        # Return the embedding using the cached dictionary.
-        return self.cached_embed_dict[cord_uid]
-
-    def all_papers_title_abstract(self):
+        :return: A 768-dimensional document embedding (float32 NumPy array).
+        """
+        # Get the row of the embedding and slice it from the matrix.
+        embed_row = self.embeds_index[cord_uid]
+        return self.embeds_vectors[embed_row]
+
+    @profiler.profile()
+    def embeddings_matrix(self, cord_uids):
+        """
+        Create a matrix with the embeddings of the given papers, in the same
+        order as the 'cord_uids'. The rows of the embeddings are read in the
+        order they are stored on disk, so each block of the memory-mapped
+        matrix is visited at most once.
+        :param cord_uids: The list of Unique Identifiers of the CORD-19 papers.
+        :return: A float32 NumPy array with shape (len(cord_uids), 768).
+        """
+        # Get the rows of the papers in the embeddings' matrix.
+        cord_uids = list(cord_uids)
+        embed_rows = np.fromiter(
+            (self.embeds_index[cord_uid] for cord_uid in cord_uids),
+            dtype=np.int64, count=len(cord_uids)
+        )
+        # Sort the rows, to read the matrix sequentially.
+        sorted_order = np.argsort(embed_rows, kind='stable')
+        # Fill the preallocated matrix placing the embeddings in their
+        # original positions.
+        matrix = np.empty((len(cord_uids), self.embeds_size), dtype=np.float32)
+        matrix[sorted_order] = self.embeds_vectors[embed_rows[sorted_order]]
+        return matrix
+
+    def embeddings_batches(self, cord_uids=None, batch_size=1024):
+        """
+        Create an iterator with the embeddings of the given papers in batches of
+        'batch_size' rows. If no 'cord_uids' are given, it iterates through all
+        the embeddings in the order they are stored.
+        :param cord_uids: The list of Unique Identifiers of the CORD-19 papers.
+        :param batch_size: The maximum amount of rows in each batch.
+        :return: An iterator of tuples with the list of 'cord_uids' in the batch
+        and the float32 matrix with their embeddings.
+        """
+        # Use all the embeddings, in the order of their rows, by default.
+        if cord_uids is None:
+            cord_uids = sorted(self.embeds_index, key=self.embeds_index.get)
+        else:
+            cord_uids = list(cord_uids)
+        # Create the batches.
+        for start in range(0, len(cord_uids), batch_size):
+            batch_uids = cord_uids[start:start + batch_size]
+            yield batch_uids, self.embeddings_matrix(batch_uids)
+
+    @profiler.profile()
+    def most_similar(self, query, k=10, approximate=False, n_probe=8, pq=False):
+        """
+        Find the papers with the most similar embeddings to the 'query', using
+        the cosine similarity.
+        :param query: The 'cord_uid' of a CORD-19 paper (the paper will be
+        excluded from the results), or an embedding vector.
+        :param k: The amount of papers to return.
+        :param approximate: Bool indicating if we use the approximate search
+        (faster, but it can miss some of the closest papers).
+        :param n_probe: The amount of lists visited by the approximate search.
+        :param pq: Bool indicating if we compare the query with the product
+        quantization codes of the embeddings (a fraction of the memory, with
+        approximate similarities).
+        :return: A list of tuples with the 'cord_uid' of the papers and their
+        similarity, sorted from the most similar to the least similar.
+        """
+        # Get the query vector.
+        exclude_row = None
+        if isinstance(query, str):
+            exclude_row = self.embeds_index[query]
+            query = self.embeds_vectors[exclude_row]
+        # Skip the rows of the embeddings that were replaced or removed.
+        row_uids = self._embeddings_row_uids()
+        row_mask = None
+        if len(self.embeds_index) < len(row_uids):
+            row_mask = np.zeros(len(row_uids), dtype=bool)
+            row_mask[list(self.embeds_index.values())] = True
+        # Search the closest embeddings.
+        if pq:
+            embed_rows, similarities = self._pq_search().search(
+                query, k=k, exclude=exclude_row, row_mask=row_mask
+            )
+        elif approximate:
+            embed_rows, similarities = self._ivf_search().search(
+                query, k=k, n_probe=n_probe, exclude=exclude_row, row_mask=row_mask
+            )
+        else:
+            if self.exact_search is None:
+                self.exact_search = ExactSearch(self.embeds_vectors)
+            embed_rows, similarities = self.exact_search.search(
+                query, k=k, exclude=exclude_row, row_mask=row_mask
+            )
+        # Get the papers of the rows.
+        similar_papers = [
+            (row_uids[embed_row], float(similarity))
+            for embed_row, similarity in zip(embed_rows, similarities)
+        ]
+        return similar_papers
+
+    def _ivf_search(self):
+        """
+        Load the approximate search index of the embeddings, or create it if it
+        doesn't exist (or belongs to an old embeddings' matrix).
+        :return: The IVFSearch index.
+        """
+        if self.ivf_search is None:
+            ivf_path = join(self.project_data_folder, self.embeds_ivf_file)
+            # The index is built over the vectors of the current mode.
+            fingerprint = f"{self._embeddings_fingerprint()}:{self.embeds_mode}"
+            if isfile(ivf_path):
+                self.ivf_search = IVFSearch.load(ivf_path, self.embeds_vectors)
+            if self.ivf_search is not None and self.ivf_search.fingerprint != fingerprint:
+                self.ivf_search = None
+            if self.ivf_search is None:
+                self._check_writable("approximate search index")
+                self.ivf_search = IVFSearch.build(self.embeds_vectors)
+                self.ivf_search.fingerprint = fingerprint
+                self.ivf_search.save(ivf_path)
+        return self.ivf_search
+
+    def _pq_search(self):
+        """
+        Load the product quantization codes of the embeddings, or create them if
+        they don't exist (or belong to an old embeddings' matrix).
+        :return: The ProductQuantizer of the embeddings.
+        """
+        if self.pq_search is None:
+            pq_path = join(self.project_data_folder, self.embeds_pq_file)
+            # The codes are created from the float32 embeddings.
+            fingerprint = f"{self._embeddings_fingerprint()}:float32"
+            self.pq_search = ProductQuantizer.load(pq_path)
+            if self.pq_search is None or self.pq_search.fingerprint != fingerprint:
+                self._check_writable("product quantization index")
+                self.pq_search = ProductQuantizer.build(self.embeds_matrix)
+                self.pq_search.fingerprint = fingerprint
+                self.pq_search.save(pq_path)
+        return self.pq_search
+
+    def _open_embeddings_vectors(self, mode=None):
+        """
+        Open the embeddings' matrix in the given format, creating the compressed
+        matrix from the float32 one if it doesn't exist (or belongs to an old
+        embeddings' matrix).
+        :param mode: The format of the matrix, 'float32', 'float16' or 'int8'
+        (by default, the mode of the class).
+        :return: The float32 memmap or the QuantizedMatrix.
+        """
+        mode = mode or self.embeds_mode
+        if mode == 'float32':
+            return self.embeds_matrix
+        codes_file = self.embeds_f16_file if mode == 'float16' else self.embeds_i8_file
+        codes_path = join(self.project_data_folder, codes_file)
+        scales_path = join(self.project_data_folder, self.embeds_i8_scales_file)
+        fingerprint = f"{self._embeddings_fingerprint()}:{mode}"
+        vectors = open_quantized_matrix(mode, codes_path, self.embeds_size, scales_path)
+        if vectors is None or vectors.fingerprint != fingerprint:
+            self._check_writable(f"{mode} embeddings' matrix")
+            save_quantized_matrix(
+                self.embeds_matrix, mode, codes_path, scales_path, fingerprint=fingerprint
+            )
+            vectors = open_quantized_matrix(mode, codes_path, self.embeds_size, scales_path)
+        return vectors
+
+    def _embeddings_vectors_exist(self, mode):
+        """
+        Check if the files of the embeddings' matrix in the given format exist.
+        :param mode: The format of the matrix, 'float16' or 'int8'.
+        """
+        codes_file = self.embeds_f16_file if mode == 'float16' else self.embeds_i8_file
+        mode_files = [codes_file, codes_file + '.json']
+        if mode == 'int8':
+            mode_files.append(self.embeds_i8_scales_file)
+        return all(isfile(join(self.project_data_folder, mode_file)) for mode_file in mode_files)
+
+    def quantization_report(self, n_queries=100, k=10, modes=('float16', 'int8', 'pq')):
+        """
+        Measure the memory saved by the compressed formats of the embeddings,
+        and the error they introduce in the cosine similarities and the top-k
+        neighbours, compared with the float32 embeddings.
+        :param n_queries: The amount of embeddings used as queries.
+        :param k: The amount of neighbours used to measure the recall.
+        :param modes: The compressed formats we are going to compare.
+        :return: A dictionary with the results of each format.
+        """
+        quantized = {}
+        for mode in modes:
+            if mode == 'pq':
+                quantized[mode] = self._pq_search()
+            else:
+                quantized[mode] = self._open_embeddings_vectors(mode)
+        return quantization_report(self.embeds_matrix, quantized, n_queries=n_queries, k=k)
+
+    @profiler.profile()
+    def cluster_embeddings(self, n_clusters=100, batch_size=4096, n_epochs=3, workers=1, seed=0):
+        """
+        Group the papers by the similarity of their embeddings with a spherical
+        mini-batch k-means, reading the embeddings in batches. The clusters are
+        also merged in a hierarchy of topics. The result is saved in the
+        project's data folder.
+        :param n_clusters: The amount of clusters.
+        :param batch_size: The amount of embeddings in each batch.
+        :param n_epochs: The amount of passes over the embeddings.
+        :param workers: The amount of processes used to assign the papers to
+        the clusters.
+        :param seed: The seed of the random generator.
+        :return: The EmbeddingsClustering with the centroids, the clusters of
+        the papers and the hierarchy.
+        """
+        self._check_writable("clusters of the embeddings")
+        clustering = minibatch_kmeans(
+            self, n_clusters, batch_size=batch_size, n_epochs=n_epochs,
+            workers=workers, seed=seed
+        )
+        clustering.merge_hierarchy()
+        clustering.fingerprint = self._embeddings_fingerprint()
+        clustering.save(join(self.project_data_folder, self.clusters_file))
+        return clustering
+
+    def embeddings_clusters(self):
+        """
+        Load the clusters created by 'cluster_embeddings()'.
+        :return: The EmbeddingsClustering, or None if the papers weren't
+        clustered (or the embeddings changed after they were).
+        """
+        clustering = EmbeddingsClustering.load(join(self.project_data_folder, self.clusters_file))
+        if clustering is None or clustering.fingerprint != self._embeddings_fingerprint():
+            return None
+        return clustering
+
+    @profiler.profile()
+    def find_duplicates(self, shingle_size=5, num_perm=128, bands=32, jaccard_threshold=0.7,
+                        cosine_threshold=0.95, workers=1, seed=0):
+        """
+        Find the groups of near-duplicate papers, comparing the MinHash
+        signatures of the shingles of their full text (with LSH) and the
+        cosine similarity of their embeddings. The groups are saved in the
+        project's data folder.
+        :param shingle_size: The amount of words in a shingle.
+        :param num_perm: The amount of values in the MinHash signatures.
+        :param bands: The amount of LSH bands.
+        :param jaccard_threshold: The minimum estimated Jaccard similarity of
+        the shingles of two duplicates.
+        :param cosine_threshold: The minimum cosine similarity of the embeddings
+        of two duplicates.
+        :param workers: The amount of threads reading the papers.
+        :param seed: The seed of the hash functions.
+        :return: The NearDuplicates with the groups of papers.
+        """
+        self._check_writable("near-duplicates of the papers")
+        near_duplicates = find_near_duplicates(
+            self, shingle_size=shingle_size, num_perm=num_perm, bands=bands,
+            jaccard_threshold=jaccard_threshold, cosine_threshold=cosine_threshold,
+            workers=workers, seed=seed
+        )
+        near_duplicates.fingerprint = self._papers_fingerprint()
+        near_duplicates.save(join(self.project_data_folder, self.duplicates_file))
+        self.near_duplicates = near_duplicates
+        return near_duplicates
+
+    def paper_duplicates(self):
+        """
+        Get the groups of near-duplicate papers, found with the default
+        parameters the first time they are used.
+        :return: The NearDuplicates with the groups of papers.
+        """
+        if self.near_duplicates is None:
+            duplicates_path = join(self.project_data_folder, self.duplicates_file)
+            self.near_duplicates = NearDuplicates.load(duplicates_path)
+            # Check the duplicates were found with the current papers.
+            if self.near_duplicates is not None and self.near_duplicates.fingerprint != self._papers_fingerprint():
+                self.near_duplicates = None
+            if self.near_duplicates is None:
+                self.find_duplicates()
+        return self.near_duplicates
+
+    def canonical_uid(self, cord_uid):
+        """
+        Get the canonical paper of the group of near-duplicates of the
+        'cord_uid' paper (the paper itself if it has no duplicates).
+        :param cord_uid: The Unique Identifier of the CORD-19 paper.
+        :return: The 'cord_uid' of the canonical paper.
+        """
+        return self.paper_duplicates().canonical_uid(cord_uid)
+
+    def _papers_fingerprint(self):
+        """
+        Create a fingerprint of the papers in the index (the dataset, the rows
+        and the rows still alive), to detect the derived indexes created
+        before the papers changed.
+        :return: A string with the fingerprint.
+        """
+        alive_crc = zlib.crc32(np.packbits(self.papers_index.alive).tobytes())
+        return f"{self.current_dataset}:{self.papers_index.total_rows}:{alive_crc:08x}"
+
+    def _embeddings_fingerprint(self):
+        """
+        Create a fingerprint of the embeddings (the dataset, the rows of the
+        matrix and the papers in the index), to detect the clusters created
+        before the embeddings changed. An update appends the new and replaced
+        embeddings to the matrix, so its rows change even when the amount of
+        papers stays the same.
+        :return: A string with the fingerprint.
+        """
+        return f"{self.current_dataset}:{len(self.embeds_matrix)}:{len(self.embeds_index)}"
+
+    def _papers_to_visit(self, cord_uids, skip_duplicates):
+        """
+        Get the papers visited by the iterators: the given papers (by default
+        all of them), without the near-duplicates if 'skip_duplicates' is True.
+        """
+        if cord_uids is None:
+            cord_uids = self.papers_index
+        if skip_duplicates:
+            near_duplicates = self.paper_duplicates()
+            cord_uids = (
+                cord_uid for cord_uid in cord_uids if not near_duplicates.is_duplicate(cord_uid)
+            )
+        return cord_uids
+
+    @profiler.profile()
+    def build_citation_graph(self, min_title_words=4, workers=1):
+        """
+        Create the graph of citations between the papers, extracting the
+        references from the 'bib_entries' of their JSON files (in a single pass
+        over the corpus) and resolving them to the papers of the corpus by DOI
+        or normalised title. The graph is saved in the project's data folder.
+        :param min_title_words: The minimum amount of words of the titles used
+        to resolve the references.
+        :param workers: The amount of processes reading the JSON files.
+        :return: The CitationGraph.
+        """
+        self._check_writable("citation graph")
+        dataset_folder = join(self.cord19_data_folder, self.current_dataset)
+        cord_uids = list(self.papers_index)
+        paper_rows = [self.papers_index.uid_rows[cord_uid] for cord_uid in cord_uids]
+        titles = [self.papers_index.field_value('title', row) for row in paper_rows]
+        metadata_dois = _metadata_dois(
+            join(dataset_folder, self.metadata_file), self.papers_index.uid_rows
+        )
+        dois = [metadata_dois.get(row, '') for row in paper_rows]
+        papers_references = prefetch_map(
+            partial(_read_paper_references, dataset_folder),
+            (_paper_json_files(self.papers_index.record(row)) for row in paper_rows),
+            workers=workers, processes=True
+        )
+        citation_graph = build_citation_graph(
+            cord_uids, titles, dois, papers_references, min_title_words=min_title_words
+        )
+        citation_graph.fingerprint = self._papers_fingerprint()
+        citation_graph.save(join(self.project_data_folder, self.citation_graph_file))
+        self.citation_graph = citation_graph
+        return citation_graph
+
+    def paper_citations(self):
+        """
+        Get the graph of citations between the papers, created the first time
+        it is used.
+        :return: The CitationGraph.
+        """
+        if self.citation_graph is None:
+            graph_path = join(self.project_data_folder, self.citation_graph_file)
+            self.citation_graph = CitationGraph.load(graph_path)
+            # Check the graph was created with the current papers.
+            if self.citation_graph is not None and self.citation_graph.fingerprint != self._papers_fingerprint():
+                self.citation_graph = None
+            if self.citation_graph is None:
+                self.build_citation_graph()
+        return self.citation_graph
+
+    def references(self, cord_uid):
+        """
+        Get the papers of the corpus referenced by the 'cord_uid' paper.
+        :param cord_uid: The Unique Identifier of the CORD-19 paper.
+        :return: A NumPy array with the 'cord_uid' of the papers.
+        """
+        return self.paper_citations().references(cord_uid)
+
+    def cited_by(self, cord_uid):
+        """
+        Get the papers of the corpus that cite the 'cord_uid' paper.
+        :param cord_uid: The Unique Identifier of the CORD-19 paper.
+        :return: A NumPy array with the 'cord_uid' of the papers.
+        """
+        return self.paper_citations().cited_by(cord_uid)
+
+    @profiler.profile()
+    def pagerank(self, k=10, damping=0.85):
+        """
+        Find the most central papers of the citation graph with PageRank.
+        :param k: The amount of papers returned (all of them if None).
+        :param damping: The probability of following a reference.
+        :return: A list of tuples with the 'cord_uid' of the papers and their
+        rank, from the highest rank.
+        """
+        citation_graph = self.paper_citations()
+        ranks = citation_graph.pagerank(damping=damping)
+        top_nodes = np.argsort(-ranks, kind='stable')[:k]
+        return [(str(citation_graph.cord_uids[node]), float(ranks[node])) for node in top_nodes.tolist()]
+
+    def _embeddings_row_uids(self):
+        """
+        Create an array with the 'cord_uid' of the paper stored in each row of
+        the embeddings' matrix.
+        """
+        if self.embeds_row_uids is None:
+            self.embeds_row_uids = np.empty(len(self.embeds_matrix), dtype=object)
+            for cord_uid, embed_row in self.embeds_index.items():
+                self.embeds_row_uids[embed_row] = cord_uid
+        return self.embeds_row_uids
+
+    @profiler.profile()
+    def search(self, query, k=10, fields=None):
+        """
+        Find the papers that best match the words of the 'query', ranked with
+        BM25. The keyword index is created the first time it is used.
+        :param query: The text of the query.
+        :param k: The amount of papers to return.
+        :param fields: The fields used in the search, any of 'title', 'abstract'
+        and 'body' (by default all of them).
+        :return: A list of tuples with the 'cord_uid' of the papers and their
+        scores, sorted from the highest score to the lowest.
+        """
+        if self.bm25_index is None:
+            bm25_index_path = join(self.project_data_folder, self.bm25_index_folder)
+            if BM25Index.exists(bm25_index_path):
+                self.bm25_index = BM25Index(bm25_index_path)
+                # Check the index belongs to the current papers.
+                if self.bm25_index.meta.get('fingerprint') != self._papers_fingerprint():
+                    self.bm25_index = None
+            if self.bm25_index is None:
+                self._check_writable("keyword search index")
+                self.build_search_index()
+        return self.bm25_index.search(query, k=k, fields=fields)
+
+    @profiler.profile()
+    def build_search_index(self, max_postings=2 ** 24):
+        """
+        Create the BM25 index with the words in the title, abstract and body
+        text of all the papers, in a single pass over the corpus.
+        :param max_postings: The maximum amount of postings kept in memory
+        while the index is created.
+        """
+        self._check_writable("keyword search index")
+        bm25_index_path = join(self.project_data_folder, self.bm25_index_folder)
+        documents = (
+            (cord_uid, self._paper_search_fields(cord_uid))
+            for cord_uid in self.papers_index
+        )
+        build_bm25_index(
+            bm25_index_path, documents, ['title', 'abstract', 'body'],
+            meta={'dataset': self.current_dataset, 'fingerprint': self._papers_fingerprint()},
+            max_postings=max_postings
+        )
+        self.bm25_index = BM25Index(bm25_index_path)
+
+    def _paper_search_fields(self, cord_uid):
+        """
+        Get the text of the fields of the paper used by the keyword index.
+        """
+        paper_row = self.papers_index.uid_rows[cord_uid]
+        search_fields = {
+            'title': self.papers_index.field_value('title', paper_row),
+            'abstract': self.papers_index.field_value('abstract', paper_row),
+            'body': '\n'.join(text for _, text in self.paper_paragraphs(cord_uid)),
+        }
+        return search_fields
+
+    @profiler.profile()
+    def filter(self, published_after=None, published_before=None, has_pmc=None,
+               has_pdf=None, has_full_text=None, authors=None):
+        """
+        Select the papers that match all the given conditions, using the
+        columnar indexes of the metadata (the conditions that are None are
+        ignored). The indexes are created the first time they are used.
+        :param published_after: The papers published on this date or later
+        ('YYYY-MM-DD', 'YYYY-MM', 'YYYY' or a datetime.date).
+        :param published_before: The papers published before this date.
+        :param has_pmc: Bool indicating if the papers have PMC full text or not.
+        :param has_pdf: Bool indicating if the papers have PDF full text or not.
+        :param has_full_text: Bool indicating if the papers have any full text
+        or not.
+        :param authors: The name of an author ('Last, First' as in the
+        metadata), or a list of names, the papers must have at least one of them.
+        :return: A NumPy array with the 'cord_uid' of the papers, in the order
+        of the papers' index.
+        """
+        if self.paper_filters is None:
+            filters_path = join(self.project_data_folder, self.paper_filters_file)
+            self.paper_filters = PaperFilters.load(filters_path)
+            # Check the filters have all the rows of the papers' index.
+            if self.paper_filters and len(self.paper_filters) != self.papers_index.total_rows:
+                self.paper_filters = None
+            if self.paper_filters is None:
+                self._check_writable("metadata filters")
+                self.paper_filters = PaperFilters.build(self.papers_index)
+                self.paper_filters.save(filters_path)
+        paper_rows = self.paper_filters.select(
+            published_after=published_after, published_before=published_before,
+            has_pmc=has_pmc, has_pdf=has_pdf, has_full_text=has_full_text,
+            authors=authors, alive=self.papers_index.alive
+        )
+        cord_uids = np.array(
+            [self.papers_index.field_value('cord_uid', row) for row in paper_rows.tolist()],
+            dtype=object
+        )
+        return cord_uids
+
+    @profiler.profile()
+    def update_dataset(self, dataset, embeddings_file=None, chunk_lines=4096):
+        """
+        Update the indexes to a new release of the CORD-19 dataset, changing
+        only the papers and embeddings that are different from the ones we
+        have. The new or modified papers and embeddings are appended to the
+        indexes, and the ones that are no longer in the dataset are removed
+        from them (their old rows stay in the files, marked as dead).
+
+        The updated indexes are written to a temporary folder, and moved to
+        their place once they are complete, so an interrupted update leaves
+        the current indexes as they were. The manifest with the new dataset is
+        saved before the files are moved, so if the update stops while they
+        are moved, the indexes are built again from the new release.
+
+        The text store, if it was built, is also updated with the content of
+        the new papers.
+
+        :param dataset: The name of the folder of the new CORD-19 release
+        inside the CORD-19 data folder (usually its date).
+        :param embeddings_file: The name of the embeddings CSV file of the new
+        release (default: 'cord_19_embeddings_<dataset>.csv').
+        :param chunk_lines: The amount of lines of the embeddings CSV parsed at a
+        time.
+        :return: A dictionary with the amount of papers and embeddings that
+        were added, replaced, removed or left unchanged.
+        """
+        self._check_writable("indexes of the new dataset")
+        if embeddings_file is None:
+            embeddings_file = f"cord_19_embeddings_{dataset}.csv"
+        dataset_folder = join(self.cord19_data_folder, dataset)
+        metadata_path = join(dataset_folder, self.metadata_file)
+        embeddings_path = join(dataset_folder, embeddings_file)
+
+        # Check if the files of the release are different from the ones we have.
+        manifest = self._load_manifest()
+        new_hashes = {
+            'metadata_hash': _file_hash(metadata_path),
+            'embeddings_hash': _file_hash(embeddings_path),
+        }
+        # Create the folder for the updated indexes (removing the files of an
+        # update that was interrupted).
+        update_path = join(self.project_data_folder, self.update_folder)
+        if isdir(update_path):
+            rmtree(update_path)
+        mkdir(update_path)
+        # Open the text store (if it exists) before the index changes.
+        text_store = self.text_store
+        old_total_rows = self.papers_index.total_rows
+        changes = {}
+        if new_hashes['metadata_hash'] != manifest.get('metadata_hash'):
+            changes['papers'] = self._update_papers_index(metadata_path, update_path)
+        if new_hashes['embeddings_hash'] != manifest.get('embeddings_hash'):
+            changes['embeddings'] = self._update_embeddings_index(embeddings_path, chunk_lines, update_path)
+
+        # Save the new dataset in the manifest, and move the updated indexes
+        # to their place.
+        self.current_dataset = dataset
+        self.embeddings_file = embeddings_file
+        self._save_manifest(hashes=new_hashes, update_path=update_path)
+        self._publish_update(update_path)
+
+        # Add the content of the new papers to the text store.
+        if text_store and 'papers' in changes:
+            text_store_path = join(self.project_data_folder, self.text_store_folder)
+            with TextWriter(text_store_path, append=True) as text_writer:
+                for row in range(old_total_rows, self.papers_index.total_rows):
+                    doc_json_files = _paper_json_files(self.papers_index.record(row))
+                    text_writer.add(_compressed_paper_paragraphs(dataset_folder, doc_json_files))
+            self.text_store = TextStore(text_store_path)
+        return changes
+
+    def _update_papers_index(self, metadata_path, update_path):
+        """
+        Create the updated papers' index in the update folder, with the
+        information in a new metadata file: the papers that are new or changed
+        are appended to a copy of the index, and the rows of the papers that
+        were changed or removed are marked as dead.
+        :param metadata_path: The path of the new metadata.csv file.
+        :param update_path: The folder of the updated indexes.
+        :return: A dictionary with the amount of papers added, replaced,
+        removed and unchanged.
+        """
+        papers_index_path = join(self.project_data_folder, self.papers_index_folder)
+        new_index_path = join(update_path, self.papers_index_folder)
+        copytree(papers_index_path, new_index_path)
+        old_index = self.papers_index
+        changes = {'added': 0, 'replaced': 0, 'removed': 0, 'unchanged': 0}
+        dead_rows = []
+        found_uids = set()
+        with RecordsWriter(new_index_path, append=True) as records_writer:
+            for paper_dict in _metadata_papers(metadata_path):
+                cord_uid = paper_dict['cord_uid']
+                found_uids.add(cord_uid)
+                old_row = old_index.uid_rows.get(cord_uid)
+                if old_row is None:
+                    changes['added'] += 1
+                elif old_index.record(old_row) == paper_dict:
+                    changes['unchanged'] += 1
+                    continue
+                else:
+                    changes['replaced'] += 1
+                    dead_rows.append(old_row)
+                records_writer.add(paper_dict)
+        # Remove the papers that are not in the new release.
+        for cord_uid, old_row in old_index.uid_rows.items():
+            if cord_uid not in found_uids:
+                changes['removed'] += 1
+                dead_rows.append(old_row)
+
+        # Save the rows that are no longer used.
+        new_total_rows = old_index.total_rows + changes['added'] + changes['replaced']
+        alive = RecordsIndex.load_alive(new_index_path, new_total_rows)
+        alive[dead_rows] = False
+        RecordsIndex.save_alive(new_index_path, alive)
+        return changes
+
+    def _update_embeddings_index(self, embeddings_path, chunk_lines, update_path):
+        """
+        Create the updated embeddings' matrix and index in the update folder,
+        with the embeddings in a new CSV file: the ones that are new or changed
+        are appended to a copy of the matrix.
+        :param embeddings_path: The path of the new embeddings CSV file.
+        :param chunk_lines: The amount of lines of the CSV parsed at a time.
+        :param update_path: The folder of the updated indexes.
+        :return: A dictionary with the amount of embeddings added, replaced,
+        removed and unchanged.
+        """
+        matrix_path = join(update_path, self.embeds_matrix_file)
+        copyfile(join(self.project_data_folder, self.embeds_matrix_file), matrix_path)
+        old_index = self.embeds_index
+        new_index = {}
+        changes = {'added': 0, 'replaced': 0, 'removed': 0, 'unchanged': 0}
+        next_row = len(self.embeds_matrix)
+        embeds_chunks = _embeddings_range_chunks(embeddings_path, 0, getsize(embeddings_path), chunk_lines)
+        with open(matrix_path, 'ab') as matrix_file:
+            for chunk_uids, chunk_embeds in embeds_chunks:
+                if chunk_embeds.shape[1] != self.embeds_size:
+                    raise ValueError(
+                        f"The new embeddings have {chunk_embeds.shape[1]} dimensions "
+                        f"instead of {self.embeds_size}."
+                    )
+                # Find the new embeddings in the chunk (the first one of each
+                # paper).
+                new_rows = []
+                for chunk_row, paper_cord_uid in enumerate(chunk_uids):
+                    if paper_cord_uid in new_index:
+                        continue
+                    old_row = old_index.get(paper_cord_uid)
+                    if old_row is not None:
+                        if np.array_equal(self.embeds_matrix[old_row], chunk_embeds[chunk_row]):
+                            changes['unchanged'] += 1
+                            new_index[paper_cord_uid] = old_row
+                            continue
+                        changes['replaced'] += 1
+                    else:
+                        changes['added'] += 1
+                    new_index[paper_cord_uid] = next_row
+                    next_row += 1
+                    new_rows.append(chunk_row)
+                # Append the new embeddings to the matrix.
+                chunk_embeds[new_rows].tofile(matrix_file)
+        changes['removed'] = len(set(old_index) - set(new_index))
+
+        # Save the new index.
+        embeds_index = {
+            'embedding_size': self.embeds_size,
+            'papers': new_index,
+        }
+        write_json_atomic(join(update_path, self.embeds_index_file), embeds_index)
+        return changes
+
+    def _publish_update(self, update_path):
+        """
+        Move the indexes created by an update to their place (the matrix
+        before its index), and open them.
+        :param update_path: The folder of the updated indexes.
+        """
+        new_index_path = join(update_path, self.papers_index_folder)
+        if isdir(new_index_path):
+            papers_index_path = join(self.project_data_folder, self.papers_index_folder)
+            replace_folder(new_index_path, papers_index_path)
+            self.papers_index = RecordsIndex(papers_index_path)
+            self.cache.clear()
+            self.paper_filters = None
+            self.bm25_index = None
+            self.near_duplicates = None
+            self.citation_graph = None
+        if isfile(join(update_path, self.embeds_index_file)):
+            for file_name in (self.embeds_matrix_file, self.embeds_index_file):
+                os_replace(join(update_path, file_name), join(self.project_data_folder, file_name))
+            self._load_embeddings_index()
+            matrix_path = join(self.project_data_folder, self.embeds_matrix_file)
+            self.embeds_matrix = open_embeddings_matrix(matrix_path, self.embeds_size)
+            self.embeds_vectors = self._open_embeddings_vectors()
+            # The search indexes have to be created again.
+            self.exact_search = None
+            self.ivf_search = None
+            self.pq_search = None
+            self.embeds_row_uids = None
+        rmtree(update_path)
+
+    def _load_manifest(self):
+        """
+        Load the manifest with the CORD-19 dataset used to create the indexes.
+        :return: The dictionary with the manifest, or an empty dictionary if it
+        doesn't exist (or is corrupted).
+        """
+        manifest_path = join(self.project_data_folder, self.manifest_file)
+        manifest = load_json(manifest_path)
+        return manifest if manifest else {}
+
+    def _save_manifest(self, with_hashes=False, hashes=None, update_path=None):
+        """
+        Save the manifest with the CORD-19 dataset used by the indexes.
+        :param with_hashes: Bool indicating if we calculate the hashes of the
+        metadata and embeddings files of the dataset.
+        :param hashes: The dictionary with the hashes of the files, if they
+        were already calculated.
+        :param update_path: The folder with the indexes of an update that are
+        going to replace the current ones (their checksums and sizes are saved
+        instead).
+        """
+        dataset_folder = join(self.cord19_data_folder, self.current_dataset)
+        if hashes is None:
+            hashes = {'metadata_hash': None, 'embeddings_hash': None}
+            if with_hashes:
+                hashes['metadata_hash'] = _file_hash(join(dataset_folder, self.metadata_file))
+                hashes['embeddings_hash'] = _file_hash(join(dataset_folder, self.embeddings_file))
+        # The checksums of the files of the indexes, to detect the files that
+        # were truncated or modified.
+        index_files = {}
+        papers_count = len(self.papers_index)
+        embeds_count = len(self.embeds_index)
+        for file_name in (self.papers_index_folder, self.embeds_matrix_file, self.embeds_index_file):
+            files_folder = self.project_data_folder
+            if update_path and (isdir(join(update_path, file_name)) or isfile(join(update_path, file_name))):
+                files_folder = update_path
+            index_files.update(folder_checksums(files_folder, [file_name]))
+        if update_path and isdir(join(update_path, self.papers_index_folder)):
+            papers_count = len(RecordsIndex(join(update_path, self.papers_index_folder)))
+        if update_path and isfile(join(update_path, self.embeds_index_file)):
+            embeds_count = len(load_json(join(update_path, self.embeds_index_file))['papers'])
+        manifest = {
+            'dataset': self.current_dataset,
+            'metadata_file': self.metadata_file,
+            'embeddings_file': self.embeddings_file,
+            'metadata_hash': hashes['metadata_hash'],
+            'embeddings_hash': hashes['embeddings_hash'],
+            'papers': papers_count,
+            'embeddings': embeds_count,
+            'files': index_files,
+        }
+        manifest_path = join(self.project_data_folder, self.manifest_file)
+        write_json_atomic(manifest_path, manifest, indent=2)
+
+    def all_papers_title_abstract(self, cord_uids=None, skip_duplicates=False):
         """
         Create an iterator of strings containing the title and abstract of all
         the papers in the CORD-19 dataset.
+        :param cord_uids: The papers we want to visit (by default all of them).
+        :param skip_duplicates: Bool indicating if the near-duplicates of other
+        papers are skipped (only the canonical paper of each group is visited).
         :return: An iterator of strings.
         """
-        for cord_uid in self.papers_index:
+        for cord_uid in self._papers_to_visit(cord_uids, skip_duplicates):
             yield self.paper_title_abstract(cord_uid)
 
-    def all_papers_content(self):
+    def all_papers_content(self, cord_uids=None, workers=1, prefetch=None, unordered=False,
+                           processes=False, skip_duplicates=False):
         """
         Create an iterator containing the body text for each of the papers in
         the CORD-19 dataset.
+
+        The documents can be read by a pool of threads (or processes) while the
+        caller works on the previous ones.
+        :param cord_uids: The papers we want to visit (by default all of them).
+        :param workers: The amount of threads or processes reading documents.
+        :param prefetch: The maximum amount of documents read ahead of the
+        caller (default: twice the amount of workers).
+        :param unordered: Bool indicating if the documents are returned as soon
+        as they are read, instead of in the order of the papers. In this case
+        the iterator returns tuples with the 'cord_uid' and the text.
+        :param processes: Bool indicating if we use processes instead of threads
+        (each process opens its own Papers).
+        :param skip_duplicates: Bool indicating if the near-duplicates of other
+        papers are skipped (only the canonical paper of each group is visited).
         :return: An iterator of strings.
         """
-        for cord_uid in self.papers_index:
-            yield self.paper_content(cord_uid)
+        cord_uids = self._papers_to_visit(cord_uids, skip_duplicates)
+        return self._all_papers_map('paper_content', cord_uids, workers, prefetch, unordered, processes)
 
-    def all_papers_full_text(self):
+    def all_papers_full_text(self, cord_uids=None, workers=1, prefetch=None, unordered=False,
+                             processes=False, skip_duplicates=False):
         """
         Create an iterator containing the full text for each of the papers in
         the CORD-19 dataset.
+
+        The documents can be read by a pool of threads (or processes) while the
+        caller works on the previous ones.
+        :param cord_uids: The papers we want to visit (by default all of them).
+        :param workers: The amount of threads or processes reading documents.
+        :param prefetch: The maximum amount of documents read ahead of the
+        caller (default: twice the amount of workers).
+        :param unordered: Bool indicating if the documents are returned as soon
+        as they are read, instead of in the order of the papers. In this case
+        the iterator returns tuples with the 'cord_uid' and the text.
+        :param processes: Bool indicating if we use processes instead of threads
+        (each process opens its own Papers).
+        :param skip_duplicates: Bool indicating if the near-duplicates of other
+        papers are skipped (only the canonical paper of each group is visited).
         :return: An iterator of strings.
         """
-        for cord_uid in self.papers_index:
-            yield self.paper_full_text(cord_uid)
+        cord_uids = self._papers_to_visit(cord_uids, skip_duplicates)
+        return self._all_papers_map('paper_full_text', cord_uids, workers, prefetch, unordered, processes)
 
-    def all_papers_embedding(self):
+    def _all_papers_map(self, method_name, cord_uids, workers, prefetch, unordered, processes):
+        """
+        Apply one of the methods of the class to all the papers, using a pool of
+        threads or processes.
+        :param method_name: The name of the method that receives a 'cord_uid'.
+        :param cord_uids: The papers we want to visit (if None, all of them).
+        :param workers: The amount of threads or processes.
+        :param prefetch: The maximum amount of papers processed ahead.
+        :param unordered: Bool indicating if the results are returned as soon as
+        they are ready (together with their 'cord_uid').
+        :param processes: Bool indicating if we use processes instead of threads.
+        :return: An iterator with the results of the method.
+        """
+        if cord_uids is None:
+            cord_uids = self.papers_index
+        if processes and (workers > 1 or prefetch):
+            # The processes use their own instance of the class (without a
+            # pool, the papers are read in this process with this instance).
+            paper_function = partial(_call_worker_method, method_name, unordered)
+            initializer, initargs = _init_worker_papers, (type(self),)
+        else:
+            paper_function = partial(_call_paper_method, self, method_name, unordered)
+            initializer, initargs = None, ()
+        return prefetch_map(
+            paper_function, cord_uids, workers=workers, prefetch=prefetch,
+            unordered=unordered, processes=processes, initializer=initializer,
+            initargs=initargs
+        )
+
+    def all_papers_embedding(self, cord_uids=None, skip_duplicates=False):
         """
         Create an iterator for the embeddings of all the papers available in the
         CORD-19 dataset.
-        :return: An iterator of embeddings (each one an array of floats).
+        :param cord_uids: The papers we want to visit (by default all of them).
+        :param skip_duplicates: Bool indicating if the near-duplicates of other
+        papers are skipped (only the canonical paper of each group is visited).
+        :return: An iterator of embeddings (each one a float32 NumPy array).
         """
-        for cord_uid in self.papers_index:
+        for cord_uid in self._papers_to_visit(cord_uids, skip_duplicates):
             yield self.paper_embedding(cord_uid)
 
 
-def _number_to_3digits(number):
+@profiler.profile('papers_index')
+def _write_papers_index(metadata_path, papers_index_path):
+    """
+    Create an index of the papers available in the CORD-19 metadata file, and
+    save it in the binary format of the RecordsIndex.
+
+    The papers are written to the index as soon as we find their last row in
+    the metadata, so only the papers with repeated rows are kept in memory while
+    we read the file.
+    :param metadata_path: The path of the CORD-19 metadata.csv file.
+    :param papers_index_path: The path of the folder where the index will be
+    saved.
+    :return: The time (in seconds) it took to create the index.
     """
-    Transform a number smaller than 1000 (0-999) to a string representation with
-    three characters (000, 001, ..., 021, ..., 089, ..., 123, ..., 999).
+    stopwatch = TimeKeeper()
+    # Write the papers' index one paper at a time, in a temporary folder that
+    # replaces the index once it is complete.
+    temp_index_path = papers_index_path + '.building'
+    if isdir(temp_index_path):
+        rmtree(temp_index_path)
+    with RecordsWriter(temp_index_path) as records_writer:
+        for paper_dict in _metadata_papers(metadata_path):
+            records_writer.add(paper_dict)
+    replace_folder(temp_index_path, papers_index_path)
+    return stopwatch.total_runtime()
+
+
+def _metadata_papers(metadata_path):
     """
-    # Make sure the value we transform is under 1000 and is positive.
-    mod_number = number % 1000
-    
-    if mod_number < 10:
-        return "00" + str(mod_number)
-    elif mod_number < 100:
-        return "0" + str(mod_number)
-    else:
-        return str(mod_number)
+    Create an iterator with the information of interest of the papers in the
+    metadata file. If a 'cord_uid' appears in several rows, its information is
+    updated with each row. The papers are returned in the order of their first
+    row, as soon as all their rows were read.
+
+    The file is read twice, first to count the rows of each 'cord_uid', and then
+    to get the information of the papers, so only the papers with pending rows
+    (and the ones after them) are kept in memory.
+    :param metadata_path: The path of the CORD-19 metadata.csv file.
+    :return: An iterator of dictionaries with the information of the papers.
+    """
+    # Count the rows of each paper.
+    uid_rows = Counter()
+    with open(metadata_path) as file:
+        reader = csv.reader(file)
+        uid_column = next(reader).index('cord_uid')
+        for row in reader:
+            uid_rows[row[uid_column]] += 1
+
+    # Papers that weren't returned yet, in the order of their first row.
+    pending_papers = OrderedDict()
+    # Open the metadata file
+    with open(metadata_path) as file:
+        reader = csv.DictReader(file)
+        # Go through the information of all the papers.
+        for row in reader:
+            # Get the fields of interest.
+            cord_uid = row['cord_uid']
+            title = row['title']
+            abstract = row['abstract']
+            publish_time = row['publish_time']
+            authors = row['authors'].split('; ')
+            pdf_json_files = row['pdf_json_files'].split('; ')
+            pmc_json_files = row['pmc_json_files'].split('; ')
+
+            # Save all the information of the current paper, or update it
+            # if we have found this 'cord_uid' before. Also, check if the
+            # are not empty.
+            current_paper = pending_papers.setdefault(cord_uid, {})
+            current_paper['cord_uid'] = cord_uid
+            current_paper['title'] = title
+            current_paper['abstract'] = abstract
+            current_paper['publish_time'] = publish_time
+            current_paper['authors'] = authors
+            if pdf_json_files != ['']:
+                current_paper['pdf_json_files'] = pdf_json_files
+            if pmc_json_files != ['']:
+                current_paper['pmc_json_files'] = pmc_json_files
+
+            # Return the first papers if all their rows were read.
+            uid_rows[cord_uid] -= 1
+            while pending_papers:
+                first_uid = next(iter(pending_papers))
+                if uid_rows[first_uid]:
+                    break
+                del uid_rows[first_uid]
+                yield pending_papers.popitem(last=False)[1]
+
+
+def _file_line_chunks(file_path, chunk_lines, block_size=16 * 1024 ** 2):
+    """
+    Split a text file in byte ranges of 'chunk_lines' lines (the last range can
+    have fewer lines). The ends of the lines are found reading the file in
+    blocks of bytes, without decoding it.
+    :param file_path: The path of the file.
+    :param chunk_lines: The amount of lines in each range.
+    :param block_size: The amount of bytes read at a time.
+    :return: A list of tuples with the start and end of the ranges.
+    """
+    file_size = getsize(file_path)
+    limits = [0]
+    # The lines of the current range, and the position of the block.
+    range_lines = 0
+    position = 0
+    with open(file_path, 'rb') as file:
+        for block in iter(partial(file.read, block_size), b''):
+            line_ends = np.flatnonzero(np.frombuffer(block, dtype=np.uint8) == ord('\n'))
+            # The ends of the lines that complete a range.
+            for line_end in line_ends[chunk_lines - range_lines - 1::chunk_lines].tolist():
+                limits.append(position + line_end + 1)
+            range_lines = (range_lines + len(line_ends)) % chunk_lines
+            position += len(block)
+    if file_size > limits[-1]:
+        limits.append(file_size)
+    return list(zip(limits[:-1], limits[1:]))
+
+
+def _embeddings_range_chunks(embeddings_path, start, end, chunk_lines):
+    """
+    Parse the lines of the embeddings CSV file between the bytes 'start' and
+    'end' in chunks of at most 'chunk_lines' lines.
+    :param embeddings_path: The path of the embeddings CSV file.
+    :param start: The byte where the range starts (the start of a line).
+    :param end: The byte where the range ends.
+    :param chunk_lines: The maximum amount of lines per chunk.
+    :return: An iterator of tuples with the list of 'cord_uid' and the float32
+    matrix with their embeddings.
+    """
+    with open(embeddings_path, 'rb') as file:
+        file.seek(start)
+        position = start
+        lines_chunk = []
+        while position < end:
+            line = file.readline()
+            if not line:
+                break
+            position += len(line)
+            # Skip the empty lines.
+            if not line.strip():
+                continue
+            lines_chunk.append(line.decode('utf-8'))
+            if len(lines_chunk) >= chunk_lines:
+                yield _parse_embeddings_lines(lines_chunk)
+                lines_chunk = []
+        if lines_chunk:
+            yield _parse_embeddings_lines(lines_chunk)
+
+
+def _write_embeddings_range(embeddings_path, start, end, part_path, chunk_lines):
+    """
+    Parse the lines of the embeddings CSV file between the bytes 'start' and
+    'end', and save all their embeddings (including the repeated ones) in a
+    binary float32 file. The 'cord_uid' of the embeddings are saved in a JSON
+    file next to it once the part is complete.
+    :param embeddings_path: The path of the embeddings CSV file.
+    :param start: The byte where the range starts (the start of a line).
+    :param end: The byte where the range ends.
+    :param part_path: The path of the binary file for the embeddings.
+    :param chunk_lines: The amount of lines parsed at a time.
+    :return: A tuple with the list of 'cord_uid' of the embeddings saved and the
+    size of the embeddings.
+    """
+    part_uids = []
+    embedding_size = 0
+    with open(part_path + '.tmp', 'wb') as part_file:
+        embeds_chunks = _embeddings_range_chunks(embeddings_path, start, end, chunk_lines)
+        for chunk_uids, chunk_embeds in embeds_chunks:
+            part_uids += chunk_uids
+            embedding_size = chunk_embeds.shape[1]
+            chunk_embeds.tofile(part_file)
+        # The part has to be on disk before it is marked as complete.
+        part_file.flush()
+        fsync(part_file.fileno())
+    # Mark the part as complete, saving the 'cord_uid' of its embeddings.
+    os_replace(part_path + '.tmp', part_path)
+    write_json_atomic(part_path + '.json', {'uids': part_uids, 'embedding_size': embedding_size})
+    return part_uids, embedding_size
+
+
+def _embeddings_part_done(part_path):
+    """
+    Check if a part of the embeddings was completed (the JSON file with the
+    'cord_uid' of its embeddings is saved after the part) and the part has all
+    its embeddings. The files of the parts that are not valid are deleted.
+    """
+    part_info = load_json(part_path + '.json')
+    if part_info is not None and isfile(part_path):
+        part_bytes = len(part_info['uids']) * part_info['embedding_size'] * np.dtype(np.float32).itemsize
+        if getsize(part_path) == part_bytes:
+            return True
+    for file_path in (part_path, part_path + '.json'):
+        if isfile(file_path):
+            remove(file_path)
+    return False
+
+
+@profiler.profile('csv_parse')
+def _parse_embeddings_lines(lines):
+    """
+    Parse the lines of the CORD-19 embeddings CSV file, where each line has the
+    'cord_uid' of a paper followed by the values of its embedding.
+    :param lines: The list of lines of the CSV file.
+    :return: A tuple with the list of 'cord_uid' and the float32 matrix with
+    their embeddings.
+    """
+    chunk_uids = []
+    chunk_values = []
+    for line in lines:
+        cord_uid, _, values = line.strip().partition(',')
+        chunk_uids.append(cord_uid)
+        chunk_values.append(values)
+    # Parse all the values of the chunk in a single call.
+    chunk_embeds = np.fromstring(','.join(chunk_values), dtype=np.float32, sep=',')
+    chunk_embeds = chunk_embeds.reshape(len(chunk_uids), -1)
+    return chunk_uids, chunk_embeds
+
+
+def _paper_json_files(paper_dict):
+    """
+    Get the paths of the JSON files with the full text of a paper, the PMC
+    files first and then the PDF files.
+    :param paper_dict: The dictionary with the info of the paper.
+    :return: A list with the paths of the JSON files.
+    """
+    doc_json_files = []
+    if 'pmc_json_files' in paper_dict:
+        doc_json_files += paper_dict['pmc_json_files']
+    if 'pdf_json_files' in paper_dict:
+        doc_json_files += paper_dict['pdf_json_files']
+    return doc_json_files
+
+
+@profiler.profile('json_parse')
+def _read_paper_paragraphs(dataset_folder, doc_json_files):
+    """
+    Extract the paragraphs of the body text of a paper from the first of its
+    JSON files that has any text.
+    :param dataset_folder: The folder of the CORD-19 dataset.
+    :param doc_json_files: The paths of the JSON files of the paper.
+    :return: A list of tuples with the section and text of the paragraphs.
+    """
+    # Access the files and extract the text.
+    for doc_json_file in doc_json_files:
+        doc_json_path = join(dataset_folder, doc_json_file)
+        with open(doc_json_path, 'r') as f_json:
+            # Get the dictionary containing all the info of the document.
+            full_text_dict = json.load(f_json)
+        # Get all the paragraphs in the body of the document.
+        paragraphs = [
+            (paragraph_dict['section'], paragraph_dict['text'])
+            for paragraph_dict in full_text_dict['body_text']
+        ]
+        # If we find text in one of the documents, stop, to avoid repeating
+        # content.
+        if paragraphs:
+            return paragraphs
+    # The paper has no text.
+    return []
+
+
+def _read_paper_references(dataset_folder, doc_json_files):
+    """
+    Extract the references of a paper from the 'bib_entries' of the first of
+    its JSON files that has any.
+    :param dataset_folder: The folder of the CORD-19 dataset.
+    :param doc_json_files: The paths of the JSON files of the paper.
+    :return: A list of tuples with the title and the DOI of the references
+    (an empty string if the reference has no DOI).
+    """
+    for doc_json_file in doc_json_files:
+        with open(join(dataset_folder, doc_json_file), 'r') as f_json:
+            bib_entries = json.load(f_json).get('bib_entries', {})
+        references = []
+        for bib_entry in bib_entries.values():
+            ref_dois = bib_entry.get('other_ids', {}).get('DOI') or ['']
+            references.append((bib_entry.get('title', ''), ref_dois[0]))
+        if references:
+            return references
+    # The paper has no references.
+    return []
+
+
+def _metadata_dois(metadata_path, uid_rows):
+    """
+    Normalise the DOIs of the papers in the metadata file and map them to the
+    rows of the papers in the papers' index (the last metadata row of a paper
+    with a DOI wins).
+    :param metadata_path: The path of the CORD-19 metadata.csv file.
+    :param uid_rows: The dictionary with the row of each 'cord_uid' in the
+    papers' index.
+    :return: A dictionary with the normalised DOI of each paper row that has
+    one.
+    """
+    dois = {}
+    with open(metadata_path) as file:
+        for row in csv.DictReader(file):
+            paper_row = uid_rows.get(row['cord_uid'])
+            doi = normalize_doi(row.get('doi'))
+            if paper_row is not None and doi:
+                dois[paper_row] = doi
+    return dois
+
+
+def _compressed_paper_paragraphs(dataset_folder, doc_json_files):
+    """
+    Extract the paragraphs of a paper from its JSON files and compress them to
+    save them in the text store.
+    """
+    return compress_paragraphs(_read_paper_paragraphs(dataset_folder, doc_json_files))
+
+
+def _is_embeddings_index(embeds_index_path):
+    """
+    Check the embeddings' index exists and was created with the rows of the
+    binary matrix (the old indexes were JSON dictionaries with the embeddings),
+    reading only the start of the file.
+    """
+    if not isfile(embeds_index_path):
+        return False
+    with open(embeds_index_path, 'r') as file:
+        return file.read(len('{"embedding_size"')) == '{"embedding_size"'
+
+
+def _call_paper_method(papers, method_name, with_uid, cord_uid):
+    """
+    Call one of the methods of 'papers' with the 'cord_uid' of a paper.
+    :return: The result of the method, or a tuple with the 'cord_uid' and the
+    result if 'with_uid' is True.
+    """
+    result = getattr(papers, method_name)(cord_uid)
+    if with_uid:
+        return cord_uid, result
+    return result
+
+
+# The instance of Papers used by each process of a pool.
+_worker_papers = None
+
+
+def _init_worker_papers(papers_class):
+    """
+    Open the papers of the CORD-19 dataset in a process of a pool.
+    :param papers_class: The class used to open the papers (Papers or one of
+    its subclasses).
+    """
+    global _worker_papers
+    _worker_papers = papers_class.open(cache_bytes=0)
+
+
+def _call_worker_method(method_name, with_uid, cord_uid):
+    """
+    Call one of the methods of the papers opened by the process.
+    """
+    return _call_paper_method(_worker_papers, method_name, with_uid, cord_uid)
+
+
+def _file_hash(file_path, block_size=1024 ** 2):
+    """
+    Calculate the SHA-1 hash of the content of a file, reading it in blocks.
+    :param file_path: The path of the file.
+    :param block_size: The amount of bytes read at a time.
+    :return: A string with the hexadecimal hash.
+    """
+    file_hash = hashlib.sha1()
+    with open(file_path, 'rb') as file:
+        for block in iter(lambda: file.read(block_size), b''):
+            file_hash.update(block)
+    return file_hash.hexdigest()
 
 
 # Testing the Papers class
 if __name__ == '__main__':
+    # To test the class
+    from random import randint
+
     # Record the Runtime of the Program
     stopwatch = TimeKeeper()
+    # Record where the program spends its time.
+    profiler.enable()
 
     # Load the CORD-19 Dataset
     print("Loading the CORD-19 Dataset...")
     cord19_papers = Papers()
     print("Done.")
     print(f"[{stopwatch.formatted_runtime()}]")
+    # Report the time it took to build the indexes (if they were built).
+    for index_name, build_time in cord19_papers.build_times.items():
+        print(f"Built the {index_name} in {build_time:.2f} seconds.")
 
     # Get the amount of documents the dataset has.
     num_papers = len(cord19_papers.papers_index)
@@ -390,5 +1941,10 @@ if __name__ == '__main__':
     with open(filename, 'w') as f:
         print(result, file=f)
 
+    # Save the time spent in each phase.
+    profiler.export_json('profile.json')
+    profiler.export_chrome_trace('profile_trace.json')
+    print("The profile was saved in 'profile.json' and 'profile_trace.json'.")
+
     print("\nDone.")
     print(f"[{stopwatch.formatted_runtime()}]")
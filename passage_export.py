@@ -0,0 +1,353 @@
+# Gelin Eguinosa Rosique
+
+import re
+import json
+import mmap
+from os import mkdir
+from os.path import join, isdir, isfile, getsize
+import numpy as np
+from bm25_index import word_spans
+
+
+class RegexTokenizer:
+    """
+    Tokenizer that splits the text with a regular expression (by default, the
+    lowercase words used by the keyword index) and gives each new token the next
+    free id. Any object with the methods 'encode(text)' (returning a list of
+    ids) and 'save(folder)' can be used instead, and if it also has the method
+    'encode_spans(text)' the long paragraphs are split on its tokens.
+    """
+    # The file with the vocabulary of the tokenizer.
+    vocab_file = 'vocab.json'
+
+    def __init__(self, pattern=None, vocab=None):
+        """
+        Create the tokenizer.
+        :param pattern: The regular expression of the tokens (if None, the
+        words of the keyword index).
+        :param vocab: The dictionary with the id of each token (ids from 1, the
+        id 0 is reserved for padding).
+        """
+        self.pattern = pattern
+        self.regex = re.compile(pattern) if pattern else None
+        self.vocab = dict(vocab) if vocab else {}
+
+    @classmethod
+    def load(cls, folder):
+        """
+        Load the tokenizer saved with 'save()'.
+        :param folder: The folder of the exported passages.
+        :return: The RegexTokenizer.
+        """
+        with open(join(folder, cls.vocab_file), 'r') as file:
+            tokenizer_data = json.load(file)
+        return cls(tokenizer_data['pattern'], tokenizer_data['vocab'])
+
+    def encode(self, text):
+        """
+        Transform a text to the ids of its tokens.
+        :param text: The string with the text.
+        :return: The list of ids.
+        """
+        return self.encode_spans(text)[0]
+
+    def encode_spans(self, text):
+        """
+        Transform a text to the ids of its tokens, and find the characters of
+        each token in the text.
+        :param text: The string with the text.
+        :return: The list of ids, and the list of (start, end) positions of the
+        tokens in the text.
+        """
+        if self.regex:
+            tokens = [(match.group(), match.start(), match.end()) for match in self.regex.finditer(text)]
+        else:
+            tokens = word_spans(text)
+        token_ids = []
+        spans = []
+        for token, start, end in tokens:
+            token_id = self.vocab.get(token)
+            if token_id is None:
+                token_id = self.vocab[token] = len(self.vocab) + 1
+            token_ids.append(token_id)
+            spans.append((start, end))
+        return token_ids, spans
+
+    def save(self, folder):
+        """
+        Save the vocabulary of the tokenizer in the 'folder'.
+        """
+        with open(join(folder, self.vocab_file), 'w') as file:
+            json.dump({'pattern': self.pattern, 'vocab': self.vocab}, file)
+
+
+class PassageStore:
+    """
+    Read the passages exported with 'export_passages()'. The token ids of the
+    passages are stored in shards of uint32 values, which are memory-mapped, so
+    the passages are read without any text processing. The index has the
+    position of each passage in its shard, its paper and its section.
+    """
+    # The files of the store.
+    meta_file = 'meta.json'
+    index_file = 'passages.npz'
+
+    def __init__(self, folder):
+        """
+        Load the index of the passages (the shards are opened when they are
+        used).
+        :param folder: The folder with the exported passages.
+        """
+        self.folder = folder
+        with open(join(folder, self.meta_file), 'r') as file:
+            self.meta = json.load(file)
+        with np.load(join(folder, self.index_file)) as index_data:
+            self.shards = index_data['shards']
+            self.starts = index_data['starts']
+            self.lengths = index_data['lengths']
+            self.papers = index_data['papers']
+            self.sections = index_data['sections']
+            self.text_starts = index_data['text_starts']
+            self.text_ends = index_data['text_ends']
+        self.cord_uids = self.meta['cord_uids']
+        self.section_names = self.meta['sections']
+        self.token_shards = {}
+        self.text_shards = {}
+
+    def __len__(self):
+        return len(self.starts)
+
+    @classmethod
+    def exists(cls, folder):
+        """
+        Check if the passages were exported to the 'folder'.
+        """
+        return isfile(join(folder, cls.meta_file)) and isfile(join(folder, cls.index_file))
+
+    def passage_tokens(self, passage):
+        """
+        Get the token ids of a passage (without copying them).
+        :param passage: The position of the passage.
+        :return: A uint32 NumPy array.
+        """
+        shard = int(self.shards[passage])
+        start = int(self.starts[passage])
+        return self._token_shard(shard)[start:start + int(self.lengths[passage])]
+
+    def passage_text(self, passage):
+        """
+        Get the text of a passage (if the text was exported).
+        :param passage: The position of the passage.
+        :return: The string with the text.
+        """
+        shard = int(self.shards[passage])
+        start, end = int(self.text_starts[passage]), int(self.text_ends[passage])
+        return self._text_shard(shard)[start:end].decode('utf-8')
+
+    def passage_info(self, passage):
+        """
+        Get the paper and the section of a passage.
+        :param passage: The position of the passage.
+        :return: A tuple with the 'cord_uid' of the paper and the name of the
+        section.
+        """
+        cord_uid = self.cord_uids[int(self.papers[passage])]
+        section = self.section_names[int(self.sections[passage])]
+        return cord_uid, section
+
+    def iter_tokens(self, shuffle=False, seed=None):
+        """
+        Create an iterator with the token ids of all the passages.
+        :param shuffle: Bool indicating if the passages are visited in a random
+        order (by default they are visited in the order of the shards, reading
+        them sequentially).
+        :param seed: The seed of the random generator used to shuffle them.
+        :return: An iterator of uint32 NumPy arrays.
+        """
+        passages = np.arange(len(self))
+        if shuffle:
+            passages = np.random.default_rng(seed).permutation(len(self))
+        for passage in passages.tolist():
+            yield self.passage_tokens(passage)
+
+    def _token_shard(self, shard):
+        """
+        Memory-map the file with the tokens of a shard.
+        """
+        if shard not in self.token_shards:
+            tokens_path = join(self.folder, _shard_file(shard, 'tokens'))
+            if getsize(tokens_path):
+                self.token_shards[shard] = np.memmap(tokens_path, dtype=np.uint32, mode='r')
+            else:
+                self.token_shards[shard] = np.zeros(0, dtype=np.uint32)
+        return self.token_shards[shard]
+
+    def _text_shard(self, shard):
+        """
+        Memory-map the file with the text of a shard.
+        """
+        if shard not in self.text_shards:
+            text_path = join(self.folder, _shard_file(shard, 'text'))
+            self.text_shards[shard] = b''
+            if isfile(text_path) and getsize(text_path):
+                with open(text_path, 'rb') as file:
+                    self.text_shards[shard] = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        return self.text_shards[shard]
+
+
+def export_passages(folder, papers_paragraphs, tokenizer=None, max_tokens=256,
+                    shard_tokens=2 ** 26, with_text=True, meta=None):
+    """
+    Split the papers in passages and save their token ids in shards of
+    memory-mappable files, in a single pass over the corpus. The consecutive
+    paragraphs of the same section are joined in a passage while they fit in
+    'max_tokens', and the longer paragraphs are split in similar parts (by
+    words).
+    :param folder: The folder where the passages will be saved.
+    :param papers_paragraphs: An iterable of tuples with the 'cord_uid' of a
+    paper and its list of (section, text) paragraphs.
+    :param tokenizer: The tokenizer with the methods 'encode(text)' and
+    'save(folder)' (by default, a RegexTokenizer).
+    :param max_tokens: The maximum amount of tokens in a passage.
+    :param shard_tokens: The amount of tokens in each shard.
+    :param with_text: Bool indicating if the text of the passages is also
+    saved.
+    :param meta: Dictionary with extra information saved with the passages.
+    :return: The amount of passages exported.
+    """
+    if tokenizer is None:
+        tokenizer = RegexTokenizer()
+    if not isdir(folder):
+        mkdir(folder)
+    index_columns = {
+        'shards': [], 'starts': [], 'lengths': [], 'papers': [], 'sections': [],
+        'text_starts': [], 'text_ends': [],
+    }
+    cord_uids = []
+    section_ids = {}
+    shard = 0
+    shard_position = 0
+    text_position = 0
+    tokens_file = open(join(folder, _shard_file(shard, 'tokens')), 'wb')
+    text_file = open(join(folder, _shard_file(shard, 'text')), 'wb') if with_text else None
+    try:
+        for cord_uid, paragraphs in papers_paragraphs:
+            paper_id = len(cord_uids)
+            cord_uids.append(cord_uid)
+            for section, text, token_ids in _paper_passages(paragraphs, tokenizer, max_tokens):
+                # Start a new shard when the current one is full.
+                if shard_position and shard_position + len(token_ids) > shard_tokens:
+                    tokens_file.close()
+                    if text_file:
+                        text_file.close()
+                    shard += 1
+                    shard_position = 0
+                    text_position = 0
+                    tokens_file = open(join(folder, _shard_file(shard, 'tokens')), 'wb')
+                    if with_text:
+                        text_file = open(join(folder, _shard_file(shard, 'text')), 'wb')
+                np.asarray(token_ids, dtype=np.uint32).tofile(tokens_file)
+                index_columns['shards'].append(shard)
+                index_columns['starts'].append(shard_position)
+                index_columns['lengths'].append(len(token_ids))
+                index_columns['papers'].append(paper_id)
+                index_columns['sections'].append(section_ids.setdefault(section, len(section_ids)))
+                shard_position += len(token_ids)
+                # Save the text of the passage.
+                index_columns['text_starts'].append(text_position)
+                if text_file:
+                    encoded_text = text.encode('utf-8')
+                    text_file.write(encoded_text)
+                    text_position += len(encoded_text)
+                index_columns['text_ends'].append(text_position)
+    finally:
+        tokens_file.close()
+        if text_file:
+            text_file.close()
+
+    # Save the index and the information of the passages.
+    column_types = {
+        'shards': np.int32, 'starts': np.int64, 'lengths': np.int32, 'papers': np.int32,
+        'sections': np.int32, 'text_starts': np.int64, 'text_ends': np.int64,
+    }
+    with open(join(folder, PassageStore.index_file), 'wb') as file:
+        np.savez(file, **{
+            column: np.array(values, dtype=column_types[column])
+            for column, values in index_columns.items()
+        })
+    store_meta = dict(meta or {})
+    store_meta.update({
+        'cord_uids': cord_uids,
+        'sections': sorted(section_ids, key=section_ids.get),
+        'shards': shard + 1,
+        'max_tokens': max_tokens,
+        'with_text': with_text,
+        'tokenizer': type(tokenizer).__name__,
+    })
+    with open(join(folder, PassageStore.meta_file), 'w') as file:
+        json.dump(store_meta, file)
+    tokenizer.save(folder)
+    return len(index_columns['starts'])
+
+
+def _paper_passages(paragraphs, tokenizer, max_tokens):
+    """
+    Split the paragraphs of a paper in passages.
+    :param paragraphs: The list of (section, text) paragraphs.
+    :param tokenizer: The tokenizer with the method 'encode(text)'.
+    :param max_tokens: The maximum amount of tokens in a passage.
+    :return: An iterator of tuples with the section, text and token ids of the
+    passages.
+    """
+    passage_section = None
+    passage_texts = []
+    passage_ids = []
+    for section, text in paragraphs:
+        for part_text, part_ids in _paragraph_parts(text, tokenizer, max_tokens):
+            if not part_ids:
+                continue
+            # Close the passage if the section changes or the part doesn't fit.
+            if passage_ids and (section != passage_section or len(passage_ids) + len(part_ids) > max_tokens):
+                yield passage_section, '\n'.join(passage_texts), passage_ids
+                passage_texts = []
+                passage_ids = []
+            passage_section = section
+            passage_texts.append(part_text)
+            passage_ids.extend(part_ids)
+    if passage_ids:
+        yield passage_section, '\n'.join(passage_texts), passage_ids
+
+
+def _paragraph_parts(text, tokenizer, max_tokens):
+    """
+    Tokenize a paragraph, cutting its tokens in windows of 'max_tokens' if it
+    is longer. The text of each part goes from its first to its last token
+    (with the tokenizers without 'encode_spans()', the words of the text are
+    split in as many parts as windows instead).
+    :return: A list of tuples with the text and the token ids of the parts.
+    """
+    if hasattr(tokenizer, 'encode_spans'):
+        token_ids, spans = tokenizer.encode_spans(text)
+    else:
+        token_ids, spans = tokenizer.encode(text), None
+    if len(token_ids) <= max_tokens:
+        return [(text, token_ids)]
+    starts = range(0, len(token_ids), max_tokens)
+    if spans is None:
+        # Split the words in one part per window (empty if there are fewer
+        # words than windows).
+        words = text.split()
+        limits = [len(words) * window // len(starts) for window in range(len(starts) + 1)]
+        part_texts = [' '.join(words[start:end]) for start, end in zip(limits[:-1], limits[1:])]
+    else:
+        part_texts = [
+            text[spans[start][0]:spans[min(start + max_tokens, len(spans)) - 1][1]] for start in starts
+        ]
+    return [(part_text, token_ids[start:start + max_tokens]) for part_text, start in zip(part_texts, starts)]
+
+
+def _shard_file(shard, extension):
+    """
+    Create the name of the file of a shard.
+    """
+    return f"shard_{shard:05d}.{extension}"
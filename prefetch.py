@@ -0,0 +1,66 @@
+# Gelin Eguinosa Rosique
+
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, wait, FIRST_COMPLETED
+
+
+def prefetch_map(function, items, workers=1, prefetch=None, unordered=False,
+                 processes=False, initializer=None, initargs=()):
+    """
+    Apply the 'function' to the 'items' in a pool of threads or processes,
+    returning the results while the pool keeps working on the next items. At
+    most 'prefetch' items are processed ahead of the consumer, so the memory
+    used by the pending results stays bounded.
+    :param function: The function applied to each item (it must be picklable
+    when using processes).
+    :param items: The iterable with the items.
+    :param workers: The amount of threads or processes in the pool. If it is 1
+    and there is no 'prefetch', the items are processed in this thread.
+    :param prefetch: The maximum amount of items processed ahead of the
+    consumer (default: twice the amount of workers).
+    :param unordered: Bool indicating if the results are returned as soon as
+    they are ready, instead of in the order of the items.
+    :param processes: Bool indicating if we use a pool of processes instead of a
+    pool of threads.
+    :param initializer: Function called at the start of each worker of the
+    pool (it isn't called when the items are processed in this thread).
+    :param initargs: The arguments of the 'initializer'.
+    :return: An iterator with the results of the function.
+    """
+    # Process the items in this thread if we don't need a pool.
+    if workers <= 1 and not prefetch:
+        yield from map(function, items)
+        return
+
+    if not prefetch:
+        prefetch = 2 * workers
+    pool_class = ProcessPoolExecutor if processes else ThreadPoolExecutor
+    executor = pool_class(max_workers=workers, initializer=initializer, initargs=initargs)
+    try:
+        items = iter(items)
+        if unordered:
+            # Return the results as soon as they are completed.
+            pending = set()
+            for item in items:
+                pending.add(executor.submit(function, item))
+                if len(pending) < prefetch:
+                    continue
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield future.result()
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield future.result()
+        else:
+            # Return the results in the order of the items.
+            pending = deque()
+            for item in items:
+                pending.append(executor.submit(function, item))
+                if len(pending) >= prefetch:
+                    yield pending.popleft().result()
+            while pending:
+                yield pending.popleft().result()
+    finally:
+        # Cancel the pending items if the consumer stops before the end.
+        executor.shutdown(wait=True, cancel_futures=True)
@@ -0,0 +1,254 @@
+# Gelin Eguinosa Rosique
+
+import mmap
+from os import mkdir, remove, replace
+from os.path import join, isdir, isfile, getsize
+from collections.abc import Mapping
+import numpy as np
+
+
+class RecordsIndex(Mapping):
+    """
+    Read-only dictionary with the information of the papers, stored in a binary
+    column-oriented format. Each field has a file with the text of all the
+    papers (the heap) and a file with the offsets where the text of each paper
+    starts. The files are memory-mapped, and the information of a paper is only
+    decoded when it is accessed.
+
+    The index can be updated appending new rows. The rows of the papers that
+    were replaced or removed are marked as dead in the alive mask.
+    """
+    # The fields of the papers, and the ones that contain a list of values.
+    fields = ['cord_uid', 'title', 'abstract', 'publish_time', 'authors',
+              'pdf_json_files', 'pmc_json_files']
+    list_fields = ['authors', 'pdf_json_files', 'pmc_json_files']
+    # Fields that are omitted from the papers when they are empty.
+    optional_fields = ['pdf_json_files', 'pmc_json_files']
+    # The separator of the values in the list fields.
+    list_separator = '; '
+    # The file with the rows of the index that are still in use (if it doesn't
+    # exist, all the rows are alive).
+    alive_file = 'alive.mask'
+
+    def __init__(self, index_folder):
+        """
+        Memory-map the files of the index and create the dictionary with the
+        row of each paper.
+        :param index_folder: The folder with the files of the index.
+        """
+        self.index_folder = index_folder
+        self.readers = {field: FieldReader(index_folder, field) for field in self.fields}
+        # Get the amount of rows, and the ones that are still in use.
+        self.total_rows = len(self.readers['cord_uid'])
+        self.alive = self.load_alive(index_folder, self.total_rows)
+        # Create the index with the row of each 'cord_uid'.
+        uids_offsets = self.readers['cord_uid'].offsets.tolist()
+        uids_heap = self.readers['cord_uid'].heap
+        self.uid_rows = {
+            uids_heap[uids_offsets[row]:uids_offsets[row + 1]].decode('utf-8'): row
+            for row in np.flatnonzero(self.alive).tolist()
+        }
+
+    @classmethod
+    def exists(cls, index_folder):
+        """
+        Check if all the files of the index are in the 'index_folder'.
+        """
+        for field in cls.fields:
+            offsets_path, heap_path = _field_paths(index_folder, field)
+            if not isfile(offsets_path) or not isfile(heap_path):
+                return False
+        return True
+
+    @classmethod
+    def load_alive(cls, index_folder, total_rows):
+        """
+        Load the mask with the rows of the index that are still in use. The rows
+        added after the mask was saved are alive.
+        :param index_folder: The folder with the files of the index.
+        :param total_rows: The amount of rows in the index.
+        :return: A boolean NumPy array.
+        """
+        alive = np.ones(total_rows, dtype=bool)
+        alive_path = join(index_folder, cls.alive_file)
+        if isfile(alive_path):
+            saved_alive = np.fromfile(alive_path, dtype=np.uint8).astype(bool)
+            alive[:len(saved_alive)] = saved_alive[:total_rows]
+        return alive
+
+    @classmethod
+    def save_alive(cls, index_folder, alive):
+        """
+        Save the mask with the rows of the index that are still in use.
+        :param index_folder: The folder with the files of the index.
+        :param alive: The boolean NumPy array with the rows in use.
+        """
+        alive_path = join(index_folder, cls.alive_file)
+        # Replace the old mask with a single rename.
+        np.asarray(alive, dtype=np.uint8).tofile(alive_path + '.tmp')
+        replace(alive_path + '.tmp', alive_path)
+
+    def __getitem__(self, cord_uid):
+        """
+        Decode the information of the paper 'cord_uid'.
+        :param cord_uid: The Unique Identifier of the CORD-19 paper.
+        :return: A dictionary with the fields of the paper.
+        """
+        return self.record(self.uid_rows[cord_uid])
+
+    def __iter__(self):
+        return iter(self.uid_rows)
+
+    def __len__(self):
+        return len(self.uid_rows)
+
+    def __contains__(self, cord_uid):
+        return cord_uid in self.uid_rows
+
+    def record(self, row):
+        """
+        Decode the information of the paper stored in the given 'row'.
+        :param row: The row of the paper in the index.
+        :return: A dictionary with the fields of the paper.
+        """
+        paper_dict = {}
+        for field in self.fields:
+            value = self.field_value(field, row)
+            if field in self.list_fields:
+                if not value and field in self.optional_fields:
+                    continue
+                value = value.split(self.list_separator)
+            paper_dict[field] = value
+        return paper_dict
+
+    def field_value(self, field, row):
+        """
+        Decode the text of one of the fields of a paper, without decoding the
+        rest of its information.
+        :param field: The name of the field.
+        :param row: The row of the paper in the index.
+        :return: A string with the value of the field (the values of the list
+        fields are joined by the list separator).
+        """
+        return self.readers[field].value(row)
+
+
+class FieldReader:
+    """
+    Read the values of one of the fields of a RecordsIndex, memory-mapping its
+    offsets and heap files. It is used to read a few fields of the papers
+    without opening the whole index.
+    """
+
+    def __init__(self, index_folder, field):
+        """
+        Memory-map the files of the field.
+        :param index_folder: The folder with the files of the index.
+        :param field: The name of the field.
+        """
+        offsets_path, heap_path = _field_paths(index_folder, field)
+        self.offsets = np.memmap(offsets_path, dtype=np.uint64, mode='r')
+        self.heap = _map_file(heap_path)
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def value(self, row):
+        """
+        Decode the text of the field of the paper in the given row.
+        :param row: The row of the paper in the index.
+        :return: A string with the value of the field.
+        """
+        start, end = int(self.offsets[row]), int(self.offsets[row + 1])
+        return self.heap[start:end].decode('utf-8')
+
+
+class RecordsWriter:
+    """
+    Write the information of the papers to the files of a RecordsIndex, one
+    paper at a time.
+    """
+
+    def __init__(self, index_folder, append=False):
+        """
+        Create the folder of the index and open the files of the fields.
+        :param index_folder: The folder where the index will be saved.
+        :param append: Bool indicating if we add the papers at the end of an
+        existing index, instead of creating a new one.
+        """
+        if not isdir(index_folder):
+            mkdir(index_folder)
+        # A new index starts with all its rows alive.
+        alive_path = join(index_folder, RecordsIndex.alive_file)
+        if not append and isfile(alive_path):
+            remove(alive_path)
+        self.offsets_files = {}
+        self.heap_files = {}
+        self.positions = {}
+        for field in RecordsIndex.fields:
+            offsets_path, heap_path = _field_paths(index_folder, field)
+            if append:
+                # Continue writing at the end of the heap.
+                self.offsets_files[field] = open(offsets_path, 'ab')
+                self.heap_files[field] = open(heap_path, 'ab')
+                self.positions[field] = getsize(heap_path)
+            else:
+                self.offsets_files[field] = open(offsets_path, 'wb')
+                self.heap_files[field] = open(heap_path, 'wb')
+                # The offsets start with the position 0.
+                self.positions[field] = 0
+                self._write_offset(field)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def add(self, paper_dict):
+        """
+        Append the information of a paper to the index.
+        :param paper_dict: The dictionary with the fields of the paper.
+        """
+        for field in RecordsIndex.fields:
+            value = paper_dict.get(field, '')
+            if field in RecordsIndex.list_fields and not isinstance(value, str):
+                value = RecordsIndex.list_separator.join(value)
+            encoded_value = value.encode('utf-8')
+            self.heap_files[field].write(encoded_value)
+            self.positions[field] += len(encoded_value)
+            self._write_offset(field)
+
+    def close(self):
+        """
+        Close the files of the index.
+        """
+        for field in RecordsIndex.fields:
+            self.offsets_files[field].close()
+            self.heap_files[field].close()
+
+    def _write_offset(self, field):
+        """
+        Write the current position of the field's heap to its offsets file.
+        """
+        self.offsets_files[field].write(np.uint64(self.positions[field]).tobytes())
+
+
+def _field_paths(index_folder, field):
+    """
+    Create the paths of the offsets and heap files of a field.
+    """
+    offsets_path = join(index_folder, field + '.offsets')
+    heap_path = join(index_folder, field + '.heap')
+    return offsets_path, heap_path
+
+
+def _map_file(file_path):
+    """
+    Memory-map a file in read-only mode (empty files can't be mapped, so we use
+    an empty bytes object for them).
+    """
+    if not getsize(file_path):
+        return b''
+    with open(file_path, 'rb') as file:
+        return mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
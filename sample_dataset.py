@@ -0,0 +1,101 @@
+# Gelin Eguinosa Rosique
+
+import csv
+import json
+import random
+from os import makedirs
+from os.path import join
+from papers import Papers
+
+# Words used to create the random text of the papers.
+_vocabulary = [
+    'virus', 'coronavirus', 'protein', 'cell', 'infection', 'patients', 'clinical',
+    'respiratory', 'disease', 'viral', 'host', 'immune', 'response', 'analysis',
+    'model', 'transmission', 'sequence', 'genome', 'vaccine', 'treatment', 'study',
+    'results', 'samples', 'expression', 'activity', 'binding', 'receptor', 'acute',
+    'syndrome', 'severe', 'outbreak', 'epidemic', 'control', 'data', 'method',
+    'antibody', 'antiviral', 'replication', 'strain', 'human', 'animal', 'bat',
+]
+
+
+class SamplePapers(Papers):
+    """
+    Papers class pointing to a synthetic CORD-19 dataset, the data folders are
+    updated by the test cases and the benchmark.
+    """
+    cord19_data_folder = ''
+    project_data_folder = ''
+
+
+def create_sample_dataset(data_folder, num_papers=30, embedding_size=16, paragraphs=4,
+                          paragraph_words=0, seed=7):
+    """
+    Create a synthetic dataset with the same layout as the CORD-19 dataset (the
+    metadata.csv, the embeddings CSV and the PMC and PDF JSON files). The
+    embedding of the first paper is repeated at the end of the embeddings CSV.
+    :param data_folder: The folder where the dataset will be created.
+    :param num_papers: The amount of papers in the dataset.
+    :param embedding_size: The size of the embeddings of the papers.
+    :param paragraphs: The amount of paragraphs in the body of each paper.
+    :param paragraph_words: The amount of random words in each paragraph (if 0,
+    the title, abstract and paragraphs are short texts with the number of the
+    paper).
+    :param seed: The seed of the random generator.
+    :return: The list with the 'cord_uid' of the papers.
+    """
+    rand_gen = random.Random(seed)
+    dataset_folder = join(data_folder, Papers.current_dataset)
+    makedirs(join(dataset_folder, 'document_parses', 'pmc_json'))
+    makedirs(join(dataset_folder, 'document_parses', 'pdf_json'))
+
+    def random_text(words):
+        return ' '.join(rand_gen.choices(_vocabulary, k=words))
+
+    fields = ['cord_uid', 'title', 'abstract', 'publish_time', 'authors',
+              'pdf_json_files', 'pmc_json_files']
+    cord_uids = [f"uid{i:03d}" for i in range(num_papers)]
+    metadata_path = join(dataset_folder, Papers.metadata_file)
+    embeddings_path = join(dataset_folder, Papers.embeddings_file)
+    with open(metadata_path, 'w', newline='') as metadata_file, \
+            open(embeddings_path, 'w', newline='') as embeds_file:
+        metadata_writer = csv.DictWriter(metadata_file, fieldnames=fields)
+        metadata_writer.writeheader()
+        embeds_writer = csv.writer(embeds_file)
+        for i, cord_uid in enumerate(cord_uids):
+            # Create the full text documents of the paper.
+            if paragraph_words:
+                title, abstract = random_text(12), random_text(150)
+                body_text = [
+                    {'section': f"Section {j // 2}", 'text': random_text(paragraph_words)}
+                    for j in range(paragraphs)
+                ]
+            else:
+                title, abstract = f"Title of paper {i}", f"Abstract of paper {i}"
+                body_text = [
+                    {'section': f"Section {j // 2}", 'text': f"Paragraph {j} of paper {cord_uid}."}
+                    for j in range(paragraphs)
+                ]
+            pmc_file, pdf_file = '', ''
+            if i % 3 != 0:
+                pmc_file = f"document_parses/pmc_json/PMC{i}.xml.json"
+                with open(join(dataset_folder, pmc_file), 'w') as file:
+                    json.dump({'paper_id': f"PMC{i}", 'body_text': body_text}, file)
+            if i % 2 == 0:
+                pdf_file = f"document_parses/pdf_json/sha{i}.json"
+                with open(join(dataset_folder, pdf_file), 'w') as file:
+                    json.dump({'paper_id': f"sha{i}", 'body_text': body_text}, file)
+            metadata_writer.writerow({
+                'cord_uid': cord_uid,
+                'title': title,
+                'abstract': abstract,
+                'publish_time': f"2020-0{1 + i % 9}-1{i % 10}",
+                'authors': f"Author, {i % 5}; Author, {i % 7}",
+                'pdf_json_files': pdf_file,
+                'pmc_json_files': pmc_file,
+            })
+            embedding = [f"{rand_gen.uniform(-1, 1):.6f}" for _ in range(embedding_size)]
+            embeds_writer.writerow([cord_uid] + embedding)
+        # Repeat the embedding of the first paper to check duplicates are
+        # skipped.
+        embeds_writer.writerow([cord_uids[0]] + ['0.0'] * embedding_size)
+    return cord_uids
@@ -0,0 +1,199 @@
+# Gelin Eguinosa Rosique
+
+from os.path import join
+from multiprocessing import shared_memory
+import numpy as np
+from records_index import FieldReader
+from embeddings_quantization import open_embeddings_matrix
+
+# The papers attached by the process of a pool (see 'init_shared_worker').
+shared_worker_papers = None
+
+
+class SharedPapersStore:
+    """
+    Copy the lookup tables of the papers to a block of shared memory, so the
+    processes of a pool can attach to them without building their own
+    dictionaries. The tables contain the sorted 'cord_uid' of the papers with
+    their rows in the papers' index and in the embeddings' matrix. The text of
+    the papers and the embeddings stay in their memory-mapped files (shared by
+    the OS between the processes), or the embeddings can also be copied to the
+    shared memory.
+
+    The store is created by the main process, which has to close it when the
+    workers are done. The workers receive the (picklable) 'handle' of the store
+    and open it with SharedPapers.
+    """
+
+    def __init__(self, papers, copy_embeddings=False):
+        """
+        Create the shared memory block with the lookup tables of the papers.
+        :param papers: The Papers instance with the indexes.
+        :param copy_embeddings: Bool indicating if the embeddings' matrix is
+        also copied to the shared memory (instead of using its memory-mapped
+        file).
+        """
+        papers_index = papers.papers_index
+        embeds_index = papers.embeds_index
+        # Sort the 'cord_uid' of all the papers to find them with a binary
+        # search.
+        cord_uids = sorted(set(papers_index.uid_rows) | set(embeds_index))
+        uids_array = np.array([cord_uid.encode('utf-8') for cord_uid in cord_uids], dtype=bytes)
+        paper_rows = np.fromiter(
+            (papers_index.uid_rows.get(cord_uid, -1) for cord_uid in cord_uids),
+            dtype=np.int64, count=len(cord_uids)
+        )
+        embed_rows = np.fromiter(
+            (embeds_index.get(cord_uid, -1) for cord_uid in cord_uids),
+            dtype=np.int64, count=len(cord_uids)
+        )
+        arrays = {'uids': uids_array, 'paper_rows': paper_rows, 'embed_rows': embed_rows}
+        if copy_embeddings:
+            arrays['embeddings'] = np.asarray(papers.embeds_matrix, dtype=np.float32)
+
+        # Place the arrays one after the other in the block (aligned to 64
+        # bytes).
+        layout = {}
+        block_size = 0
+        for array_name, array in arrays.items():
+            layout[array_name] = (block_size, array.dtype.str, array.shape)
+            block_size += -(-array.nbytes // 64) * 64
+        self.memory = shared_memory.SharedMemory(create=True, size=max(block_size, 1))
+        for array_name, array in arrays.items():
+            offset, dtype, shape = layout[array_name]
+            shared_array = np.ndarray(shape, dtype=dtype, buffer=self.memory.buf, offset=offset)
+            shared_array[...] = array
+            del shared_array
+
+        # The information the workers need to attach to the store.
+        self.handle = {
+            'memory_name': self.memory.name,
+            'layout': layout,
+            'index_folder': papers_index.index_folder,
+            'matrix_path': join(papers.project_data_folder, papers.embeds_matrix_file),
+            'embedding_size': papers.embeds_size,
+        }
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        """
+        Release the shared memory block (the workers must have closed their
+        SharedPapers before).
+        """
+        if self.memory is not None:
+            self.memory.close()
+            self.memory.unlink()
+            self.memory = None
+
+
+class SharedPapers:
+    """
+    Lightweight, read-only access to the papers of a SharedPapersStore, with
+    the same API as the Papers class for the embeddings and the title and
+    abstract of the papers. Nothing is copied when it is opened.
+    """
+
+    def __init__(self, handle):
+        """
+        Attach to the shared memory block of the store and memory-map the files
+        with the text and the embeddings of the papers.
+        :param handle: The 'handle' of the SharedPapersStore.
+        """
+        self.memory = shared_memory.SharedMemory(name=handle['memory_name'])
+        arrays = {
+            array_name: np.ndarray(shape, dtype=dtype, buffer=self.memory.buf, offset=offset)
+            for array_name, (offset, dtype, shape) in handle['layout'].items()
+        }
+        self.uids = arrays['uids']
+        self.paper_rows = arrays['paper_rows']
+        self.embed_rows = arrays['embed_rows']
+        self.embeds_size = handle['embedding_size']
+        if 'embeddings' in arrays:
+            self.embeds_matrix = arrays['embeddings']
+        else:
+            self.embeds_matrix = open_embeddings_matrix(handle['matrix_path'], self.embeds_size)
+        # Memory-map the title and abstract of the papers.
+        self.readers = {
+            field: FieldReader(handle['index_folder'], field) for field in ['title', 'abstract']
+        }
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def __len__(self):
+        return len(self.uids)
+
+    def __contains__(self, cord_uid):
+        return self._uid_position(cord_uid) is not None
+
+    def paper_embedding(self, cord_uid):
+        """
+        Get the SPECTER Document Embedding of the 'cord_uid' paper.
+        :param cord_uid: The Unique Identifier of the CORD-19 paper.
+        :return: The float32 NumPy array with the embedding.
+        """
+        embed_row = self._row(self.embed_rows, cord_uid)
+        return self.embeds_matrix[embed_row]
+
+    def paper_title_abstract(self, cord_uid):
+        """
+        Get the title and abstract of the 'cord_uid' paper as a string.
+        :param cord_uid: The Unique Identifier of the CORD-19 paper.
+        :return: A string containing the title and abstract of the paper.
+        """
+        paper_row = self._row(self.paper_rows, cord_uid)
+        title = self.readers['title'].value(paper_row)
+        abstract = self.readers['abstract'].value(paper_row)
+        return title + '\n\n' + abstract
+
+    def close(self):
+        """
+        Detach from the shared memory block.
+        """
+        if self.memory is not None:
+            # Release the views of the block before closing it.
+            self.uids = self.paper_rows = self.embed_rows = None
+            if not isinstance(self.embeds_matrix, np.memmap):
+                self.embeds_matrix = None
+            self.memory.close()
+            self.memory = None
+
+    def _uid_position(self, cord_uid):
+        """
+        Find the position of the 'cord_uid' in the sorted array of uids.
+        :return: The position, or None if the paper is not in the store.
+        """
+        encoded_uid = cord_uid.encode('utf-8')
+        position = int(np.searchsorted(self.uids, encoded_uid))
+        if position < len(self.uids) and self.uids[position] == encoded_uid:
+            return position
+        return None
+
+    def _row(self, rows, cord_uid):
+        """
+        Get the row of the 'cord_uid' paper in one of the tables of rows.
+        :raise KeyError: If the paper doesn't have a row in the table.
+        """
+        position = self._uid_position(cord_uid)
+        if position is None or rows[position] < 0:
+            raise KeyError(cord_uid)
+        return int(rows[position])
+
+
+def init_shared_worker(handle):
+    """
+    Attach a process of a pool to a SharedPapersStore (used as the initializer
+    of the pool). The papers are available in 'shared_worker_papers'.
+    :param handle: The 'handle' of the SharedPapersStore.
+    """
+    global shared_worker_papers
+    shared_worker_papers = SharedPapers(handle)
+
@@ -0,0 +1,115 @@
+# Gelin Eguinosa Rosique
+
+import asyncio
+import threading
+import time
+import unittest
+from async_papers import AsyncPapers
+from shared_papers import SharedPapers
+from sample_dataset import SamplePapers
+from test_papers import SampleDatasetTestCase
+
+
+class SlowPapers:
+    """
+    Papers with a blocking read that takes a while, counting the reads.
+    """
+
+    def __init__(self, delay=0.05):
+        self.delay = delay
+        self.reads = 0
+        self.lock = threading.Lock()
+        self.papers_index = [f"uid{i}" for i in range(10)]
+
+    def paper_content(self, cord_uid):
+        with self.lock:
+            self.reads += 1
+        time.sleep(self.delay)
+        return f"Content of {cord_uid}"
+
+
+class AsyncPapersTestCase(unittest.TestCase):
+    """
+    Test the asyncio facade of the papers.
+    """
+
+    def test_concurrent_reads(self):
+        """
+        Test the reads of several papers run at the same time, and the requests
+        for the same paper share a single read.
+        """
+        slow_papers = SlowPapers()
+
+        async def read_papers():
+            async with AsyncPapers(slow_papers, workers=10) as papers:
+                start = time.perf_counter()
+                contents = await papers.papers_content([f"uid{i}" for i in range(10)])
+                elapsed = time.perf_counter() - start
+                repeated = await asyncio.gather(*(papers.paper_content('uid0') for _ in range(5)))
+            return contents, elapsed, repeated
+
+        contents, elapsed, repeated = asyncio.run(read_papers())
+        self.assertEqual(contents[3], "Content of uid3")
+        # The ten reads take about as long as one.
+        self.assertLess(elapsed, 0.3)
+        self.assertEqual(repeated, ["Content of uid0"] * 5)
+        self.assertEqual(slow_papers.reads, 11)
+
+    def test_async_iterator(self):
+        """
+        Test the async iterator returns the papers in order, with bounded
+        prefetching.
+        """
+        slow_papers = SlowPapers(delay=0.01)
+
+        async def iterate():
+            async with AsyncPapers(slow_papers, workers=2, max_pending=2) as papers:
+                return [content async for content in papers.all_papers_content(prefetch=3)]
+
+        contents = asyncio.run(iterate())
+        self.assertEqual(contents, [f"Content of uid{i}" for i in range(10)])
+
+
+class AsyncSamplePapersTestCase(SampleDatasetTestCase):
+    """
+    Test the asyncio facade over the papers of the sample dataset.
+    """
+
+    def test_papers_facade(self):
+        """
+        Test the facade over the Papers class with the sample dataset.
+        """
+        sample_papers = SamplePapers()
+
+        async def read_papers():
+            async with AsyncPapers(sample_papers, workers=4) as papers:
+                full_text = await papers.paper_full_text(self.cord_uids[1])
+                embedding = await papers.paper_embedding(self.cord_uids[1])
+                contents = [content async for content in papers.all_papers_content(self.cord_uids[:6])]
+            return full_text, embedding, contents
+
+        full_text, embedding, contents = asyncio.run(read_papers())
+        self.assertEqual(full_text, sample_papers.paper_full_text(self.cord_uids[1]))
+        self.assertEqual(embedding.tolist(), sample_papers.paper_embedding(self.cord_uids[1]).tolist())
+        self.assertEqual(contents, list(sample_papers.all_papers_content(self.cord_uids[:6])))
+
+        # The facade over the shared papers, with the methods they have.
+        async def read_shared(shared):
+            async with AsyncPapers(shared, workers=2) as papers:
+                title_abstract = await papers.paper_title_abstract(self.cord_uids[2])
+                embeddings = [embed async for embed in papers.all_papers_embedding(self.cord_uids[:4])]
+                with self.assertRaises(ValueError):
+                    _ = [embed async for embed in papers.all_papers_embedding()]
+            return title_abstract, embeddings
+
+        with sample_papers.shared_store() as store, SharedPapers(store.handle) as shared:
+            title_abstract, embeddings = asyncio.run(read_shared(shared))
+        self.assertEqual(title_abstract, sample_papers.paper_title_abstract(self.cord_uids[2]))
+        self.assertEqual(
+            [embed.tolist() for embed in embeddings],
+            [embed.tolist() for embed in sample_papers.all_papers_embedding(self.cord_uids[:4])]
+        )
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,86 @@
+# Gelin Eguinosa Rosique
+
+import shutil
+import tempfile
+import unittest
+from os import mkdir, listdir
+from os.path import join
+from atomic_files import (
+    write_json_atomic, load_json, replace_folder, folder_checksums, verify_files,
+    sample_bytes
+)
+
+
+class AtomicFilesTestCase(unittest.TestCase):
+    """
+    Test the atomic writes and the checksums of the files.
+    """
+
+    def setUp(self) -> None:
+        self.temp_folder = tempfile.mkdtemp()
+
+    def tearDown(self) -> None:
+        shutil.rmtree(self.temp_folder)
+
+    def test_json_files(self):
+        """
+        Test the JSON files are replaced completely, and the corrupted ones are
+        not loaded.
+        """
+        json_path = join(self.temp_folder, 'data.json')
+        self.assertIsNone(load_json(json_path))
+        write_json_atomic(json_path, {'papers': [1, 2, 3]})
+        write_json_atomic(json_path, {'papers': [4]})
+        self.assertEqual(load_json(json_path), {'papers': [4]})
+        self.assertEqual(listdir(self.temp_folder), ['data.json'])
+        with open(json_path, 'w') as file:
+            file.write('{"papers": [')
+        self.assertIsNone(load_json(json_path))
+
+    def test_replace_folder(self):
+        """
+        Test a folder built in a temporary location replaces the old one.
+        """
+        folder = join(self.temp_folder, 'index')
+        for version in ('old', 'new'):
+            temp_folder = folder + '.building'
+            mkdir(temp_folder)
+            with open(join(temp_folder, 'data.bin'), 'w') as file:
+                file.write(version)
+            replace_folder(temp_folder, folder)
+        with open(join(folder, 'data.bin'), 'r') as file:
+            self.assertEqual(file.read(), 'new')
+        self.assertEqual(listdir(self.temp_folder), ['index'])
+
+    def test_verify_files(self):
+        """
+        Test the files that were truncated or modified are detected.
+        """
+        folder = join(self.temp_folder, 'index')
+        mkdir(folder)
+        for name in ('first.bin', 'second.bin', 'third.bin'):
+            with open(join(folder, name), 'wb') as file:
+                file.write(bytes(range(256)) * (3 * sample_bytes // 256))
+        with open(join(self.temp_folder, 'index.json'), 'w') as file:
+            file.write('{}')
+        checksums = folder_checksums(self.temp_folder, ['index', 'index.json'])
+        self.assertEqual(len(checksums), 4)
+        self.assertEqual(verify_files(self.temp_folder, checksums, full=True), [])
+
+        # Truncate a file, and change the middle of another (only found when
+        # all the content is checked).
+        with open(join(folder, 'first.bin'), 'r+b') as file:
+            file.truncate(100)
+        with open(join(folder, 'second.bin'), 'r+b') as file:
+            file.seek(sample_bytes + 10)
+            file.write(b'\xff')
+        bad_files = verify_files(self.temp_folder, checksums)
+        self.assertEqual(bad_files, [join('index', 'first.bin')])
+        bad_files = verify_files(self.temp_folder, checksums, full=True)
+        self.assertEqual(bad_files, [join('index', 'first.bin'), join('index', 'second.bin')])
+        shutil.rmtree(folder)
+        self.assertEqual(len(verify_files(self.temp_folder, checksums)), 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
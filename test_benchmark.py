@@ -0,0 +1,75 @@
+# Gelin Eguinosa Rosique
+
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+import benchmark as benchmark_module
+from benchmark import run_benchmark, peak_rss, compare_results, latency_stats
+from sample_dataset import SamplePapers
+
+
+class BenchmarkTestCase(unittest.TestCase):
+    """
+    Test the benchmark of the Papers class with a tiny synthetic dataset.
+    """
+
+    def setUp(self) -> None:
+        """
+        Create the folder for the benchmark.
+        """
+        self.temp_folder = tempfile.mkdtemp()
+
+    def tearDown(self) -> None:
+        """
+        Delete the benchmark's folder.
+        """
+        shutil.rmtree(self.temp_folder)
+
+    def test_latency_stats(self):
+        """
+        Test the percentiles and throughput of the latencies.
+        """
+        stats = latency_stats([0.001] * 99 + [0.1])
+        self.assertEqual(stats['count'], 100)
+        self.assertAlmostEqual(stats['p50_ms'], 1.0)
+        self.assertGreater(stats['p99_ms'], 1.0)
+        self.assertAlmostEqual(stats['throughput'], 100 / 0.199)
+
+    def test_peak_rss(self):
+        """
+        Test the peak memory is 0 in the platforms without 'resource'.
+        """
+        self.assertGreater(peak_rss(), 0)
+        with mock.patch.object(benchmark_module, 'resource', None):
+            self.assertEqual(peak_rss(), 0)
+
+    def test_run_benchmark(self):
+        """
+        Test the benchmark measures all the paths, and the comparison with a
+        baseline.
+        """
+        benchmark = run_benchmark(self.temp_folder, num_papers=20, embedding_size=8, lookups=30)
+        results = benchmark['results']
+        for name in ['papers_cold', 'papers_warm', 'embedding_random', 'embedding_sequential',
+                     'content_random', 'content_sequential', 'all_papers_content',
+                     'all_papers_full_text', 'all_papers_embedding']:
+            self.assertIn(name, results)
+        self.assertEqual(results['embedding_random']['count'], 30)
+        self.assertEqual(results['all_papers_embedding']['count'], 20)
+        self.assertGreater(benchmark['peak_rss'], 0)
+        self.assertEqual(len(SamplePapers().papers_index), 20)
+
+        # Comparing a run with itself finds no regressions.
+        comparison = compare_results(benchmark, benchmark)
+        self.assertEqual(set(comparison), set(results))
+        self.assertFalse(any(diff['regression'] for diff in comparison.values()))
+
+        # A run with other parameters creates its own dataset.
+        benchmark = run_benchmark(self.temp_folder, num_papers=12, embedding_size=4, lookups=5)
+        self.assertEqual(benchmark['results']['all_papers_embedding']['count'], 12)
+        self.assertEqual(SamplePapers().embeds_size, 4)
+
+
+if __name__ == '__main__':
+    unittest.main()
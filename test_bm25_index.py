@@ -0,0 +1,85 @@
+# Gelin Eguinosa Rosique
+
+import tempfile
+import unittest
+from os.path import join, isdir
+import numpy as np
+from bm25_index import BM25Index, build_bm25_index, tokenize, varbyte_encode, varbyte_decode
+
+
+class VarbyteTestCase(unittest.TestCase):
+    """
+    Test for 'varbyte_encode' and 'varbyte_decode'
+    """
+
+    def test_round_trip(self):
+        """
+        Test the integers are decoded back, and the small ones use one byte.
+        """
+        values = np.array([0, 1, 127, 128, 300, 16383, 16384, 2 ** 31, 5], dtype=np.uint64)
+        encoded = varbyte_encode(values)
+        self.assertEqual(len(encoded), 1 + 1 + 1 + 2 + 2 + 2 + 3 + 5 + 1)
+        self.assertEqual(varbyte_decode(encoded).tolist(), values.tolist())
+        self.assertEqual(varbyte_decode(varbyte_encode([])).tolist(), [])
+
+
+class BM25IndexTestCase(unittest.TestCase):
+    """
+    Test the creation and the queries of the BM25 index.
+    """
+
+    def setUp(self) -> None:
+        """
+        Create the documents of the index.
+        """
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.index_folder = join(self.temp_dir.name, 'bm25')
+        self.documents = [
+            ('d0', {'title': 'ACE2 receptor binding', 'body': 'The ACE2 receptor in cells.'}),
+            ('d1', {'title': 'Masks and transmission', 'body': 'Masks reduce transmission.'}),
+            ('d2', {'title': 'Vaccines', 'body': 'ACE2 is mentioned once, receptor too.'}),
+            ('d3', {'title': 'Receptor', 'body': ''}),
+        ]
+
+    def tearDown(self) -> None:
+        """
+        Delete the temporary folder.
+        """
+        self.temp_dir.cleanup()
+
+    def test_search(self):
+        """
+        Test the ranking of the documents, with one run and with several runs
+        merged.
+        """
+        for max_postings in (1000, 3):
+            build_bm25_index(
+                self.index_folder, self.documents, ['title', 'body'],
+                meta={'dataset': 'test'}, max_postings=max_postings
+            )
+            self.assertFalse(isdir(join(self.index_folder, 'runs')))
+            bm25_index = BM25Index(self.index_folder)
+            self.assertEqual(bm25_index.meta['dataset'], 'test')
+            self.assertEqual(len(bm25_index), 4)
+            docs, tfs = bm25_index.postings('body', 'ace2')
+            self.assertEqual(docs.tolist(), [0, 2])
+            self.assertEqual(tfs.tolist(), [1, 1])
+
+            results = bm25_index.search('ACE2 receptor', k=10)
+            self.assertEqual([uid for uid, _ in results][:2], ['d0', 'd2'])
+            self.assertNotIn('d1', [uid for uid, _ in results])
+            results = bm25_index.search('receptor', k=10, fields=['title'])
+            self.assertEqual({uid for uid, _ in results}, {'d0', 'd3'})
+            self.assertEqual(bm25_index.search('unknown words'), [])
+            with self.assertRaises(ValueError):
+                bm25_index.search('receptor', fields=['abstract'])
+
+    def test_tokenize(self):
+        """
+        Test the text is split in lowercase words.
+        """
+        self.assertEqual(tokenize('SARS-CoV-2 binds ACE2.'), ['sars', 'cov', '2', 'binds', 'ace2'])
+
+
+if __name__ == '__main__':
+    unittest.main()
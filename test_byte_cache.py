@@ -0,0 +1,87 @@
+# Gelin Eguinosa Rosique
+
+import unittest
+from byte_cache import LRUCache, LFUCache, create_cache
+
+
+class LRUCacheTestCase(unittest.TestCase):
+    """
+    Test the cache with the Least Recently Used eviction policy.
+    """
+
+    def test_eviction_by_bytes(self):
+        """
+        Test the least recently used values are evicted when the cache passes
+        its maximum size.
+        """
+        cache = LRUCache(max_bytes=100)
+        cache.put('a', 'A', size=40)
+        cache.put('b', 'B', size=40)
+        # Use 'a', so 'b' is the least recently used.
+        self.assertEqual(cache.get('a'), 'A')
+        cache.put('c', 'C', size=40)
+        self.assertNotIn('b', cache)
+        self.assertEqual(cache.get('b'), None)
+        self.assertEqual(cache.stats()['bytes'], 80)
+        self.assertEqual((cache.hits, cache.misses, cache.evictions), (1, 1, 1))
+
+    def test_value_bigger_than_cache(self):
+        """
+        Test a value bigger than the cache is not saved.
+        """
+        cache = LRUCache(max_bytes=10)
+        cache.put('a', 'A', size=5)
+        cache.put('b', 'B', size=20)
+        self.assertNotIn('b', cache)
+        self.assertIn('a', cache)
+        # A cache of 0 bytes doesn't save anything.
+        cache = create_cache(0)
+        cache.put('a', 'A')
+        self.assertEqual(len(cache), 0)
+
+    def test_replace_value(self):
+        """
+        Test saving a key again replaces its value and size.
+        """
+        cache = LRUCache(max_bytes=100)
+        cache.put('a', 'A', size=60)
+        cache.put('a', 'AA', size=30)
+        self.assertEqual(cache.get('a'), 'AA')
+        self.assertEqual(cache.current_bytes, 30)
+        cache.clear()
+        self.assertEqual((len(cache), cache.current_bytes), (0, 0))
+
+
+class LFUCacheTestCase(unittest.TestCase):
+    """
+    Test the cache with the Least Frequently Used eviction policy.
+    """
+
+    def test_eviction_by_frequency(self):
+        """
+        Test the least frequently used values are evicted first.
+        """
+        cache = LFUCache(max_bytes=30)
+        cache.put('a', 'A', size=10)
+        cache.put('b', 'B', size=10)
+        cache.put('c', 'C', size=10)
+        cache.get('a')
+        cache.get('a')
+        cache.get('c')
+        cache.put('d', 'D', size=10)
+        self.assertNotIn('b', cache)
+        cache.put('e', 'E', size=10)
+        self.assertNotIn('d', cache)
+        self.assertEqual(set(cache.values), {'a', 'c', 'e'})
+        self.assertEqual(cache.evictions, 2)
+
+    def test_unknown_policy(self):
+        """
+        Test an error is raised with an unknown policy.
+        """
+        with self.assertRaises(ValueError):
+            create_cache(100, 'fifo')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,104 @@
+# Gelin Eguinosa Rosique
+
+import csv
+import json
+import unittest
+from os.path import join
+import numpy as np
+from citation_graph import build_citation_graph, normalize_doi, normalize_title
+from sample_dataset import SamplePapers
+from test_papers import SampleDatasetTestCase
+
+
+class CitationGraphTestCase(unittest.TestCase):
+    """
+    Test the resolution of the references and the CSR graph.
+    """
+
+    def test_build_graph(self):
+        """
+        Test the references are resolved by DOI and by title, and the PageRank
+        is the same as the one of the dense transition matrix.
+        """
+        cord_uids = ['a', 'b', 'c', 'd']
+        titles = ['The first paper title', 'The second paper title', 'Short', 'The fourth paper title']
+        dois = ['10.1/A', '', '10.1/C', '']
+        papers_references = [
+            [('Another title', 'https://doi.org/10.1/c'), ('THE SECOND paper title.', '')],
+            [('The first paper title', ''), ('Unknown paper in the corpus', '')],
+            [('Short', ''), ('The fourth-paper title', 'doi:10.1/x')],
+            [],
+        ]
+        graph = build_citation_graph(cord_uids, titles, dois, papers_references)
+        self.assertEqual(graph.references('a').tolist(), ['b', 'c'])
+        self.assertEqual(graph.references('c').tolist(), ['d'])
+        self.assertEqual(graph.cited_by('a').tolist(), ['b'])
+        self.assertEqual(graph.cited_by('d').tolist(), ['c'])
+        self.assertEqual(graph.references('d').tolist(), [])
+        self.assertEqual(graph.stats.tolist(), [6, 4])
+        self.assertEqual(normalize_doi(' DOI:10.1/AB '), '10.1/ab')
+        self.assertEqual(normalize_title('The  Title, (2020)'), 'the title 2020')
+
+        # Compare with the power method over the dense matrix.
+        damping = 0.85
+        transition = np.zeros((4, 4))
+        for source, targets in enumerate([[1, 2], [0], [3], []]):
+            for target in targets:
+                transition[target, source] = 1 / len(targets)
+            if not targets:
+                transition[:, source] = 1 / 4
+        expected = np.full(4, 1 / 4)
+        for _ in range(200):
+            expected = (1 - damping) / 4 + damping * transition @ expected
+        ranks = graph.pagerank(damping=damping)
+        np.testing.assert_allclose(ranks, expected, atol=1e-8)
+        self.assertAlmostEqual(ranks.sum(), 1.0)
+
+
+class PapersCitationsTestCase(SampleDatasetTestCase):
+    """
+    Test the citation graph of the papers of the sample dataset.
+    """
+
+    def test_papers_citations(self):
+        """
+        Test the graph created from the 'bib_entries' of the sample dataset.
+        """
+        dataset_folder = join(SamplePapers.cord19_data_folder, SamplePapers.current_dataset)
+        # Add a DOI to the papers in the metadata.
+        metadata_path = join(dataset_folder, SamplePapers.metadata_file)
+        with open(metadata_path, 'r', newline='') as file:
+            metadata_rows = list(csv.DictReader(file))
+        with open(metadata_path, 'w', newline='') as file:
+            metadata_writer = csv.DictWriter(file, fieldnames=list(metadata_rows[0]) + ['doi'])
+            metadata_writer.writeheader()
+            for metadata_row in metadata_rows:
+                metadata_row['doi'] = f"10.1000/{metadata_row['cord_uid']}"
+                metadata_writer.writerow(metadata_row)
+        # Paper 1 cites papers 2 and 4 (by title and DOI), paper 4 cites 2.
+        citations = {1: [('Title of paper 2', ''), ('', '10.1000/UID004')], 4: [('Title of paper 2', '')]}
+        for paper, references in citations.items():
+            json_path = join(dataset_folder, 'document_parses', 'pmc_json', f"PMC{paper}.xml.json")
+            with open(json_path, 'r') as file:
+                paper_json = json.load(file)
+            paper_json['bib_entries'] = {
+                f"BIBREF{i}": {'title': title, 'other_ids': {'DOI': [doi] if doi else []}}
+                for i, (title, doi) in enumerate(references)
+            }
+            with open(json_path, 'w') as file:
+                json.dump(paper_json, file)
+
+        papers = SamplePapers()
+        graph = papers.build_citation_graph(workers=2)
+        self.assertEqual(len(graph), len(papers.papers_index))
+        self.assertEqual(papers.references('uid001').tolist(), ['uid002', 'uid004'])
+        self.assertEqual(papers.cited_by('uid002').tolist(), ['uid001', 'uid004'])
+        self.assertEqual(papers.pagerank(k=1)[0][0], 'uid002')
+
+        # The saved graph is loaded in read-only mode.
+        papers = SamplePapers.open()
+        self.assertEqual(papers.cited_by('uid004').tolist(), ['uid001'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,94 @@
+# Gelin Eguinosa Rosique
+
+import unittest
+import numpy as np
+from embeddings_clustering import EmbeddingsClustering, minibatch_kmeans
+from sample_dataset import SamplePapers
+from test_papers import SampleDatasetTestCase
+
+
+class MatrixPapers:
+    """
+    Minimal papers with the embeddings of a matrix, for the clustering.
+    """
+
+    def __init__(self, matrix):
+        self.matrix = matrix
+        self.embeds_index = {f"uid{i}": i for i in range(len(matrix))}
+
+    def embeddings_matrix(self, cord_uids):
+        return self.matrix[[self.embeds_index[cord_uid] for cord_uid in cord_uids]]
+
+    def embeddings_batches(self, cord_uids, batch_size=1024):
+        cord_uids = list(cord_uids)
+        for start in range(0, len(cord_uids), batch_size):
+            batch_uids = cord_uids[start:start + batch_size]
+            yield batch_uids, self.embeddings_matrix(batch_uids)
+
+
+class EmbeddingsClusteringTestCase(unittest.TestCase):
+    """
+    Test the clustering of the embeddings.
+    """
+
+    def test_separated_groups(self):
+        """
+        Test the mini-batch k-means finds groups of embeddings around different
+        directions, and the hierarchy merges the closest groups first.
+        """
+        rand_gen = np.random.default_rng(0)
+        directions = np.eye(8, dtype=np.float32)[:4]
+        # Two pairs of close directions.
+        directions[1] = directions[0] + 0.3 * directions[1]
+        directions[3] = directions[2] + 0.3 * directions[3]
+        groups = np.repeat(np.arange(4), 50)
+        matrix = directions[groups] + 0.02 * rand_gen.normal(size=(200, 8)).astype(np.float32)
+        clustering = minibatch_kmeans(MatrixPapers(matrix), 4, batch_size=32, n_epochs=5, seed=1)
+        self.assertEqual(clustering.counts.sum(), 200)
+        # Each group is a cluster.
+        for group in range(4):
+            self.assertEqual(len(set(clustering.labels[groups == group].tolist())), 1)
+        self.assertEqual(len(set(clustering.labels.tolist())), 4)
+        self.assertEqual(clustering.paper_cluster('uid60'), clustering.labels[60])
+        self.assertEqual(len(clustering.cluster_papers(clustering.labels[0])), 50)
+
+        # With two topics, the close groups are together.
+        merges = clustering.merge_hierarchy()
+        self.assertEqual(merges.shape, (3, 3))
+        topics = clustering.topic_labels(2)
+        self.assertEqual(topics[0], topics[60])
+        self.assertEqual(topics[110], topics[160])
+        self.assertNotEqual(topics[0], topics[110])
+        self.assertEqual(len(set(clustering.topic_labels(1).tolist())), 1)
+
+        # There is nothing to cluster without papers.
+        with self.assertRaises(ValueError):
+            minibatch_kmeans(MatrixPapers(matrix), 4, cord_uids=[])
+        with self.assertRaises(ValueError):
+            minibatch_kmeans(MatrixPapers(matrix[:0]), 4)
+
+
+class PapersClustersTestCase(SampleDatasetTestCase):
+    """
+    Test the clustering of the papers of the sample dataset.
+    """
+
+    def test_papers_clusters(self):
+        """
+        Test the clustering of the sample papers, with a pool of processes, is
+        saved and loaded.
+        """
+        papers = SamplePapers()
+        self.assertIsNone(papers.embeddings_clusters())
+        clustering = papers.cluster_embeddings(n_clusters=4, batch_size=8, workers=2)
+        single_clustering = papers.cluster_embeddings(n_clusters=4, batch_size=8)
+        np.testing.assert_array_equal(clustering.labels, single_clustering.labels)
+        loaded = papers.embeddings_clusters()
+        self.assertIsInstance(loaded, EmbeddingsClustering)
+        self.assertEqual(sorted(loaded.cord_uids.tolist()), sorted(self.cord_uids))
+        np.testing.assert_array_equal(loaded.labels, clustering.labels)
+        self.assertEqual(len(loaded.merges), 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
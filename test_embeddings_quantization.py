@@ -0,0 +1,91 @@
+# Gelin Eguinosa Rosique
+
+import tempfile
+import unittest
+from os.path import join
+import numpy as np
+from embeddings_search import ExactSearch
+from embeddings_quantization import (
+    ProductQuantizer, save_quantized_matrix, open_quantized_matrix, quantization_report
+)
+
+
+class EmbeddingsQuantizationTestCase(unittest.TestCase):
+    """
+    Test the compressed formats of the embeddings.
+    """
+
+    def setUp(self) -> None:
+        """
+        Create a random matrix of embeddings.
+        """
+        rand_gen = np.random.default_rng(5)
+        self.matrix = rand_gen.normal(size=(400, 32)).astype(np.float32)
+
+    def test_quantized_matrix(self):
+        """
+        Test the float16 and int8 matrices are saved, memory-mapped and decoded
+        close to the original values.
+        """
+        with tempfile.TemporaryDirectory() as temp_folder:
+            codes_path = join(temp_folder, 'matrix.codes')
+            scales_path = join(temp_folder, 'matrix.scales')
+            self.assertIsNone(open_quantized_matrix('int8', codes_path, 32, scales_path))
+            for mode, tolerance in [('float16', 1e-2), ('int8', 3e-2)]:
+                save_quantized_matrix(self.matrix, mode, codes_path, scales_path, block_size=64)
+                quantized = open_quantized_matrix(mode, codes_path, 32, scales_path)
+                self.assertEqual(quantized.shape, self.matrix.shape)
+                self.assertEqual(quantized[3].dtype, np.float32)
+                np.testing.assert_allclose(quantized[10:20], self.matrix[10:20], atol=tolerance)
+                np.testing.assert_allclose(quantized[[5, 1]], self.matrix[[5, 1]], atol=tolerance)
+                del quantized
+            with self.assertRaises(ValueError):
+                save_quantized_matrix(self.matrix, 'float8', codes_path)
+
+    def test_product_quantizer(self):
+        """
+        Test the product quantization codes, and the search with the asymmetric
+        distance finds most of the true neighbours.
+        """
+        quantizer = ProductQuantizer.build(self.matrix, subspaces=10, centroids=64, seed=1)
+        # The subspaces are reduced until they divide the size of the vectors.
+        self.assertEqual(quantizer.codes.shape, (400, 8))
+        self.assertEqual(quantizer.codes.dtype, np.uint8)
+        self.assertEqual(quantizer.decode(quantizer.codes[:3]).shape, (3, 32))
+
+        rows, scores = quantizer.search(self.matrix[0], k=10, exclude=0)
+        self.assertNotIn(0, rows.tolist())
+        self.assertTrue(np.all(np.diff(scores) <= 0))
+        true_rows, _ = ExactSearch(self.matrix).search(self.matrix[0], k=10, exclude=0)
+        self.assertGreaterEqual(len(set(rows.tolist()) & set(true_rows.tolist())), 3)
+
+        # Save and load the quantizer.
+        with tempfile.TemporaryDirectory() as temp_folder:
+            pq_path = join(temp_folder, 'pq.npz')
+            quantizer.save(pq_path)
+            loaded = ProductQuantizer.load(pq_path)
+            np.testing.assert_array_equal(loaded.codes, quantizer.codes)
+
+    def test_quantization_report(self):
+        """
+        Test the report compares the compressed formats with float32.
+        """
+        with tempfile.TemporaryDirectory() as temp_folder:
+            codes_path = join(temp_folder, 'matrix.f16')
+            save_quantized_matrix(self.matrix, 'float16', codes_path)
+            quantized = {
+                'float16': open_quantized_matrix('float16', codes_path, 32),
+                'pq': ProductQuantizer.build(self.matrix, subspaces=8, centroids=64),
+            }
+            report = quantization_report(self.matrix, quantized, n_queries=20, k=5)
+            del quantized
+        self.assertEqual(report['float32']['bytes'], self.matrix.nbytes)
+        self.assertEqual(report['float16']['compression'], 2.0)
+        self.assertGreater(report['float16']['recall_at_5'], 0.95)
+        self.assertLess(report['float16']['mean_cosine_error'], 1e-3)
+        self.assertGreater(report['pq']['compression'], 1.0)
+        self.assertLessEqual(report['pq']['recall_at_5'], 1.0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,82 @@
+# Gelin Eguinosa Rosique
+
+import tempfile
+import unittest
+from os.path import join
+import numpy as np
+from embeddings_search import ExactSearch, IVFSearch, top_k
+
+
+class TopKTestCase(unittest.TestCase):
+    """
+    Test for 'top_k'
+    """
+
+    def test_sorted_positions(self):
+        """
+        Test the function returns the positions of the highest scores sorted.
+        """
+        scores = np.array([0.1, 0.9, 0.3, 0.7, 0.5])
+        self.assertEqual(top_k(scores, 3).tolist(), [1, 3, 4])
+
+    def test_k_bigger_than_scores(self):
+        """
+        Test the function when 'k' is bigger than the amount of scores.
+        """
+        scores = np.array([0.1, 0.9])
+        self.assertEqual(top_k(scores, 5).tolist(), [1, 0])
+
+
+class EmbeddingsSearchTestCase(unittest.TestCase):
+    """
+    Test the exact and approximate search of embeddings.
+    """
+
+    def setUp(self) -> None:
+        """
+        Create a random matrix of embeddings.
+        """
+        rand_gen = np.random.default_rng(3)
+        self.matrix = rand_gen.normal(size=(500, 32)).astype(np.float32)
+        self.query = rand_gen.normal(size=32).astype(np.float32)
+        normalized = self.matrix / np.linalg.norm(self.matrix, axis=1, keepdims=True)
+        self.similarities = normalized @ (self.query / np.linalg.norm(self.query))
+
+    def test_exact_search(self):
+        """
+        Test the exact search finds the same neighbours as sorting all the
+        similarities, with small blocks.
+        """
+        search = ExactSearch(self.matrix, block_size=64)
+        rows, scores = search.search(self.query, k=10)
+        expected = np.argsort(-self.similarities)[:10]
+        self.assertEqual(rows.tolist(), expected.tolist())
+        np.testing.assert_allclose(scores, self.similarities[expected], rtol=1e-5)
+
+        # Exclude the best row.
+        rows, _ = search.search(self.query, k=10, exclude=expected[0])
+        self.assertEqual(rows.tolist(), np.argsort(-self.similarities)[1:11].tolist())
+
+    def test_ivf_search(self):
+        """
+        Test the approximate search, and the saving and loading of its index.
+        """
+        ivf_search = IVFSearch.build(self.matrix, n_lists=10, block_size=64)
+        self.assertEqual(ivf_search.list_offsets[-1], len(self.matrix))
+        # Visiting all the lists returns the exact results.
+        rows, _ = ivf_search.search(self.query, k=10, n_probe=10)
+        self.assertEqual(rows.tolist(), np.argsort(-self.similarities)[:10].tolist())
+
+        with tempfile.TemporaryDirectory() as temp_folder:
+            index_path = join(temp_folder, 'ivf.npz')
+            ivf_search.save(index_path)
+            loaded_search = IVFSearch.load(index_path, self.matrix)
+            # An index can't be used with a different matrix.
+            self.assertIsNone(IVFSearch.load(index_path, self.matrix[:100]))
+        loaded_rows, _ = loaded_search.search(self.query, k=10, n_probe=3)
+        rows, _ = ivf_search.search(self.query, k=10, n_probe=3)
+        self.assertEqual(loaded_rows.tolist(), rows.tolist())
+
+
+if __name__ == '__main__':
+    unittest.main()
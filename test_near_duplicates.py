@@ -0,0 +1,107 @@
+# Gelin Eguinosa Rosique
+
+import csv
+import unittest
+from os.path import join
+import numpy as np
+from near_duplicates import MinHasher, NearDuplicates, shingle_hashes, lsh_candidates
+from sample_dataset import SamplePapers
+from test_papers import SampleDatasetTestCase
+
+
+class MinHashTestCase(unittest.TestCase):
+    """
+    Test the shingles and the MinHash signatures of the texts.
+    """
+
+    def test_jaccard_estimate(self):
+        """
+        Test the signatures estimate the Jaccard similarity of the shingles,
+        and LSH finds the similar texts.
+        """
+        words = [f"word{i}" for i in range(200)]
+        text = ' '.join(words)
+        similar_text = ' '.join(words[:180] + [f"other{i}" for i in range(20)])
+        different_text = ' '.join(f"different{i}" for i in range(200))
+        hashes = [shingle_hashes(text), shingle_hashes(similar_text), shingle_hashes(different_text)]
+        self.assertEqual(len(hashes[0]), 196)
+        self.assertEqual(len(shingle_hashes('Two words', size=5)), 1)
+
+        min_hasher = MinHasher(num_perm=256, seed=3)
+        signatures = np.array([min_hasher.signature(text_hashes) for text_hashes in hashes])
+        jaccard = len(np.intersect1d(hashes[0], hashes[1])) / len(np.union1d(hashes[0], hashes[1]))
+        estimate = np.mean(signatures[0] == signatures[1])
+        self.assertAlmostEqual(estimate, jaccard, delta=0.1)
+        self.assertLess(np.mean(signatures[0] == signatures[2]), 0.05)
+        self.assertEqual(lsh_candidates(signatures, bands=64), {(0, 1)})
+        # The bands must split the signatures in bands of the same size.
+        for bands in [0, -4, 512, 100]:
+            with self.assertRaises(ValueError):
+                lsh_candidates(signatures, bands)
+
+
+class NearDuplicatesTestCase(SampleDatasetTestCase):
+    """
+    Test the near-duplicates found in the sample dataset.
+    """
+
+    def setUp(self) -> None:
+        """
+        Create the sample dataset, adding copies of some of the papers.
+        """
+        super().setUp()
+        dataset_folder = join(SamplePapers.cord19_data_folder, SamplePapers.current_dataset)
+        metadata_path = join(dataset_folder, SamplePapers.metadata_file)
+        embeddings_path = join(dataset_folder, SamplePapers.embeddings_file)
+        with open(metadata_path, 'r', newline='') as file:
+            metadata_rows = {row['cord_uid']: row for row in csv.DictReader(file)}
+        with open(embeddings_path, 'r', newline='') as file:
+            embeddings_rows = {row[0]: row for row in csv.reader(file)}
+        # A copy of paper 4 (with its PDF file but not its PMC file), a copy of
+        # paper 8 with a different embedding, and two copies of paper 10.
+        copies = [('dup004', 'uid004', True), ('dup008', 'uid008', False),
+                  ('dup010', 'uid010', True), ('dup010b', 'uid010', True)]
+        with open(metadata_path, 'a', newline='') as metadata_file, \
+                open(embeddings_path, 'a', newline='') as embeds_file:
+            metadata_writer = csv.DictWriter(metadata_file, fieldnames=list(metadata_rows['uid004']))
+            embeds_writer = csv.writer(embeds_file)
+            for copy_uid, cord_uid, same_embedding in copies:
+                metadata_row = dict(metadata_rows[cord_uid], cord_uid=copy_uid, pmc_json_files='')
+                metadata_writer.writerow(metadata_row)
+                embedding = embeddings_rows[cord_uid][1:]
+                if not same_embedding:
+                    embedding = [str(-float(value)) for value in embedding]
+                embeds_writer.writerow([copy_uid] + embedding)
+
+    def test_duplicate_groups(self):
+        """
+        Test the groups of duplicates, their canonical papers, and the
+        iterators skipping the duplicates.
+        """
+        papers = SamplePapers()
+        with self.assertRaises(ValueError):
+            papers.find_duplicates(num_perm=128, bands=48)
+        near_duplicates = papers.find_duplicates(workers=2)
+        self.assertEqual(
+            sorted(near_duplicates.groups), [['uid004', 'dup004'], ['uid010', 'dup010', 'dup010b']]
+        )
+        self.assertEqual(papers.canonical_uid('dup010b'), 'uid010')
+        self.assertEqual(papers.canonical_uid('dup008'), 'dup008')
+
+        all_texts = list(papers.all_papers_title_abstract())
+        unique_texts = list(papers.all_papers_title_abstract(skip_duplicates=True))
+        self.assertEqual(len(all_texts) - len(unique_texts), 3)
+        unique_embeddings = list(papers.all_papers_embedding(skip_duplicates=True))
+        self.assertEqual(len(unique_embeddings), len(unique_texts))
+        unique_contents = list(papers.all_papers_content(workers=2, skip_duplicates=True))
+        self.assertEqual(len(unique_contents), len(unique_texts))
+
+        # The groups are saved, and loaded by a new instance.
+        papers = SamplePapers.open()
+        self.assertEqual(papers.paper_duplicates().canonical, near_duplicates.canonical)
+        loaded = NearDuplicates.load(join(SamplePapers.project_data_folder, SamplePapers.duplicates_file))
+        self.assertEqual(loaded.params['jaccard_threshold'], 0.7)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,91 @@
+# Gelin Eguinosa Rosique
+
+import datetime
+import tempfile
+import unittest
+from os.path import join
+import numpy as np
+from paper_filters import PaperFilters, parse_publish_day, missing_day
+from records_index import RecordsIndex, RecordsWriter
+
+
+class ParsePublishDayTestCase(unittest.TestCase):
+    """
+    Test for 'parse_publish_day'
+    """
+
+    def test_date_formats(self):
+        """
+        Test the formats of the publication dates in the metadata.
+        """
+        self.assertEqual(parse_publish_day('1970-01-02'), 1)
+        self.assertEqual(parse_publish_day('2020-03'), parse_publish_day('2020-03-01'))
+        self.assertEqual(parse_publish_day('2020'), parse_publish_day('2020-01-01'))
+        self.assertEqual(parse_publish_day(''), missing_day)
+        self.assertEqual(parse_publish_day('2020-13-01'), missing_day)
+
+
+class PaperFiltersTestCase(unittest.TestCase):
+    """
+    Test the creation and the queries of the filters.
+    """
+
+    def setUp(self) -> None:
+        """
+        Create the index of the papers used by the filters.
+        """
+        self.temp_dir = tempfile.TemporaryDirectory()
+        index_folder = join(self.temp_dir.name, 'papers_index')
+        papers = [
+            {'cord_uid': 'a', 'publish_time': '2019-12-31', 'authors': ['Doe, Jane', 'Roe, R'],
+             'pdf_json_files': ['a.json']},
+            {'cord_uid': 'b', 'publish_time': '2020-03', 'authors': ['Roe,  R'],
+             'pmc_json_files': ['b.json']},
+            {'cord_uid': 'c', 'publish_time': '', 'authors': ['']},
+            {'cord_uid': 'd', 'publish_time': '2020', 'authors': ['doe, jane'],
+             'pdf_json_files': ['d.json'], 'pmc_json_files': ['d.xml.json']},
+        ]
+        with RecordsWriter(index_folder) as writer:
+            for paper_dict in papers:
+                writer.add(paper_dict)
+        self.records_index = RecordsIndex(index_folder)
+
+    def tearDown(self) -> None:
+        """
+        Delete the temporary folder.
+        """
+        self.temp_dir.cleanup()
+
+    def test_select(self):
+        """
+        Test the conditions of the filters, alone and combined.
+        """
+        filters = PaperFilters.build(self.records_index)
+        self.assertEqual(filters.select().tolist(), [0, 1, 2, 3])
+        self.assertEqual(filters.select(published_after='2020').tolist(), [1, 3])
+        self.assertEqual(filters.select(published_before=datetime.date(2020, 1, 1)).tolist(), [0])
+        self.assertEqual(filters.select(has_pmc=True).tolist(), [1, 3])
+        self.assertEqual(filters.select(has_pdf=False).tolist(), [1, 2])
+        self.assertEqual(filters.select(has_full_text=False).tolist(), [2])
+        self.assertEqual(filters.select(authors='Doe, Jane').tolist(), [0, 3])
+        self.assertEqual(filters.select(authors=['roe, r', 'Nobody']).tolist(), [0, 1])
+        self.assertEqual(filters.select(authors='Doe, Jane', has_pmc=True).tolist(), [3])
+        alive = np.array([True, True, True, False])
+        self.assertEqual(filters.select(authors='Doe, Jane', alive=alive).tolist(), [0])
+
+    def test_save_and_load(self):
+        """
+        Test the filters are loaded back with the same columns.
+        """
+        filters = PaperFilters.build(self.records_index)
+        filters_path = join(self.temp_dir.name, 'filters.npz')
+        self.assertIsNone(PaperFilters.load(filters_path))
+        filters.save(filters_path)
+        loaded_filters = PaperFilters.load(filters_path)
+        self.assertEqual(len(loaded_filters), 4)
+        np.testing.assert_array_equal(loaded_filters.publish_days, filters.publish_days)
+        self.assertEqual(loaded_filters.select(authors='roe, r', published_after='2020').tolist(), [1])
+
+
+if __name__ == '__main__':
+    unittest.main()
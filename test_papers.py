@@ -1,35 +1,545 @@
 # Gelin Eguinosa Rosique
 
+import csv
+import shutil
+import tempfile
 import unittest
-from papers import _number_to_3digits
+from os import makedirs, stat
+from os.path import join, isfile, isdir, getsize
+import numpy as np
+from atomic_files import write_json_atomic
+from embeddings_quantization import open_quantized_matrix
+import papers as papers_module
+from papers import (
+    Papers, _metadata_papers, _file_line_chunks, _write_embeddings_range
+)
+from sample_dataset import SamplePapers, create_sample_dataset
+from time_keeper import profiler
 
 
-class NumberToDigitsTestCase(unittest.TestCase):
+class SampleDatasetTestCase(unittest.TestCase):
     """
-    Test for '_number_to3digits'
+    Base of the test cases using the sample dataset, created in a temporary
+    folder for each test.
     """
 
-    def test_one_digit_number(self):
+    def setUp(self) -> None:
         """
-        Test the function when it receives a number with only one digit.
+        Create the sample dataset and point the Papers class to it.
         """
-        result = _number_to_3digits(3)
-        self.assertEqual(result, '003')
+        self.temp_folder = tempfile.mkdtemp()
+        SamplePapers.cord19_data_folder = join(self.temp_folder, 'cord19_data')
+        SamplePapers.project_data_folder = join(self.temp_folder, 'project_data')
+        self.cord_uids = create_sample_dataset(SamplePapers.cord19_data_folder)
 
-    def test_two_digit_number(self):
+    def tearDown(self) -> None:
         """
-        Test the function when it receives a number with two digits.
+        Delete the sample dataset.
         """
-        result = _number_to_3digits(83)
-        self.assertEqual(result, '083')
+        shutil.rmtree(self.temp_folder)
 
-    def test_three_digit_number(self):
+
+class MetadataPapersTestCase(unittest.TestCase):
+    """
+    Test for '_metadata_papers'
+    """
+
+    def test_repeated_papers(self):
+        """
+        Test the rows of a repeated 'cord_uid' are merged, keeping the JSON
+        files found in any of the rows, and the papers keep the order of their
+        first row.
+        """
+        fields = ['cord_uid', 'title', 'abstract', 'publish_time', 'authors',
+                  'pdf_json_files', 'pmc_json_files']
+        rows = [
+            ['a', 'Title A', '', '2020', 'X, Y', 'a.json', ''],
+            ['b', 'Title B', '', '2021', 'Z', '', ''],
+            ['a', 'Title A2', '', '2020', 'X, Y', '', 'PMC1.json'],
+            ['c', 'Title C', '', '2022', 'W', '', ''],
+        ]
+        with tempfile.TemporaryDirectory() as temp_folder:
+            metadata_path = join(temp_folder, 'metadata.csv')
+            with open(metadata_path, 'w', newline='') as file:
+                writer = csv.writer(file)
+                writer.writerow(fields)
+                writer.writerows(rows)
+            papers = list(_metadata_papers(metadata_path))
+
+        self.assertEqual([paper['cord_uid'] for paper in papers], ['a', 'b', 'c'])
+        self.assertEqual(papers[0]['title'], 'Title A2')
+        self.assertEqual(papers[0]['pdf_json_files'], ['a.json'])
+        self.assertEqual(papers[0]['pmc_json_files'], ['PMC1.json'])
+        self.assertNotIn('pdf_json_files', papers[1])
+
+
+class FileLineRangesTestCase(unittest.TestCase):
+    """
+    Test for '_file_line_chunks'
+    """
+
+    def test_ranges_start_at_lines(self):
+        """
+        Test the ranges cover the whole file, start at the beginning of a line
+        and have the same amount of lines (reading the file in any blocks).
+        """
+        lines = [f"line {i} {'x' * (i % 7)}\n" for i in range(50)]
+        with tempfile.TemporaryDirectory() as temp_folder:
+            file_path = join(temp_folder, 'lines.txt')
+            with open(file_path, 'w') as file:
+                file.writelines(lines)
+            with open(file_path, 'rb') as file:
+                content = file.read()
+            for chunk_lines, block_size in [(1, 7), (3, 10), (8, 1024), (100, 5)]:
+                byte_ranges = _file_line_chunks(file_path, chunk_lines, block_size)
+                self.assertEqual(byte_ranges[0][0], 0)
+                self.assertEqual(byte_ranges[-1][1], len(content))
+                self.assertEqual(len(byte_ranges), -(-len(lines) // chunk_lines))
+                range_lines = []
+                for start, end in byte_ranges:
+                    self.assertTrue(start == 0 or content[start - 1:start] == b'\n')
+                    chunk = content[start:end].decode().splitlines(keepends=True)
+                    self.assertEqual(len(chunk), min(chunk_lines, len(lines) - len(range_lines)))
+                    range_lines += chunk
+                self.assertEqual(range_lines, lines)
+
+
+class PapersTestCase(SampleDatasetTestCase):
+    """
+    Test the Papers class using a small synthetic dataset.
+    """
+
+    def test_embeddings_matrix_file(self):
+        """
+        Test the embeddings are saved in the binary matrix and loaded back with
+        the same values as the CSV file.
+        """
+        papers = SamplePapers()
+        self.assertEqual(set(papers.build_times), {'papers_index', 'embeddings_index'})
+        matrix_path = join(SamplePapers.project_data_folder, Papers.embeds_matrix_file)
+        self.assertTrue(isfile(matrix_path))
+        self.assertEqual(papers.embeds_matrix.shape, (len(self.cord_uids), 16))
+
+        embeddings_path = join(
+            SamplePapers.cord19_data_folder, Papers.current_dataset, Papers.embeddings_file
+        )
+        with open(embeddings_path, 'r') as file:
+            first_row = next(csv.reader(file))
+        expected = np.asarray(first_row[1:], dtype=np.float32)
+        # The duplicated embedding at the end of the CSV is skipped.
+        np.testing.assert_array_equal(papers.paper_embedding(first_row[0]), expected)
+
+        # Loading the Papers again uses the saved matrix.
+        papers = SamplePapers()
+        self.assertEqual(papers.build_times, {})
+        np.testing.assert_array_equal(papers.paper_embedding(first_row[0]), expected)
+
+    def test_parallel_build(self):
+        """
+        Test the indexes built with several processes are the same as the ones
+        built in a single process.
+        """
+        serial_papers = SamplePapers()
+        matrix_path = join(SamplePapers.project_data_folder, Papers.embeds_matrix_file)
+        with open(matrix_path, 'rb') as file:
+            serial_matrix = file.read()
+
+        SamplePapers.project_data_folder = join(self.temp_folder, 'parallel_data')
+        parallel_papers = SamplePapers(workers=3)
+        matrix_path = join(SamplePapers.project_data_folder, Papers.embeds_matrix_file)
+        with open(matrix_path, 'rb') as file:
+            self.assertEqual(file.read(), serial_matrix)
+        self.assertEqual(parallel_papers.embeds_index, serial_papers.embeds_index)
+        self.assertEqual(parallel_papers.papers_index, serial_papers.papers_index)
+        self.assertEqual(set(parallel_papers.build_times), {'papers_index', 'embeddings_index'})
+
+    def test_embeddings_matrix(self):
+        """
+        Test the matrix of embeddings keeps the order of the given papers.
+        """
+        papers = SamplePapers()
+        cord_uids = [self.cord_uids[5], self.cord_uids[2], self.cord_uids[9], self.cord_uids[2]]
+        matrix = papers.embeddings_matrix(cord_uids)
+        self.assertEqual(matrix.shape, (4, 16))
+        self.assertEqual(matrix.dtype, np.float32)
+        for cord_uid, embedding in zip(cord_uids, matrix):
+            np.testing.assert_array_equal(embedding, papers.paper_embedding(cord_uid))
+
+        # Check the batches cover all the papers.
+        batches = list(papers.embeddings_batches(batch_size=7))
+        self.assertEqual([len(uids) for uids, _ in batches], [7, 7, 7, 7, 2])
+        batch_uids = [cord_uid for uids, _ in batches for cord_uid in uids]
+        self.assertEqual(batch_uids, self.cord_uids)
+        np.testing.assert_array_equal(batches[1][1], papers.embeddings_matrix(batches[1][0]))
+
+    def test_most_similar(self):
+        """
+        Test the search of similar papers, with the exact and the approximate
+        methods.
+        """
+        papers = SamplePapers()
+        cord_uid = self.cord_uids[4]
+        results = papers.most_similar(cord_uid, k=5)
+        self.assertEqual(len(results), 5)
+        self.assertNotIn(cord_uid, [uid for uid, _ in results])
+        # Check the similarities match a brute-force comparison.
+        query = papers.paper_embedding(cord_uid)
+        for uid, similarity in results:
+            embedding = papers.paper_embedding(uid)
+            expected = query @ embedding / np.linalg.norm(query) / np.linalg.norm(embedding)
+            self.assertAlmostEqual(similarity, expected, 5)
+
+        # Visiting all the lists, the approximate search is exact.
+        approx_results = papers.most_similar(cord_uid, k=5, approximate=True, n_probe=100)
+        self.assertEqual([uid for uid, _ in approx_results], [uid for uid, _ in results])
+        ivf_path = join(SamplePapers.project_data_folder, Papers.embeds_ivf_file)
+        self.assertTrue(isfile(ivf_path))
+
+    def test_text_store(self):
+        """
+        Test the content of the papers is the same using the text store.
+        """
+        papers = SamplePapers(cache_bytes=0)
+        self.assertIsNone(papers.text_store)
+        json_contents = list(papers.all_papers_content())
+        papers.build_text_store()
+        self.assertIsNotNone(papers.text_store)
+        self.assertEqual(list(papers.all_papers_content()), json_contents)
+
+        # Build the store with several processes and open it again.
+        papers.build_text_store(workers=2)
+        papers = SamplePapers(cache_bytes=0)
+        self.assertIsNotNone(papers.text_store)
+        self.assertEqual(list(papers.all_papers_content()), json_contents)
+
+    def test_parallel_iterators(self):
+        """
+        Test the iterators return the same documents using threads and
+        processes.
+        """
+        papers = SamplePapers(cache_bytes=0)
+        full_texts = list(papers.all_papers_full_text())
+        self.assertEqual(list(papers.all_papers_full_text(workers=3, prefetch=2)), full_texts)
+        self.assertEqual(list(papers.all_papers_full_text(workers=2, processes=True)), full_texts)
+        # Without a pool, the papers are read with the same instance.
+        self.assertEqual(list(papers.all_papers_full_text(processes=True)), full_texts)
+        self.assertIsNone(papers_module._worker_papers)
+        unordered_texts = dict(papers.all_papers_content(workers=3, unordered=True))
+        self.assertEqual(unordered_texts[self.cord_uids[5]], papers.paper_content(self.cord_uids[5]))
+        self.assertEqual(len(unordered_texts), len(self.cord_uids))
+
+    def test_update_dataset(self):
+        """
+        Test the indexes are updated with the changes of a new release of the
+        dataset.
+        """
+        papers = SamplePapers()
+        papers.build_text_store()
+        papers.cluster_embeddings(n_clusters=2)
+        papers.export_passages()
+        papers.search('title')
+        papers.most_similar(self.cord_uids[0], approximate=True)
+        papers.most_similar(self.cord_uids[0], pq=True)
+        old_fingerprint = papers.ivf_search.fingerprint
+        old_embedding = np.array(papers.paper_embedding(self.cord_uids[3]))
+        # Create the new release, changing, removing and adding papers.
+        old_folder = join(SamplePapers.cord19_data_folder, Papers.current_dataset)
+        new_folder = join(SamplePapers.cord19_data_folder, '2020-06-07')
+        shutil.copytree(old_folder, new_folder)
+        with open(join(old_folder, Papers.metadata_file), 'r') as file:
+            metadata_rows = list(csv.DictReader(file))
+        metadata_rows[1]['title'] = 'New title of paper 1'
+        del metadata_rows[2]
+        metadata_rows.append(dict(metadata_rows[0], cord_uid='new001', title='New paper'))
+        with open(join(new_folder, Papers.metadata_file), 'w', newline='') as file:
+            writer = csv.DictWriter(file, fieldnames=list(metadata_rows[0]))
+            writer.writeheader()
+            writer.writerows(metadata_rows)
+        with open(join(old_folder, Papers.embeddings_file), 'r') as file:
+            embeds_rows = list(csv.reader(file))
+        embeds_rows[3][1:] = ['0.5'] * 16
+        del embeds_rows[2]
+        embeds_rows.append(['new001'] + ['0.25'] * 16)
+        with open(join(new_folder, 'cord_19_embeddings_2020-06-07.csv'), 'w', newline='') as file:
+            csv.writer(file).writerows(embeds_rows)
+
+        changes = papers.update_dataset('2020-06-07')
+        expected = {'added': 1, 'replaced': 1, 'removed': 1, 'unchanged': len(self.cord_uids) - 2}
+        self.assertEqual(changes, {'papers': expected, 'embeddings': expected})
+        self.assertNotIn(self.cord_uids[2], papers.papers_index)
+        self.assertEqual(papers.paper_title_abstract('new001'), 'New paper\n\nAbstract of paper 0')
+        self.assertEqual(papers.papers_index[self.cord_uids[1]]['title'], 'New title of paper 1')
+        self.assertEqual(papers.paper_content('new001'), papers.paper_content(self.cord_uids[0]))
+        np.testing.assert_array_equal(papers.paper_embedding(self.cord_uids[3]), [0.5] * 16)
+        self.assertFalse(np.array_equal(papers.paper_embedding(self.cord_uids[3]), old_embedding))
+        self.assertNotIn(self.cord_uids[2], papers.embeds_index)
+        # The removed and replaced embeddings are not in the search results.
+        similar_uids = [uid for uid, _ in papers.most_similar(old_embedding, k=len(self.cord_uids))]
+        self.assertEqual(len(similar_uids), len(papers.embeds_index))
+        self.assertNotIn(self.cord_uids[2], similar_uids)
+        # The amount of embeddings is the same, but the clusters are outdated.
+        self.assertEqual(len(papers.embeds_index), len(self.cord_uids))
+        self.assertIsNone(papers.embeddings_clusters())
+        self.assertIsNone(papers.passage_store())
+        # The approximate indexes are built again for the new embeddings.
+        papers.most_similar(self.cord_uids[0], approximate=True)
+        papers.most_similar(self.cord_uids[0], pq=True)
+        self.assertNotEqual(papers.ivf_search.fingerprint, old_fingerprint)
+        self.assertEqual(len(papers.pq_search), len(papers.embeds_matrix))
+
+        # Open the updated indexes, and check a second update changes nothing.
+        papers = SamplePapers()
+        self.assertEqual(papers.current_dataset, '2020-06-07')
+        self.assertIsNotNone(papers.text_store)
+        self.assertEqual(papers.papers_index[self.cord_uids[1]]['title'], 'New title of paper 1')
+        self.assertIn(self.cord_uids[1], [cord_uid for cord_uid, _ in papers.search('new', k=2)])
+        self.assertEqual(papers.update_dataset('2020-06-07'), {})
+
+    def test_interrupted_update(self):
+        """
+        Test an update that fails leaves the current indexes as they were, and
+        the derived indexes are created again after an update that only
+        removes papers.
         """
-        Test the function when it receives a number with 3 digits.
+        papers = SamplePapers()
+        papers.find_duplicates()
+        old_folder = join(SamplePapers.cord19_data_folder, Papers.current_dataset)
+        new_folder = join(SamplePapers.cord19_data_folder, '2020-06-07')
+        shutil.copytree(old_folder, new_folder)
+        with open(join(old_folder, Papers.metadata_file), 'r') as file:
+            metadata_rows = list(csv.DictReader(file))
+        del metadata_rows[2]
+        with open(join(new_folder, Papers.metadata_file), 'w', newline='') as file:
+            writer = csv.DictWriter(file, fieldnames=list(metadata_rows[0]))
+            writer.writeheader()
+            writer.writerows(metadata_rows)
+        # The embeddings of the new release have the wrong size.
+        new_embeddings_path = join(new_folder, 'cord_19_embeddings_2020-06-07.csv')
+        with open(new_embeddings_path, 'w', newline='') as file:
+            csv.writer(file).writerow(['new001'] + ['0.25'] * 8)
+        with self.assertRaises(ValueError):
+            papers.update_dataset('2020-06-07')
+        papers = SamplePapers.open()
+        self.assertEqual(papers.current_dataset, Papers.current_dataset)
+        self.assertIn(self.cord_uids[2], papers.papers_index)
+
+        # Only remove a paper (the total of rows is the same).
+        shutil.copyfile(
+            join(old_folder, Papers.embeddings_file), new_embeddings_path
+        )
+        papers = SamplePapers()
+        total_rows = papers.papers_index.total_rows
+        old_fingerprint = papers.paper_duplicates().fingerprint
+        papers.update_dataset('2020-06-07')
+        self.assertEqual(papers.papers_index.total_rows, total_rows)
+        self.assertNotEqual(papers.paper_duplicates().fingerprint, old_fingerprint)
+        self.assertEqual(SamplePapers.open().build_times, {})
+
+    def test_search(self):
+        """
+        Test the keyword search over the papers.
+        """
+        papers = SamplePapers()
+        results = papers.search('title paper 7', k=3, fields=['title'])
+        self.assertEqual(results[0][0], self.cord_uids[7])
+        results = papers.search(f"paragraph {self.cord_uids[4]}", k=1, fields=['body'])
+        self.assertEqual(results[0][0], self.cord_uids[4])
+        bm25_path = join(SamplePapers.project_data_folder, Papers.bm25_index_folder)
+        self.assertTrue(isfile(join(bm25_path, 'meta.json')))
+
+    def test_filter(self):
         """
-        result = _number_to_3digits(837)
-        self.assertEqual(result, '837')
+        Test the selection of papers with the columnar indexes.
+        """
+        papers = SamplePapers()
+        cord_uids = papers.filter(published_after='2020-03', published_before='2020-05-01', has_pmc=True)
+        expected = [
+            cord_uid for i, cord_uid in enumerate(self.cord_uids)
+            if 3 <= 1 + i % 9 < 5 and i % 3 != 0
+        ]
+        self.assertEqual(cord_uids.tolist(), expected)
+        cord_uids = papers.filter(authors='author, 3', has_full_text=True)
+        expected = [
+            cord_uid for i, cord_uid in enumerate(self.cord_uids)
+            if 3 in (i % 5, i % 7) and (i % 3 != 0 or i % 2 == 0)
+        ]
+        self.assertEqual(cord_uids.tolist(), expected)
+        # The selected papers can be used with the iterators.
+        titles = list(papers.all_papers_title_abstract(cord_uids[:2]))
+        self.assertTrue(titles[1].startswith('Title of paper 10'))
+        self.assertTrue(isfile(join(SamplePapers.project_data_folder, Papers.paper_filters_file)))
+
+    def test_paper_content(self):
+        """
+        Test the body text of a paper is extracted with its section names.
+        """
+        papers = SamplePapers()
+        content = papers.paper_content(self.cord_uids[1])
+        self.assertTrue(content.startswith('<< Section 0 >>\nParagraph 0'))
+        self.assertEqual(content.count('<< '), 2)
+        # The second time, the content comes from the cache.
+        self.assertEqual(papers.paper_content(self.cord_uids[1]), content)
+        self.assertEqual(papers.cache.stats()['hits'], 1)
+        full_text = papers.paper_full_text(self.cord_uids[1])
+        self.assertTrue(full_text.startswith('Title of paper 1\n\nAbstract of paper 1'))
+
+    def test_embeddings_modes(self):
+        """
+        Test the compressed formats of the embeddings are close to the float32
+        embeddings, and the accuracy report of the formats.
+        """
+        papers = SamplePapers()
+        cord_uid = self.cord_uids[4]
+        embedding = papers.paper_embedding(cord_uid)
+        for mode, tolerance in [('float16', 1e-2), ('int8', 5e-2)]:
+            mode_papers = SamplePapers(embeds_mode=mode)
+            self.assertEqual(mode_papers.embeds_vectors.codes.dtype.name, mode)
+            mode_embedding = mode_papers.paper_embedding(cord_uid)
+            self.assertEqual(mode_embedding.dtype, np.float32)
+            np.testing.assert_allclose(mode_embedding, embedding, atol=tolerance)
+            self.assertEqual(len(mode_papers.most_similar(cord_uid, k=5)), 5)
+            # The approximate index is built again for the vectors of the mode.
+            mode_papers.most_similar(cord_uid, k=5, approximate=True)
+            self.assertTrue(mode_papers.ivf_search.fingerprint.endswith(f":{mode}"))
+        self.assertIsNone(open_quantized_matrix(
+            'float16', join(SamplePapers.project_data_folder, Papers.embeds_i8_file), 16
+        ))
+        papers.most_similar(cord_uid, k=5, approximate=True)
+        self.assertTrue(papers.ivf_search.fingerprint.endswith(':float32'))
+        # The product quantization search.
+        pq_results = papers.most_similar(cord_uid, k=5, pq=True)
+        self.assertEqual(len(pq_results), 5)
+        self.assertNotIn(cord_uid, [uid for uid, _ in pq_results])
+        self.assertTrue(isfile(join(SamplePapers.project_data_folder, Papers.embeds_pq_file)))
+
+        report = papers.quantization_report(n_queries=10, k=5)
+        self.assertEqual(set(report), {'float32', 'float16', 'int8', 'pq'})
+        self.assertEqual(report['float16']['compression'], 2.0)
+        self.assertGreater(report['int8']['compression'], 3.0)
+        self.assertGreater(report['float16']['recall_at_5'], 0.9)
+        self.assertLess(report['float16']['max_cosine_error'], 1e-2)
+
+        with self.assertRaises(ValueError):
+            SamplePapers(embeds_mode='float8')
+
+    def test_profiler_spans(self):
+        """
+        Test the build of the indexes and the access to the content of the
+        papers are recorded by the profiler.
+        """
+        profiler.reset()
+        profiler.enable()
+        try:
+            papers = SamplePapers()
+            papers.paper_content(self.cord_uids[1])
+        finally:
+            profiler.disable()
+        stats = profiler.stats()
+        profiler.reset()
+        for path in ['papers_index', 'embeddings_index/csv_parse', 'embeddings_index/json_dump',
+                     'paper_content/json_parse', 'paper_content/text_assembly']:
+            self.assertIn(path, stats)
+
+    def test_lazy_open(self):
+        """
+        Test the indexes are opened the first time they are used, and the
+        read-only mode never builds them.
+        """
+        # Nothing was built yet.
+        with self.assertRaises(FileNotFoundError):
+            SamplePapers.open()
+        SamplePapers()
+        papers = SamplePapers.open()
+        self.assertTrue(papers.readonly)
+        self.assertEqual(papers.build_times, {})
+        self.assertIsNone(papers._papers_index)
+        self.assertIsNone(papers._embeds_index)
+        # Using the embeddings doesn't open the papers' index.
+        self.assertEqual(len(papers.paper_embedding(self.cord_uids[0])), 16)
+        self.assertIsNone(papers._papers_index)
+        self.assertTrue(papers.paper_title_abstract(self.cord_uids[2]).startswith('Title of paper 2'))
+        # The derived indexes can't be built in read-only mode.
+        with self.assertRaises(FileNotFoundError):
+            papers.search('paragraph')
+        with self.assertRaises(FileNotFoundError):
+            SamplePapers.open(embeds_mode='int8')
+
+    def test_corrupted_index(self):
+        """
+        Test the indexes with truncated or modified files are built again, and
+        are not opened in read-only mode.
+        """
+        papers = SamplePapers()
+        expected = papers.paper_embedding(self.cord_uids[3])
+        embeds_index_path = join(SamplePapers.project_data_folder, Papers.embeds_index_file)
+        with open(embeds_index_path, 'r+') as file:
+            file.truncate(getsize(embeds_index_path) // 2)
+        with self.assertRaises(FileNotFoundError):
+            SamplePapers.open()
+        papers = SamplePapers()
+        self.assertEqual(set(papers.build_times), {'embeddings_index'})
+        np.testing.assert_array_equal(papers.paper_embedding(self.cord_uids[3]), expected)
+        self.assertFalse(isdir(join(SamplePapers.project_data_folder, Papers.embeds_build_folder)))
+
+        # Overwrite the start of the matrix (same size).
+        matrix_path = join(SamplePapers.project_data_folder, Papers.embeds_matrix_file)
+        with open(matrix_path, 'r+b') as file:
+            file.write(b'\x00' * 64)
+        papers = SamplePapers()
+        self.assertEqual(set(papers.build_times), {'embeddings_index'})
+        self.assertEqual(SamplePapers.open().build_times, {})
+
+    def test_resume_embeddings_build(self):
+        """
+        Test the parts of the embeddings completed by an interrupted build are
+        reused (by a build with a different amount of processes), the parts
+        that are incomplete are parsed again, and the matrix is the same as
+        the one built in a single part.
+        """
+        class PartsPapers(SamplePapers):
+            embeds_part_lines = 3
+
+        expected_matrix = np.array(SamplePapers().embeds_matrix)
+        PartsPapers.project_data_folder = join(self.temp_folder, 'parts_data')
+        embeddings_path = join(
+            PartsPapers.cord19_data_folder, Papers.current_dataset, Papers.embeddings_file
+        )
+        byte_ranges = _file_line_chunks(embeddings_path, PartsPapers.embeds_part_lines)
+        self.assertGreater(len(byte_ranges), 3)
+
+        # Leave the first part of an interrupted build, with its embeddings
+        # replaced by zeros, to see it is not parsed again.
+        build_path = join(PartsPapers.project_data_folder, Papers.embeds_build_folder)
+        makedirs(build_path)
+        file_stat = stat(embeddings_path)
+        write_json_atomic(join(build_path, 'build.json'), {
+            'embeddings_path': embeddings_path,
+            'size': file_stat.st_size,
+            'mtime': file_stat.st_mtime,
+            'part_lines': PartsPapers.embeds_part_lines,
+        })
+        part_paths = [join(build_path, f"embeddings_part_{part:05d}.f32") for part in range(3)]
+        start, end = byte_ranges[0]
+        part_uids, _ = _write_embeddings_range(embeddings_path, start, end, part_paths[0], 4096)
+        with open(part_paths[0], 'r+b') as file:
+            file.write(b'\x00' * getsize(part_paths[0]))
+        # A part that wasn't completed is parsed again.
+        with open(part_paths[1], 'wb') as file:
+            file.write(b'\x00' * 8)
+        # A complete part that was truncated is also parsed again.
+        start, end = byte_ranges[2]
+        _write_embeddings_range(embeddings_path, start, end, part_paths[2], 4096)
+        with open(part_paths[2], 'r+b') as file:
+            file.truncate(getsize(part_paths[2]) - 4)
 
+        papers = PartsPapers(workers=2)
+        self.assertFalse(isdir(build_path))
+        first_rows = len(part_uids)
+        self.assertFalse(papers.embeds_matrix[:first_rows].any())
+        np.testing.assert_array_equal(
+            papers.embeds_matrix[first_rows:], expected_matrix[first_rows:]
+        )
+        self.assertEqual(papers.embeds_index, SamplePapers().embeds_index)
 
 if __name__ == '__main__':
     unittest.main()
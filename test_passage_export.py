@@ -0,0 +1,131 @@
+# Gelin Eguinosa Rosique
+
+import shutil
+import tempfile
+import unittest
+from os.path import join, isfile
+import numpy as np
+from passage_export import RegexTokenizer, PassageStore, export_passages, _paragraph_parts
+from sample_dataset import SamplePapers, create_sample_dataset
+
+
+class CharTokenizer:
+    """
+    Tokenizer of the characters of a text, without 'encode_spans()'.
+    """
+
+    def encode(self, text):
+        return [ord(char) for char in text]
+
+    def save(self, folder):
+        pass
+
+
+class PassageExportTestCase(unittest.TestCase):
+    """
+    Test the export of the papers' passages.
+    """
+
+    def setUp(self) -> None:
+        """
+        Create a temporary folder.
+        """
+        self.temp_folder = tempfile.mkdtemp()
+
+    def tearDown(self) -> None:
+        """
+        Delete the temporary folder.
+        """
+        shutil.rmtree(self.temp_folder)
+
+    def test_tokenizer(self):
+        """
+        Test the tokenizer gives the same id to the same token, and is saved.
+        """
+        tokenizer = RegexTokenizer()
+        self.assertEqual(tokenizer.encode("The virus, the Host"), [1, 2, 1, 3])
+        tokenizer.save(self.temp_folder)
+        loaded = RegexTokenizer.load(self.temp_folder)
+        self.assertEqual(loaded.encode("host virus"), [3, 2])
+        self.assertEqual(RegexTokenizer(r'\S+').encode("a, b"), [1, 2])
+
+    def test_passages(self):
+        """
+        Test the paragraphs are joined by section, the long ones are split, and
+        the passages are distributed in shards.
+        """
+        long_text = ' '.join(f"word{i}" for i in range(25))
+        papers_paragraphs = [
+            ('paper1', [('Intro', 'one two'), ('Intro', 'three four'), ('Methods', long_text)]),
+            ('paper2', [('Intro', 'five six seven')]),
+        ]
+        folder = join(self.temp_folder, 'passages')
+        total = export_passages(folder, papers_paragraphs, max_tokens=10, shard_tokens=12)
+        self.assertEqual(total, 5)
+        store = PassageStore(folder)
+        self.assertEqual(len(store), 5)
+        self.assertEqual(store.passage_info(0), ('paper1', 'Intro'))
+        self.assertEqual(store.passage_text(0), 'one two\nthree four')
+        self.assertEqual(store.passage_tokens(0).tolist(), [1, 2, 3, 4])
+        # The long paragraph is split in three parts.
+        self.assertEqual([int(length) for length in store.lengths], [4, 10, 10, 5, 3])
+        self.assertEqual(store.passage_text(3), 'word20 word21 word22 word23 word24')
+        self.assertEqual(store.passage_info(4), ('paper2', 'Intro'))
+        self.assertGreater(store.meta['shards'], 1)
+        self.assertEqual(store.passage_text(4), 'five six seven')
+        self.assertEqual(sum(len(tokens) for tokens in store.iter_tokens(shuffle=True, seed=0)), 32)
+        self.assertIsInstance(store.passage_tokens(1), np.memmap)
+
+    def test_paragraph_parts(self):
+        """
+        Test the parts of a long paragraph keep all its tokens, and the text of
+        each part has the tokens of the part.
+        """
+        text = ' '.join(f"Token {i}, (x{i}) y." for i in range(125))
+        tokenizer = RegexTokenizer()
+        token_ids = tokenizer.encode(text)
+        self.assertEqual(len(token_ids), 500)
+        parts = _paragraph_parts(text, tokenizer, 128)
+        self.assertEqual([len(part_ids) for _, part_ids in parts], [128, 128, 128, 116])
+        self.assertEqual(parts[1][0][:10], 'Token 32, ')
+        # Join the parts of the default tokenizer and of a pattern.
+        for part_tokenizer in [tokenizer, RegexTokenizer(r'[^\s,]+')]:
+            parts = _paragraph_parts(text, part_tokenizer, 128)
+            all_ids = [token_id for _, part_ids in parts for token_id in part_ids]
+            self.assertEqual(all_ids, part_tokenizer.encode(text))
+            for part_text, part_ids in parts:
+                self.assertEqual(part_tokenizer.encode(part_text), part_ids)
+
+        # A tokenizer without spans, with more windows than words.
+        char_text = 'abc' * 201
+        parts = _paragraph_parts(char_text, CharTokenizer(), 256)
+        self.assertEqual([len(part_ids) for _, part_ids in parts], [256, 256, 91])
+        folder = join(self.temp_folder, 'chars')
+        total = export_passages(folder, [('paper1', [('Intro', char_text)])], CharTokenizer(), 256)
+        self.assertEqual(total, 3)
+        self.assertEqual(int(PassageStore(folder).lengths.sum()), len(char_text))
+
+    def test_papers_export(self):
+        """
+        Test the export of the sample papers.
+        """
+        SamplePapers.cord19_data_folder = join(self.temp_folder, 'cord19_data')
+        SamplePapers.project_data_folder = join(self.temp_folder, 'project_data')
+        cord_uids = create_sample_dataset(SamplePapers.cord19_data_folder)
+        papers = SamplePapers()
+        self.assertIsNone(papers.passage_store())
+        store = papers.export_passages(max_tokens=64, workers=2)
+        self.assertEqual(store.meta['cord_uids'], list(papers.papers_index))
+        # The title, the abstract and the two sections of the second paper.
+        paper_passages = [i for i in range(len(store)) if store.passage_info(i)[0] == cord_uids[1]]
+        self.assertEqual(
+            [store.passage_info(i)[1] for i in paper_passages],
+            ['Title', 'Abstract', 'Section 0', 'Section 1']
+        )
+        self.assertEqual(store.passage_text(paper_passages[0]), 'Title of paper 1')
+        self.assertTrue(isfile(join(store.folder, RegexTokenizer.vocab_file)))
+        self.assertEqual(len(papers.passage_store()), len(store))
+
+
+if __name__ == '__main__':
+    unittest.main()
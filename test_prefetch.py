@@ -0,0 +1,70 @@
+# Gelin Eguinosa Rosique
+
+import time
+import unittest
+from prefetch import prefetch_map
+
+
+def _slow_square(number):
+    """
+    Square a number, taking longer for the even ones.
+    """
+    if number % 2 == 0:
+        time.sleep(0.01)
+    return number * number
+
+
+class PrefetchMapTestCase(unittest.TestCase):
+    """
+    Test for 'prefetch_map'
+    """
+
+    def test_ordered_results(self):
+        """
+        Test the results keep the order of the items with threads and
+        processes.
+        """
+        expected = [number * number for number in range(20)]
+        self.assertEqual(list(prefetch_map(_slow_square, range(20))), expected)
+        self.assertEqual(list(prefetch_map(_slow_square, range(20), workers=4, prefetch=3)), expected)
+        results = prefetch_map(_slow_square, range(20), workers=2, processes=True)
+        self.assertEqual(list(results), expected)
+
+    def test_serial_initializer(self):
+        """
+        Test the initializer is only called by the workers of a pool.
+        """
+        calls = []
+        results = prefetch_map(_slow_square, range(5), initializer=calls.append, initargs=(1,))
+        self.assertEqual(list(results), [0, 1, 4, 9, 16])
+        self.assertEqual(calls, [])
+        results = prefetch_map(_slow_square, range(5), workers=2, initializer=calls.append, initargs=(1,))
+        self.assertEqual(list(results), [0, 1, 4, 9, 16])
+        self.assertEqual(set(calls), {1})
+
+    def test_unordered_results(self):
+        """
+        Test all the results are returned in unordered mode.
+        """
+        results = list(prefetch_map(_slow_square, range(20), workers=4, unordered=True))
+        self.assertEqual(sorted(results), [number * number for number in range(20)])
+
+    def test_bounded_prefetch(self):
+        """
+        Test the pool doesn't consume more items than the prefetch allows.
+        """
+        consumed = []
+
+        def items():
+            for number in range(100):
+                consumed.append(number)
+                yield number
+
+        results = prefetch_map(_slow_square, items(), workers=2, prefetch=4)
+        self.assertEqual(next(results), 0)
+        self.assertLessEqual(len(consumed), 5)
+        results.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,68 @@
+# Gelin Eguinosa Rosique
+
+import tempfile
+import unittest
+from os.path import join
+from records_index import RecordsIndex, RecordsWriter
+
+
+class RecordsIndexTestCase(unittest.TestCase):
+    """
+    Test the writing and reading of the binary index of the papers.
+    """
+
+    def setUp(self) -> None:
+        """
+        Create a temporary folder for the index.
+        """
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.index_folder = join(self.temp_dir.name, 'papers_index')
+        self.papers = [
+            {'cord_uid': 'a1', 'title': 'Título', 'abstract': 'Abstract A',
+             'publish_time': '2020-03-01', 'authors': ['Doe, J', 'Roe, R'],
+             'pdf_json_files': ['a.json']},
+            {'cord_uid': 'b2', 'title': 'Title B', 'abstract': '',
+             'publish_time': '2021', 'authors': [''],
+             'pmc_json_files': ['PMC1.xml.json', 'PMC2.xml.json']},
+        ]
+
+    def tearDown(self) -> None:
+        """
+        Delete the temporary folder.
+        """
+        self.temp_dir.cleanup()
+
+    def test_write_and_read(self):
+        """
+        Test the papers are read back with the same information.
+        """
+        self.assertFalse(RecordsIndex.exists(self.index_folder))
+        with RecordsWriter(self.index_folder) as writer:
+            for paper_dict in self.papers:
+                writer.add(paper_dict)
+        self.assertTrue(RecordsIndex.exists(self.index_folder))
+
+        records_index = RecordsIndex(self.index_folder)
+        self.assertEqual(len(records_index), 2)
+        self.assertEqual(list(records_index), ['a1', 'b2'])
+        self.assertIn('b2', records_index)
+        self.assertNotIn('c3', records_index)
+        for paper_dict in self.papers:
+            self.assertEqual(records_index[paper_dict['cord_uid']], paper_dict)
+        # Decode a single field.
+        self.assertEqual(records_index.field_value('title', 0), 'Título')
+        self.assertEqual(records_index.field_value('pmc_json_files', 1), 'PMC1.xml.json; PMC2.xml.json')
+
+    def test_empty_index(self):
+        """
+        Test an index without papers can be opened.
+        """
+        RecordsWriter(self.index_folder).close()
+        records_index = RecordsIndex(self.index_folder)
+        self.assertEqual(len(records_index), 0)
+        with self.assertRaises(KeyError):
+            _ = records_index['a1']
+
+
+if __name__ == '__main__':
+    unittest.main()
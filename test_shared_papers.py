@@ -0,0 +1,67 @@
+# Gelin Eguinosa Rosique
+
+import unittest
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import shared_papers
+from shared_papers import SharedPapers, init_shared_worker
+from sample_dataset import SamplePapers
+from test_papers import SampleDatasetTestCase
+
+
+def _worker_paper(cord_uid):
+    """
+    Get the embedding and title of a paper in a process attached to the store.
+    """
+    papers = shared_papers.shared_worker_papers
+    return papers.paper_embedding(cord_uid).tolist(), papers.paper_title_abstract(cord_uid)
+
+
+class SharedPapersTestCase(SampleDatasetTestCase):
+    """
+    Test the papers shared between processes.
+    """
+
+    def setUp(self) -> None:
+        """
+        Create the sample dataset and its indexes.
+        """
+        super().setUp()
+        self.papers = SamplePapers()
+
+    def test_shared_papers(self):
+        """
+        Test the shared papers return the same information as the Papers class,
+        with the embeddings memory-mapped or copied to the shared memory.
+        """
+        for copy_embeddings in [False, True]:
+            with self.papers.shared_store(copy_embeddings=copy_embeddings) as store:
+                with SharedPapers(store.handle) as papers:
+                    self.assertEqual(len(papers), 30)
+                    self.assertIn(self.cord_uids[3], papers)
+                    self.assertNotIn('missing', papers)
+                    for cord_uid in self.cord_uids[:5]:
+                        np.testing.assert_array_equal(
+                            papers.paper_embedding(cord_uid), self.papers.paper_embedding(cord_uid)
+                        )
+                        self.assertEqual(
+                            papers.paper_title_abstract(cord_uid),
+                            self.papers.paper_title_abstract(cord_uid)
+                        )
+                    with self.assertRaises(KeyError):
+                        papers.paper_embedding('missing')
+
+    def test_pool_workers(self):
+        """
+        Test the processes of a pool attach to the store.
+        """
+        with self.papers.shared_store() as store:
+            with ProcessPoolExecutor(2, initializer=init_shared_worker, initargs=(store.handle,)) as executor:
+                results = list(executor.map(_worker_paper, self.cord_uids[:6]))
+        for cord_uid, (embedding, title_abstract) in zip(self.cord_uids[:6], results):
+            self.assertEqual(embedding, self.papers.paper_embedding(cord_uid).tolist())
+            self.assertEqual(title_abstract, self.papers.paper_title_abstract(cord_uid))
+
+
+if __name__ == '__main__':
+    unittest.main()
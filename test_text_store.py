@@ -0,0 +1,55 @@
+# Gelin Eguinosa Rosique
+
+import tempfile
+import unittest
+from os.path import join
+from text_store import TextStore, TextWriter, compress_paragraphs, render_body_text
+
+
+class RenderBodyTextTestCase(unittest.TestCase):
+    """
+    Test for 'render_body_text'
+    """
+
+    def test_section_names(self):
+        """
+        Test the name of a section is only added before its first paragraph.
+        """
+        paragraphs = [('', 'Intro'), ('Methods', 'M1'), ('Methods', 'M2'), ('Results', 'R1')]
+        body_text = render_body_text(paragraphs)
+        expected = 'Intro\n\n<< Methods >>\nM1\n\nM2\n\n<< Results >>\nR1\n\n'
+        self.assertEqual(body_text, expected)
+        self.assertEqual(render_body_text([]), '')
+
+
+class TextStoreTestCase(unittest.TestCase):
+    """
+    Test the writing and reading of the text store.
+    """
+
+    def test_write_and_read(self):
+        """
+        Test the paragraphs of the papers are read back in the same order.
+        """
+        papers_paragraphs = [
+            [('Intro', 'First paragraph.'), ('Intro', 'Second\nparagraph.')],
+            [],
+            [('Sección', 'Text with a \x1e separator.')],
+        ]
+        with tempfile.TemporaryDirectory() as temp_folder:
+            store_folder = join(temp_folder, 'papers_text')
+            self.assertFalse(TextStore.exists(store_folder))
+            with TextWriter(store_folder) as text_writer:
+                for paragraphs in papers_paragraphs:
+                    text_writer.add(compress_paragraphs(paragraphs))
+            self.assertTrue(TextStore.exists(store_folder))
+
+            text_store = TextStore(store_folder)
+            self.assertEqual(len(text_store), 3)
+            self.assertEqual(text_store.paragraphs(0), papers_paragraphs[0])
+            self.assertEqual(text_store.paragraphs(1), [])
+            self.assertEqual(text_store.paragraphs(2), [('Sección', 'Text with a   separator.')])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,8 +1,11 @@
 # Gelin Eguinosa Rosique
 
+import json
+import tempfile
 import unittest
 import time
-from time_keeper import TimeKeeper
+from os.path import join
+from time_keeper import TimeKeeper, Profiler
 
 class TestTimeKeeper(unittest.TestCase):
     """
@@ -55,6 +58,80 @@ class TestTimeKeeper(unittest.TestCase):
         self.assertAlmostEqual(0, self.stopwatch.total_runtime(), 2)
 
 
+class TestProfiler(unittest.TestCase):
+    """
+    Test the Profiler records nested spans and exports them.
+    """
+
+    def test_disabled(self):
+        """
+        Test a disabled profiler doesn't record anything.
+        """
+        profiler = Profiler()
+        with profiler.span('phase'):
+            pass
+
+        @profiler.profile()
+        def function(value):
+            return value * 2
+
+        self.assertEqual(function(3), 6)
+        self.assertEqual(profiler.stats(), {})
+
+    def test_nested_spans(self):
+        """
+        Test the spans are aggregated by their path, with the decorator and the
+        context manager.
+        """
+        profiler = Profiler(enabled=True)
+
+        @profiler.profile('inner')
+        def inner():
+            time.sleep(0.001)
+
+        for _ in range(3):
+            with profiler.span('outer'):
+                inner()
+        inner()
+        stats = profiler.stats()
+        self.assertEqual(set(stats), {'outer', 'outer/inner', 'inner'})
+        self.assertEqual(stats['outer/inner']['count'], 3)
+        self.assertEqual(stats['inner']['count'], 1)
+        self.assertGreaterEqual(stats['outer']['total_ms'], stats['outer/inner']['total_ms'])
+        self.assertLessEqual(stats['outer']['p50_ms'], stats['outer']['p99_ms'])
+
+        # Export the spans.
+        with tempfile.TemporaryDirectory() as temp_folder:
+            trace_path = join(temp_folder, 'trace.json')
+            profiler.export_chrome_trace(trace_path)
+            with open(trace_path, 'r') as file:
+                trace = json.load(file)
+            self.assertEqual(len(trace['traceEvents']), 7)
+            self.assertEqual(trace['traceEvents'][0]['ph'], 'X')
+            stats_path = join(temp_folder, 'stats.json')
+            profiler.export_json(stats_path)
+            with open(stats_path, 'r') as file:
+                self.assertEqual(json.load(file)['inner']['count'], 1)
+
+        profiler.reset()
+        self.assertEqual(profiler.stats(), {})
+
+    def test_bounded_samples(self):
+        """
+        Test the profiler keeps a bounded sample of the durations of each path,
+        with the exact count and maximum.
+        """
+        profiler = Profiler(enabled=True, max_samples=50)
+        for duration_ns in range(1, 1001):
+            profiler._record('phase', 'phase', 0, duration_ns * 1000)
+        self.assertEqual(len(profiler.durations['phase'][3]), 50)
+        stats = profiler.stats()['phase']
+        self.assertEqual(stats['count'], 1000)
+        self.assertAlmostEqual(stats['total_ms'], 500.5)
+        self.assertAlmostEqual(stats['max_ms'], 1.0)
+        self.assertLess(abs(stats['p50_ms'] - 0.5), 0.2)
+
+
 if __name__ == '__main__':
     # Run the test for the 'TimeKeeper' class
     unittest.main()
@@ -0,0 +1,153 @@
+# Gelin Eguinosa Rosique
+
+import mmap
+import zlib
+from os import mkdir
+from os.path import join, isdir, isfile, getsize
+import numpy as np
+
+
+class TextStore:
+    """
+    Read the body text of the papers from a compressed, append-only blob file.
+    Each paper is saved as a zlib block with its paragraphs and the names of
+    their sections, and the offsets table has the position of each block, so a
+    paper is read with a seek and a decompression.
+    """
+    # The files of the store.
+    blob_file = 'paragraphs.blob'
+    offsets_file = 'paragraphs.offsets'
+    # The separators of the paragraphs, and of the section and the text of a
+    # paragraph.
+    paragraph_separator = '\x1e'
+    section_separator = '\x1f'
+
+    def __init__(self, store_folder):
+        """
+        Memory-map the files of the store.
+        :param store_folder: The folder with the files of the store.
+        """
+        self.store_folder = store_folder
+        blob_path = join(store_folder, self.blob_file)
+        offsets_path = join(store_folder, self.offsets_file)
+        self.offsets = np.memmap(offsets_path, dtype=np.uint64, mode='r')
+        self.blob = b''
+        if getsize(blob_path):
+            with open(blob_path, 'rb') as file:
+                self.blob = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    @classmethod
+    def exists(cls, store_folder):
+        """
+        Check if the files of the store are in the 'store_folder'.
+        """
+        blob_path = join(store_folder, cls.blob_file)
+        offsets_path = join(store_folder, cls.offsets_file)
+        return isfile(blob_path) and isfile(offsets_path)
+
+    def paragraphs(self, row):
+        """
+        Get the paragraphs of the paper saved in the given 'row'.
+        :param row: The position of the paper in the store.
+        :return: A list of tuples with the section and the text of the
+        paragraphs.
+        """
+        start, end = int(self.offsets[row]), int(self.offsets[row + 1])
+        if start == end:
+            return []
+        encoded_text = zlib.decompress(self.blob[start:end]).decode('utf-8')
+        return [
+            tuple(paragraph.split(self.section_separator, 1))
+            for paragraph in encoded_text.split(self.paragraph_separator)
+        ]
+
+
+class TextWriter:
+    """
+    Append the paragraphs of the papers to the files of a TextStore.
+    """
+
+    def __init__(self, store_folder, append=False):
+        """
+        Create the folder of the store and open its files.
+        :param store_folder: The folder where the store will be saved.
+        :param append: Bool indicating if we add the papers at the end of an
+        existing store, instead of creating a new one.
+        """
+        if not isdir(store_folder):
+            mkdir(store_folder)
+        blob_path = join(store_folder, TextStore.blob_file)
+        offsets_path = join(store_folder, TextStore.offsets_file)
+        if append:
+            self.blob = open(blob_path, 'ab')
+            self.offsets = open(offsets_path, 'ab')
+            self.position = getsize(blob_path)
+        else:
+            self.blob = open(blob_path, 'wb')
+            self.offsets = open(offsets_path, 'wb')
+            self.position = 0
+            self.offsets.write(np.uint64(0).tobytes())
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def add(self, compressed_text):
+        """
+        Append the compressed paragraphs of a paper (created with
+        'compress_paragraphs') to the store.
+        """
+        self.blob.write(compressed_text)
+        self.position += len(compressed_text)
+        self.offsets.write(np.uint64(self.position).tobytes())
+
+    def close(self):
+        """
+        Close the files of the store.
+        """
+        self.blob.close()
+        self.offsets.close()
+
+
+def compress_paragraphs(paragraphs):
+    """
+    Encode and compress the paragraphs of a paper to save them in a TextStore.
+    :param paragraphs: A list of tuples with the section and text of the
+    paragraphs.
+    :return: The bytes with the compressed paragraphs (empty if there are no
+    paragraphs).
+    """
+    if not paragraphs:
+        return b''
+    # Remove the separators from the text, so they can't split the paragraphs.
+    separators = {ord(TextStore.paragraph_separator): ' ', ord(TextStore.section_separator): ' '}
+    encoded_text = TextStore.paragraph_separator.join(
+        section.translate(separators) + TextStore.section_separator + text.translate(separators)
+        for section, text in paragraphs
+    )
+    return zlib.compress(encoded_text.encode('utf-8'))
+
+
+def render_body_text(paragraphs):
+    """
+    Create the body text of a paper from its paragraphs, adding the name of the
+    section before the first paragraph of each section.
+    :param paragraphs: A list of tuples with the section and text of the
+    paragraphs.
+    :return: A string with the body text of the paper.
+    """
+    text_parts = []
+    last_section = ''
+    for section_name, paragraph_text in paragraphs:
+        # Check if we are still on the same section, or a new one.
+        if section_name != last_section:
+            text_parts.append('<< ' + section_name + ' >>\n')
+        text_parts.append(paragraph_text + '\n\n')
+        # Save the section name for the next iteration.
+        last_section = section_name
+    return ''.join(text_parts)
@@ -1,6 +1,10 @@
 # Gelin Eguinosa Rosique
 
 import time
+import json
+import random
+import threading
+from functools import wraps
 
 
 class TimeKeeper:
@@ -80,6 +84,226 @@ class TimeKeeper:
         return f'{hours} h : {minutes} min : {seconds} sec : {milliseconds} mill'
 
 
+class Profiler:
+    """
+    Records the time spent in named sections of the code (spans), using
+    'time.perf_counter_ns'. The spans can be nested, and each one is identified
+    by its path from the outermost span ('parent/child'), so the time of a phase
+    is attributed to the operation that contains it. The durations are
+    aggregated per path (count, total, maximum and percentiles), and can be
+    exported to JSON or to the Chrome trace format (chrome://tracing or
+    Perfetto). The memory used doesn't grow with the amount of spans: the
+    percentiles are estimated from a random sample of the durations of each
+    path.
+
+    When the profiler is disabled, the spans don't record anything and cost
+    little more than a function call.
+
+    The spans are recorded in the process where they run, so the spans of the
+    functions called in a pool of processes (like 'prefetch_map' with
+    processes=True) are not included, only the time the main process spends
+    waiting for them.
+    """
+
+    def __init__(self, enabled=False, max_events=100000, max_samples=1000):
+        """
+        Create the structures to record the spans.
+        :param enabled: Bool indicating if the spans are recorded.
+        :param max_events: The maximum amount of individual spans kept for the
+        Chrome trace (the aggregates include all the spans).
+        :param max_samples: The maximum amount of durations kept per path to
+        estimate the percentiles.
+        """
+        self.enabled = enabled
+        self.max_events = max_events
+        self.max_samples = max_samples
+        # The count, total and maximum duration of each path, and the sample
+        # of its durations.
+        self.durations = {}
+        self.rand_gen = random.Random(0)
+        self.events = []
+        self.start_ns = time.perf_counter_ns()
+        self.lock = threading.Lock()
+        # The stack of open spans of each thread.
+        self.local = threading.local()
+
+    def enable(self):
+        """
+        Start recording the spans.
+        """
+        self.enabled = True
+
+    def disable(self):
+        """
+        Stop recording the spans.
+        """
+        self.enabled = False
+
+    def reset(self):
+        """
+        Delete the spans recorded so far.
+        """
+        with self.lock:
+            self.durations = {}
+            self.events = []
+            self.start_ns = time.perf_counter_ns()
+
+    def span(self, name):
+        """
+        Create a context manager that records the time spent inside it.
+        :param name: The name of the span.
+        :return: The Span, or a span that does nothing if the profiler is
+        disabled.
+        """
+        if not self.enabled:
+            return _null_span
+        return _Span(self, name)
+
+    def profile(self, name=None):
+        """
+        Decorator that records the time spent in each call of a function.
+        :param name: The name of the span (by default, the name of the
+        function).
+        """
+        def decorator(function):
+            span_name = name or function.__name__
+
+            @wraps(function)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return function(*args, **kwargs)
+                with _Span(self, span_name):
+                    return function(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def stats(self):
+        """
+        Aggregate the durations of the spans recorded for each path.
+        :return: A dictionary with the path of the spans as keys, and the count,
+        total, mean, p50, p99 and maximum durations (in milliseconds) as values.
+        """
+        with self.lock:
+            durations = {
+                path: (count, total, maximum, sorted(samples))
+                for path, (count, total, maximum, samples) in self.durations.items()
+            }
+        span_stats = {}
+        for path, (count, total, maximum, samples) in durations.items():
+            span_stats[path] = {
+                'count': count,
+                'total_ms': total / 1e6,
+                'mean_ms': total / count / 1e6,
+                'p50_ms': _percentile(samples, 50) / 1e6,
+                'p99_ms': _percentile(samples, 99) / 1e6,
+                'max_ms': maximum / 1e6,
+            }
+        return span_stats
+
+    def export_json(self, file_path):
+        """
+        Save the aggregated statistics of the spans in a JSON file.
+        :param file_path: The path of the file.
+        """
+        with open(file_path, 'w') as file:
+            json.dump(self.stats(), file, indent=2)
+
+    def export_chrome_trace(self, file_path):
+        """
+        Save the recorded spans in the Chrome trace format.
+        :param file_path: The path of the file.
+        """
+        with self.lock:
+            events = list(self.events)
+        trace_events = [
+            {
+                'name': name, 'cat': path, 'ph': 'X', 'pid': 0, 'tid': thread_id,
+                'ts': (start_ns - self.start_ns) / 1000, 'dur': duration_ns / 1000,
+            }
+            for path, name, thread_id, start_ns, duration_ns in events
+        ]
+        with open(file_path, 'w') as file:
+            json.dump({'traceEvents': trace_events, 'displayTimeUnit': 'ms'}, file)
+
+    def _record(self, path, name, start_ns, duration_ns):
+        """
+        Save the duration of a span.
+        """
+        with self.lock:
+            path_durations = self.durations.get(path)
+            if path_durations is None:
+                path_durations = self.durations[path] = [0, 0, 0, []]
+            path_durations[0] += 1
+            path_durations[1] += duration_ns
+            path_durations[2] = max(path_durations[2], duration_ns)
+            # Keep a uniform sample of the durations (reservoir sampling).
+            samples = path_durations[3]
+            if len(samples) < self.max_samples:
+                samples.append(duration_ns)
+            else:
+                position = self.rand_gen.randrange(path_durations[0])
+                if position < self.max_samples:
+                    samples[position] = duration_ns
+            if len(self.events) < self.max_events:
+                self.events.append((path, name, threading.get_ident(), start_ns, duration_ns))
+
+
+class _Span:
+    """
+    Context manager that records the time spent inside it in a Profiler.
+    """
+
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+        self.path = name
+        self.start_ns = 0
+
+    def __enter__(self):
+        # Add the span to the stack of the thread.
+        stack = getattr(self.profiler.local, 'stack', None)
+        if stack is None:
+            stack = self.profiler.local.stack = []
+        if stack:
+            self.path = stack[-1] + '/' + self.name
+        stack.append(self.path)
+        self.start_ns = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        duration_ns = time.perf_counter_ns() - self.start_ns
+        self.profiler.local.stack.pop()
+        self.profiler._record(self.path, self.name, self.start_ns, duration_ns)
+        return False
+
+
+class _NullSpan:
+    """
+    Span that does nothing, used when the Profiler is disabled.
+    """
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+
+_null_span = _NullSpan()
+
+
+def _percentile(sorted_values, percent):
+    """
+    Get the percentile of the sorted values (nearest rank).
+    """
+    rank = max(0, min(len(sorted_values) - 1, int(round(percent / 100 * len(sorted_values))) - 1))
+    return sorted_values[rank]
+
+
+# The profiler used to instrument the project (disabled by default).
+profiler = Profiler()
+
+
 # Testing the TimeKeeper
 if __name__ == '__main__':
     stopwatch = TimeKeeper()